@@ -1,3 +1,6 @@
+import functools
+import os
+import threading
 from pathlib import Path
 from typing import Union, List
 
@@ -10,15 +13,35 @@ from brownie import (
 )
 from brownie.network.web3 import Web3
 from dotenv import load_dotenv
+from web3 import HTTPProvider
+from web3 import Web3 as NetworkWeb3
 
-DOLA_CONFIG = {"DOLA_PROJECT_PATH": Path("../../..")}
+
+class DolaConfig(dict):
+    """Loads `DOLA_ETHEREUM_PROJECT` on first access, as compiling or loading the brownie project is slow"""
+
+    _lock = threading.Lock()
+
+    def __missing__(self, key):
+        if key != "DOLA_ETHEREUM_PROJECT":
+            raise KeyError(key)
+        with self._lock:
+            if key in self:
+                # Loaded by another thread meanwhile
+                return self[key]
+            ethereum_path = self["DOLA_ETHEREUM_PATH"]
+            if ethereum_path.exists() and ethereum_path.joinpath("contracts").exists():
+                ethereum_project = project.load(project_path=ethereum_path)
+                ethereum_project.load_config()
+            else:
+                ethereum_project = None
+            self[key] = ethereum_project
+            return ethereum_project
+
+
+DOLA_CONFIG = DolaConfig({"DOLA_PROJECT_PATH": Path("../../..")})
 
 DOLA_CONFIG["DOLA_ETHEREUM_PATH"] = DOLA_CONFIG["DOLA_PROJECT_PATH"].joinpath("ethereum")
-if DOLA_CONFIG["DOLA_ETHEREUM_PATH"].exists() and DOLA_CONFIG["DOLA_ETHEREUM_PATH"].joinpath("contracts").exists():
-    DOLA_CONFIG["DOLA_ETHEREUM_PROJECT"] = project.load(project_path=DOLA_CONFIG["DOLA_ETHEREUM_PATH"])
-    DOLA_CONFIG["DOLA_ETHEREUM_PROJECT"].load_config()
-else:
-    DOLA_CONFIG["DOLA_ETHEREUM_PROJECT"] = None
 
 load_dotenv(DOLA_CONFIG["DOLA_ETHEREUM_PATH"].joinpath(".env"))
 
@@ -26,10 +49,11 @@ load_dotenv(DOLA_CONFIG["DOLA_ETHEREUM_PATH"].joinpath(".env"))
 def set_dola_project_path(path: Union[Path, str]):
     if isinstance(path, str):
         path = Path(path)
-    DOLA_CONFIG["DOLA_PROJECT_PATH"] = path
-    DOLA_CONFIG["DOLA_ETHEREUM_PATH"] = DOLA_CONFIG["DOLA_PROJECT_PATH"].joinpath("ethereum")
-    DOLA_CONFIG["DOLA_ETHEREUM_PROJECT"] = project.load(project_path=DOLA_CONFIG["DOLA_ETHEREUM_PATH"])
-    DOLA_CONFIG["DOLA_ETHEREUM_PROJECT"].load_config()
+    if DOLA_CONFIG["DOLA_PROJECT_PATH"] != path:
+        DOLA_CONFIG["DOLA_PROJECT_PATH"] = path
+        DOLA_CONFIG["DOLA_ETHEREUM_PATH"] = DOLA_CONFIG["DOLA_PROJECT_PATH"].joinpath("ethereum")
+        # Loaded again from the new path on next access
+        DOLA_CONFIG.pop("DOLA_ETHEREUM_PROJECT", None)
 
     assert DOLA_CONFIG["DOLA_ETHEREUM_PATH"].exists(), f"Path error:{DOLA_CONFIG['DOLA_ETHEREUM_PATH'].absolute()}!"
 
@@ -116,12 +140,28 @@ def get_event_signature_by_abi(abi):
     return result
 
 
+# The brownie network is global to the process, shared by its threads
+_network_lock = threading.Lock()
+
+
 def change_network(dst_net):
-    if network.show_active() == dst_net:
-        return
-    if network.is_connected():
-        network.disconnect()
-    network.connect(dst_net)
+    with _network_lock:
+        if network.show_active() == dst_net:
+            return
+        if network.is_connected():
+            network.disconnect()
+        network.connect(dst_net)
+
+
+@functools.lru_cache()
+def network_web3(net: str):
+    """A Web3 of `net` alone, for reads from threads that must not switch the brownie network"""
+    from brownie._config import CONFIG
+    return NetworkWeb3(HTTPProvider(os.path.expandvars(CONFIG.networks[net]["host"])))
+
+
+def get_gas_price(net: str) -> int:
+    return int(network_web3(net).eth.gas_price)
 
 
 def zero_address():
@@ -7,7 +7,7 @@ from multiprocessing import Manager
 from pathlib import Path
 
 import brownie
-from sui_brownie.parallelism import ProcessExecutor
+from sui_brownie.supervisor import Service, Supervisor, heartbeat, stopping
 
 import config
 import dola_ethereum_sdk
@@ -114,7 +114,8 @@ def eth_pool_monitor(local_logger: logging.Logger, dola_chain_id, pool_infos, q)
 
     pool_info = {}
 
-    while True:
+    while not stopping():
+        heartbeat()
         try:
             for (dola_pool_id, token) in pool_infos:
                 if token == config.ETH_ZERO_ADDRESS:
@@ -148,7 +149,8 @@ def sui_pool_monitor(local_logger: logging.Logger, pool_infos, q):
 
     pool_info = {}
 
-    while True:
+    while not stopping():
+        heartbeat()
         try:
             for (dola_pool_id, token) in pool_infos:
                 pool_address = config.SUI_TOKEN_TO_POOL[token]
@@ -186,7 +188,8 @@ def dola_monitor(local_logger: logging.Logger, q, value, lock):
     local_logger.info("start monitor dola protocol...")
 
     pool_infos = {}
-    while True:
+    while not stopping():
+        heartbeat()
         try:
             (dola_chain_id, dola_pool_id, balance) = q.get_nowait()
             if dola_pool_id not in pool_infos:
@@ -243,33 +246,36 @@ def main():
 
     q = manager.Queue()
 
-    pt = ProcessExecutor(executor=6)
-
     sui_dola_chain_id = config.NET_TO_DOLA_CHAIN_ID['sui-mainnet']
     polygon_dola_chain_id = config.NET_TO_DOLA_CHAIN_ID['polygon-main']
     optimism_dola_chain_id = config.NET_TO_DOLA_CHAIN_ID['optimism-main']
     arbitrum_dola_chain_id = config.NET_TO_DOLA_CHAIN_ID['arbitrum-main']
     base_dola_chain_id = config.NET_TO_DOLA_CHAIN_ID['base-main']
 
-    pt.run([
+    Supervisor([
         # One monitoring pool balance per chain
-        functools.partial(sui_pool_monitor, logger.getChild("[sui_pool_monitor]"),
-                          all_pools[sui_dola_chain_id], q),
-        functools.partial(eth_pool_monitor, logger.getChild("[polygon_pool_monitor]"),
-                          polygon_dola_chain_id,
-                          all_pools[polygon_dola_chain_id], q),
-        functools.partial(eth_pool_monitor, logger.getChild("[optimism_pool_monitor]"),
-                          optimism_dola_chain_id,
-                          all_pools[optimism_dola_chain_id], q),
-        functools.partial(eth_pool_monitor, logger.getChild("[arbitrum_pool_monitor]"),
-                          arbitrum_dola_chain_id,
-                          all_pools[arbitrum_dola_chain_id], q),
-        functools.partial(eth_pool_monitor, logger.getChild("[base_pool_monitor]"),
-                          base_dola_chain_id,
-                          all_pools[base_dola_chain_id], q),
+        Service("sui_pool_monitor",
+                functools.partial(sui_pool_monitor, logger.getChild("[sui_pool_monitor]"),
+                                  all_pools[sui_dola_chain_id], q)),
+        Service("polygon_pool_monitor",
+                functools.partial(eth_pool_monitor, logger.getChild("[polygon_pool_monitor]"),
+                                  polygon_dola_chain_id,
+                                  all_pools[polygon_dola_chain_id], q)),
+        Service("optimism_pool_monitor",
+                functools.partial(eth_pool_monitor, logger.getChild("[optimism_pool_monitor]"),
+                                  optimism_dola_chain_id,
+                                  all_pools[optimism_dola_chain_id], q)),
+        Service("arbitrum_pool_monitor",
+                functools.partial(eth_pool_monitor, logger.getChild("[arbitrum_pool_monitor]"),
+                                  arbitrum_dola_chain_id,
+                                  all_pools[arbitrum_dola_chain_id], q)),
+        Service("base_pool_monitor",
+                functools.partial(eth_pool_monitor, logger.getChild("[base_pool_monitor]"),
+                                  base_dola_chain_id,
+                                  all_pools[base_dola_chain_id], q)),
         # Protocol health monitoring
-        functools.partial(dola_monitor, logger.getChild("[dola_monitor]"), q, health, lock),
-    ])
+        Service("dola_monitor", functools.partial(dola_monitor, logger.getChild("[dola_monitor]"), q, health, lock)),
+    ]).run()
 
 
 if __name__ == '__main__':
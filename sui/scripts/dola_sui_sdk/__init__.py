@@ -1,3 +1,4 @@
+import threading
 from pathlib import Path
 from typing import Union
 
@@ -31,17 +32,57 @@ SUI_ENDPOINTS = [
     "https://sui-rpc-mainnet.brightlystake.com:443"
 ]
 
-sui_project = sui_brownie.SuiProject(project_path=DOLA_CONFIG["DOLA_SUI_PATH"], network="sui-mainnet")
-sui_project.add_endpoints(SUI_ENDPOINTS)
+
+class SuiProjectHandle:
+    """The dola SuiProject, created on first use or by `set_dola_project_path`
+
+    Constructing a SuiProject reads the config and object cache and derives every wallet
+    key, so importing the sdk doesn't. Modules keep `from dola_sui_sdk import sui_project`,
+    attribute and item access is forwarded to the current project.
+    """
+
+    def __init__(self):
+        self._project = None
+        self._lock = threading.RLock()
+
+    def init(self, path: Path, network="sui-mainnet") -> sui_brownie.SuiProject:
+        with self._lock:
+            previous = self._project
+            if previous is not None and Path(previous.project_path).resolve() == Path(path).resolve() \
+                    and previous.network == network:
+                # Services sharing a process all call set_dola_project_path, keep their shared project
+                return previous
+            project = sui_brownie.SuiProject(project_path=path, network=network)
+            project.add_endpoints(SUI_ENDPOINTS)
+            # Keep the account a caller already chose, the default one is for new processes only
+            account_name = previous.active_account_name if previous is not None else None
+            project.active_account(account_name if account_name in project.accounts else "TestAccount")
+            self._project = project
+        return project
+
+    def get(self) -> sui_brownie.SuiProject:
+        if self._project is None:
+            with self._lock:
+                if self._project is None:
+                    self.init(DOLA_CONFIG["DOLA_SUI_PATH"])
+        return self._project
+
+    def __getattr__(self, item):
+        if item in ["_project", "_lock"]:
+            raise AttributeError(item)
+        return getattr(self.get(), item)
+
+    def __getitem__(self, item):
+        return self.get()[item]
+
+
+sui_project = SuiProjectHandle()
 
 
 def set_dola_project_path(path: Union[Path, str], network="sui-mainnet"):
-    global sui_project
     if isinstance(path, str):
         path = Path(path)
     DOLA_CONFIG["DOLA_PROJECT_PATH"] = path
     DOLA_CONFIG["DOLA_SUI_PATH"] = path.joinpath("sui")
     assert DOLA_CONFIG["DOLA_SUI_PATH"].exists(), f"Path error:{DOLA_CONFIG['DOLA_SUI_PATH'].absolute()}!"
-    sui_project = sui_brownie.SuiProject(project_path=DOLA_CONFIG["DOLA_SUI_PATH"], network=network)
-    sui_project.load_config()
-    sui_project.read_cache()
+    sui_project.init(DOLA_CONFIG["DOLA_SUI_PATH"], network)
@@ -5,8 +5,6 @@ import yaml
 
 from dola_sui_sdk import DOLA_CONFIG, sui_project
 
-sui_project.active_account("TestAccount")
-
 
 def export_to_config():
     path = Path(__file__).parent.parent.parent.joinpath("brownie-config.yaml")
@@ -1,15 +1,34 @@
 import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
 
-import ccxt
+import numpy as np
+
+import config
 
 
 class ExchangeManager:
+    """Tickers from several exchanges behind one long-lived worker pool
+
+    Tickers are cached per symbol, so callers asking again within `max_age` seconds
+    don't hit the network. The pool is created lazily and recreated after a fork,
+    because worker threads don't survive into child processes.
+    """
 
-    def __init__(self):
+    def __init__(self, max_age=10, timeout=10):
         self.exchanges = self.setup_exchanges()
+        self.max_age = max_age
+        self.timeout = timeout
+        self._cache = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = os.getpid()
 
     def setup_exchanges(self):
+        # Imported here, ccxt takes most of a second to import
+        import ccxt
+
         exchanges = []
         # List of exchanges to set up. Use 'okx,kucoin,coinbase' as default if not set.
         exchange_names = os.environ.get("EXCHANGE_NAMES", "okx,kucoin").split(",")
@@ -36,25 +55,202 @@ class ExchangeManager:
 
         return exchanges
 
+    def _reset_after_fork(self):
+        if self._pid != os.getpid():
+            self._lock = threading.Lock()
+            self._executor = None
+            self._pid = os.getpid()
+
+    @property
+    def executor(self):
+        self._reset_after_fork()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=max(4, 2 * len(self.exchanges)),
+                                                thread_name_prefix="exchange")
+        return self._executor
+
+    def close(self):
+        self._reset_after_fork()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
     def fetch_ticker_with_delay(self, exchange, symbol):
         return exchange.fetch_ticker(symbol)
 
-    def fetch_fastest_ticker(self, symbol):
-        with ThreadPoolExecutor(max_workers=len(self.exchanges)) as executor:
-            futures = {executor.submit(
-                self.fetch_ticker_with_delay, exchange, symbol): exchange for exchange in self.exchanges}
+    def get_cached(self, key, max_age=None):
+        self._reset_after_fork()
+        max_age = self.max_age if max_age is None else max_age
+        with self._lock:
+            cached = self._cache.get(key)
+        if cached is not None and time.time() - cached[0] <= max_age:
+            return cached[1]
+
+    def set_cached(self, key, ticker):
+        with self._lock:
+            self._cache[key] = (time.time(), ticker)
 
-            for future in as_completed(futures):
+    def fetch_fastest_ticker(self, symbol, max_age=None):
+        """Ticker of the first exchange to answer, the slower requests are cancelled"""
+        ticker = self.get_cached(symbol, max_age)
+        if ticker is not None:
+            return ticker
+
+        futures = {self.executor.submit(
+            self.fetch_ticker_with_delay, exchange, symbol): exchange for exchange in self.exchanges}
+        try:
+            for future in as_completed(futures, timeout=self.timeout):
                 try:
                     ticker = future.result()
                     exchange_used = futures[future]
                     print(f"Received ticker from {exchange_used.name}")  # 打印当前API由哪个交易所返回的
+                    self.set_cached(symbol, ticker)
                     return ticker
                 except Exception:
                     continue
+        except TimeoutError:
+            pass
+        finally:
+            for future in futures:
+                future.cancel()
         raise ValueError(
             f"Failed to fetch ticker for {symbol} from all exchanges.")
 
+    def fetch_median_ticker(self, symbol, max_age=None):
+        """Ticker whose close is the median of the closes of every exchange that answered"""
+        key = f"median:{symbol}"
+        ticker = self.get_cached(key, max_age)
+        if ticker is not None:
+            return ticker
+
+        futures = [self.executor.submit(self.fetch_ticker_with_delay, exchange, symbol)
+                   for exchange in self.exchanges]
+        closes = []
+        try:
+            for future in as_completed(futures, timeout=self.timeout):
+                try:
+                    close = future.result()['close']
+                    if close is not None:
+                        closes.append(float(close))
+                except Exception:
+                    continue
+        except TimeoutError:
+            pass
+        finally:
+            for future in futures:
+                future.cancel()
+        if not closes:
+            raise ValueError(
+                f"Failed to fetch ticker for {symbol} from all exchanges.")
+
+        ticker = {'symbol': symbol, 'close': float(np.median(closes)), 'timestamp': int(time.time() * 1000),
+                  'exchanges': len(closes)}
+        self.set_cached(key, ticker)
+        return ticker
+
+    def get_price(self, symbol, max_age=None, median=False):
+        if median:
+            ticker = self.fetch_median_ticker(symbol, max_age)
+        else:
+            ticker = self.fetch_fastest_ticker(symbol, max_age)
+        return float(ticker['close'])
+
+
+class PriceReference:
+    """Rolling table of exchange prices used as reference for oracle prices
+
+    One background thread refreshes every symbol in `config.EXCHANGE_SYMBOLS` with a single
+    `fetch_tickers` call per round, so deviation checks read prices from memory instead of
+    issuing one blocking `fetch_ticker` per symbol.
+    """
+
+    def __init__(self, exchange_manager: ExchangeManager = None, symbols=None, interval=5, max_age=30):
+        self.exchange_manager = exchange_manager if exchange_manager is not None else ExchangeManager()
+        self.symbols = list(symbols) if symbols is not None else list(config.EXCHANGE_SYMBOLS)
+        self.index = {symbol: k for k, symbol in enumerate(self.symbols)}
+        self.interval = interval
+        self.max_age = max_age
+
+        self.prices = np.full(len(self.symbols), np.nan)
+        self.timestamps = np.zeros(len(self.symbols))
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def fetch_tickers(self):
+        for exchange in self.exchange_manager.exchanges:
+            if not exchange.has.get('fetchTickers'):
+                continue
+            try:
+                return exchange.fetch_tickers(self.symbols)
+            except Exception as e:
+                print(f"Fetch tickers from {exchange.name} fail: {e}")
+        raise ValueError(f"Failed to fetch tickers for {self.symbols} from all exchanges.")
+
+    def refresh(self):
+        tickers = self.fetch_tickers()
+        now = time.time()
+        with self._lock:
+            for symbol, ticker in tickers.items():
+                if symbol in self.index and ticker.get('close') is not None:
+                    self.prices[self.index[symbol]] = float(ticker['close'])
+                    self.timestamps[self.index[symbol]] = now
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Refresh price reference fail: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="price_reference", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    @staticmethod
+    def exchange_symbol(symbol):
+        """Oracle symbol to exchange symbol, e.g. BTC/USD -> BTC/USDT"""
+        return f"{symbol}T"
+
+    def get_prices(self, symbols):
+        """Reference prices of oracle symbols, refreshing once if any is missing or stale
+
+        Symbols without an exchange market (stable coins) are priced at 1.
+        """
+        indexes = np.array([self.index.get(self.exchange_symbol(symbol), -1) for symbol in symbols], dtype=int)
+        listed = indexes >= 0
+        with self._lock:
+            stale = time.time() - self.timestamps[indexes[listed]] > self.max_age
+        if stale.any():
+            self.refresh()
+        with self._lock:
+            prices = np.ones(len(symbols))
+            prices[listed] = self.prices[indexes[listed]]
+        return prices
+
+    def check_deviations(self, symbols, oracle_prices):
+        """Compare a batch of oracle prices with the reference prices at once
+
+        :param symbols: oracle symbols, e.g. ["BTC/USD", "ETH/USD"]
+        :param oracle_prices: decoded oracle prices in the same order
+        :return: (accepted, deviations), accepted[k] is False when the deviation of
+            symbols[k] exceeds `config.SYMBOL_TO_DEVIATION`
+        """
+        oracle_prices = np.asarray(oracle_prices, dtype=float)
+        reference_prices = self.get_prices(symbols)
+        thresholds = np.array([config.SYMBOL_TO_DEVIATION[symbol] for symbol in symbols])
+        deviations = 1 - np.minimum(oracle_prices, reference_prices) / np.maximum(oracle_prices, reference_prices)
+        # A missing reference price never accepts.
+        deviations = np.where(np.isnan(deviations), np.inf, deviations)
+        return deviations <= thresholds, deviations
+
 
 if __name__ == "__main__":
     exchange_manager = ExchangeManager()
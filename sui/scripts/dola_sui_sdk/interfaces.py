@@ -1,6 +1,6 @@
 from pprint import pprint
 
-import ccxt
+from sui_brownie import Argument, U16
 
 import config
 import dola_monitor
@@ -544,7 +544,39 @@ def get_otoken_total_supply(dola_pool_id):
     return parse_u256(result['results'][0]['returnValues'][0][0])
 
 
+def get_otoken_total_supplies(dola_pool_ids):
+    """Read the otoken total supply of several pools with a single devInspect
+
+    :param dola_pool_ids: dola pool ids
+    :return: dola_pool_id -> otoken total supply
+    """
+    dola_protocol = load.dola_protocol_package()
+
+    lending_storage = sui_project.network_config['objects']['LendingStorage']
+
+    result = sui_project.batch_transaction_inspect(
+        actual_params=[lending_storage] + list(dola_pool_ids),
+        transactions=[
+            [
+                dola_protocol.lending_logic.total_otoken_supply,
+                [
+                    Argument("Input", U16(0)),
+                    Argument("Input", U16(k + 1)),
+                ],
+                []
+            ]
+            for k in range(len(dola_pool_ids))
+        ]
+    )
+    return {
+        dola_pool_id: parse_u256(result['results'][k]['returnValues'][0][0])
+        for k, dola_pool_id in enumerate(dola_pool_ids)
+    }
+
+
 def get_protocol_total_otoken_value():
+    import ccxt
+
     reserves_ids = list(range(9))
 
     kucoin = ccxt.kucoin()
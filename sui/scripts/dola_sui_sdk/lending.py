@@ -1,3 +1,4 @@
+import functools
 from pathlib import Path
 from pprint import pprint
 
@@ -7,7 +8,7 @@ from sui_brownie import SuiObject, Argument, U16
 
 import config
 from dola_sui_sdk import load, init
-from dola_sui_sdk.exchange import ExchangeManager
+from dola_sui_sdk.exchange import ExchangeManager, PriceReference
 from dola_sui_sdk.init import clock
 from dola_sui_sdk.init import pool
 from dola_sui_sdk.load import sui_project
@@ -15,7 +16,15 @@ from dola_sui_sdk.oracle import get_feed_vaa
 
 U64_MAX = 18446744073709551615
 
-exchange_manager = ExchangeManager()
+
+@functools.lru_cache()
+def get_exchange_manager():
+    return ExchangeManager()
+
+
+@functools.lru_cache()
+def get_price_reference():
+    return PriceReference(get_exchange_manager()).start()
 
 
 def dola_pool_id_to_symbol(pool_id):
@@ -41,8 +50,8 @@ def feed_multi_token_price_with_fee(asset_ids, relay_fee=0, fee_rate=0.8):
     symbols = [config.DOLA_POOL_ID_TO_SYMBOL[pool_id] for pool_id in asset_ids]
     price_info_objects = [config.DOLA_POOL_ID_TO_PRICE_INFO_OBJECT[pool_id] for pool_id in asset_ids]
     vaas = [get_feed_vaa(symbol) for symbol in symbols]
-    for (pool_id, symbol, price_info_object) in zip(asset_ids, symbols, price_info_objects):
-        vaa = get_feed_vaa(symbol)
+    pyth_prices = []
+    for (pool_id, vaa, price_info_object) in zip(asset_ids, vaas, price_info_objects):
         result = sui_project.batch_transaction_inspect(
             actual_params=[
                 governance_genesis,
@@ -84,26 +93,17 @@ def feed_multi_token_price_with_fee(asset_ids, relay_fee=0, fee_rate=0.8):
 
         decimal = int(result['results'][2]['returnValues'][1][0][0])
 
-        pyth_price = parse_u256(result['results'][2]['returnValues'][0][0]) / (10 ** decimal)
+        pyth_prices.append(parse_u256(result['results'][2]['returnValues'][0][0]) / (10 ** decimal))
 
-        if f"{symbol}T" in config.EXCHANGE_SYMBOLS:
-            exchange_price = exchange_manager.fetch_fastest_ticker(f"{symbol}T")['close']
-        else:
-            exchange_price = 1
-
-        if pyth_price > exchange_price:
-            deviation = 1 - exchange_price / pyth_price
-        else:
-            deviation = 1 - pyth_price / exchange_price
+        gas = calculate_sui_gas(result['effects']['gasUsed'])
+        feed_gas += gas
 
-        deviation_threshold = config.SYMBOL_TO_DEVIATION[symbol]
-        if deviation > deviation_threshold:
+    accepted, deviations = get_price_reference().check_deviations(symbols, pyth_prices)
+    for (symbol, ok, deviation) in zip(symbols, accepted, deviations):
+        if not ok:
             print(f"The oracle price difference is too large! {symbol} deviation {deviation}!")
             # raise ValueError(f"The oracle price difference is too large! {symbol} deviation {deviation}!")
 
-        gas = calculate_sui_gas(result['effects']['gasUsed'])
-        feed_gas += gas
-
     if relay_fee >= int(fee_rate * feed_gas):
         relay_fee -= int(fee_rate * feed_gas)
         for (pool_id, vaa, symbol, price_info_object) in zip(asset_ids, vaas, symbols, price_info_objects):
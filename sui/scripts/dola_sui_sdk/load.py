@@ -6,8 +6,6 @@ import sui_brownie
 
 from dola_sui_sdk import DOLA_CONFIG, sui_project
 
-sui_project.active_account("TestAccount")
-
 
 @functools.lru_cache()
 def get_upgrade_cap_info(upgrade_cap_ids: tuple):
@@ -60,11 +58,9 @@ def wormhole_package(package_id: str = None):
 
 
 def pyth_package():
-    return sui_brownie.SuiPackage(
-        package_id=sui_project.network_config['packages']['pyth'],
-        package_path=Path.home().joinpath(Path(
-            ".move/https___github_com_pyth-network_pyth-crosschain_git_7dab308f961746890faf1ac0b52e283b31112bf6/target_chains/sui/contracts")),
-    )
+    return sui_package(sui_project.network_config['packages']['pyth'],
+                       Path.home().joinpath(Path(
+                           ".move/https___github_com_pyth-network_pyth-crosschain_git_7dab308f961746890faf1ac0b52e283b31112bf6/target_chains/sui/contracts")))
 
 
 def external_interfaces_package(package_id: str = None):
@@ -1,9 +1,9 @@
 import base64
 import logging
+import math
 import time
 from pprint import pprint
 
-import ccxt
 import requests
 import sui_brownie
 from sui_brownie import Argument, U16
@@ -106,7 +106,7 @@ def get_pyth_fee():
     return parse_u64(result['results'][0]['returnValues'][0][0])
 
 
-def feed_token_price_by_pyth(pool_id, simulate=True, kraken=None):
+def feed_token_price_by_pyth(pool_id, simulate=True):
     dola_protocol = load.dola_protocol_package()
 
     pyth_fee_amount = 1
@@ -162,15 +162,10 @@ def feed_token_price_by_pyth(pool_id, simulate=True, kraken=None):
 
         pyth_price = parse_u256(result['results'][2]['returnValues'][0][0]) / (10 ** decimal)
 
-        kraken_price = kraken.fetch_ticker(symbol)['close']
-
-        if pyth_price > kraken_price:
-            deviation = 1 - kraken_price / pyth_price
-        else:
-            deviation = 1 - pyth_price / kraken_price
-
-        deviation_threshold = config.SYMBOL_TO_DEVIATION[symbol]
-        if deviation > deviation_threshold:
+        # lending imports this module
+        from dola_sui_sdk.lending import get_price_reference
+        [accepted], [deviation] = get_price_reference().check_deviations([symbol], [pyth_price])
+        if not accepted:
             raise ValueError(f"The oracle price difference is too large! {symbol} price deviation: {deviation}")
     else:
         sui_project.batch_transaction(
@@ -301,6 +296,8 @@ def get_pool_id(symbol):
 
 
 def get_market_prices(symbols=("BTC/USDT", "ETH/USDT")):
+    import ccxt
+
     api = ccxt.kucoin()
     api.load_markets()
     prices = {}
@@ -320,6 +317,8 @@ def check_sui_objects():
 
 
 def feed_market_price(symbols=("BTC/USDT", "ETH/USDT")):
+    import ccxt
+
     kucoin = ccxt.kucoin()
     kucoin.load_markets()
 
@@ -343,6 +342,8 @@ def feed_market_price(symbols=("BTC/USDT", "ETH/USDT")):
 
 
 def test_verify_oracle():
+    import ccxt
+
     dola_protocol = load.dola_protocol_package()
     coinbase = ccxt.coinbase()
     coinbase.load_markets()
@@ -424,11 +425,235 @@ def check_guard_price(symbol):
     return result['effects']['status']['status'] == 'failure'
 
 
+def get_price_guard_time():
+    price_oracle = sui_project.network_config['objects']['PriceOracle']
+    result = sui_project.client.sui_getObject(
+        price_oracle,
+        {
+            "showType": True,
+            "showOwner": True,
+            "showPreviousTransaction": False,
+            "showDisplay": False,
+            "showContent": True,
+            "showBcs": False,
+            "showStorageRebate": False
+        }
+    )
+    return int(result["data"]["content"]["fields"]["price_guard_time"])
+
+
+def get_last_update_timestamps(pool_ids):
+    """Read the last update timestamp of every pool with a single devInspect
+
+    :param pool_ids: dola pool ids
+    :return: dola_pool_id -> last update timestamp(s)
+    """
+    dola_protocol = load.dola_protocol_package()
+    price_oracle = sui_project.network_config['objects']['PriceOracle']
+
+    result = sui_project.batch_transaction_inspect(
+        actual_params=[price_oracle] + list(pool_ids),
+        transactions=[
+            [
+                dola_protocol.oracle.get_token_price,
+                [
+                    Argument("Input", U16(0)),
+                    Argument("Input", U16(k + 1)),
+                ],
+                []
+            ]
+            for k in range(len(pool_ids))
+        ]
+    )
+    return {
+        pool_id: parse_u64(result['results'][k]['returnValues'][2][0])
+        for k, pool_id in enumerate(pool_ids)
+    }
+
+
+def batch_feed_token_price_by_pool_ids(pool_ids):
+    """Feed the prices of several pools in one programmable transaction
+
+    Pools sharing a price info object (e.g. both USDC pools) share the object input,
+    since a transaction block can not take the same object twice.
+    """
+    dola_protocol = load.dola_protocol_package()
+
+    pyth_fee_amount = 1
+    governance_genesis = sui_project.network_config['objects']['GovernanceGenesis']
+    wormhole_state = sui_project.network_config['objects']['WormholeState']
+    price_oracle = sui_project.network_config['objects']['PriceOracle']
+
+    actual_params = [
+        governance_genesis,
+        wormhole_state,
+        pyth_state(),
+        price_oracle,
+        init.clock(),
+    ]
+
+    symbols = [config.DOLA_POOL_ID_TO_SYMBOL[pool_id] for pool_id in pool_ids]
+    unique_symbols = list(dict.fromkeys(symbols))
+    vaas = dict(zip(unique_symbols, get_batch_feed_vaa(unique_symbols)))
+
+    price_info_object_index = {}
+    transaction_blocks = []
+    for pool_id, symbol in zip(pool_ids, symbols):
+        price_info_object = config.DOLA_POOL_ID_TO_PRICE_INFO_OBJECT[pool_id]
+        if price_info_object not in price_info_object_index:
+            price_info_object_index[price_info_object] = len(actual_params)
+            actual_params.append(price_info_object)
+        first = len(actual_params)
+        actual_params += [
+            pool_id,
+            list(bytes.fromhex(vaas[symbol].replace("0x", ""))),
+            pyth_fee_amount
+        ]
+        transaction_blocks.append([
+            dola_protocol.oracle.feed_token_price_by_pyth_v2,
+            [
+                Argument("Input", U16(0)),
+                Argument("Input", U16(1)),
+                Argument("Input", U16(2)),
+                Argument("Input", U16(price_info_object_index[price_info_object])),
+                Argument("Input", U16(3)),
+                Argument("Input", U16(first)),
+                Argument("Input", U16(first + 1)),
+                Argument("Input", U16(4)),
+                Argument("Input", U16(first + 2)),
+            ],
+            []
+        ])
+
+    return sui_project.batch_transaction(
+        actual_params=actual_params,
+        transactions=transaction_blocks,
+    )
+
+
+class OracleGuardScheduler:
+    """Feed pool prices just before their price guard expires
+
+    Instead of inspecting every pool each second, the scheduler reads the last update
+    timestamp of all pools in one devInspect, computes each pool's deadline
+    (last update + guard time - lead time) and sleeps until the earliest one. Pools that
+    are due are fed together in one transaction block. With a `PriceReference` it also
+    checks exchange prices while sleeping and feeds a pool early when its market price
+    moved by more than `config.SYMBOL_TO_DEVIATION` since the last feed.
+    """
+
+    def __init__(self, pool_ids, lead_time=60, price_reference=None, price_check_interval=10, max_sleep=300,
+                 logger=None):
+        self.pool_ids = list(pool_ids)
+        self.lead_time = lead_time
+        self.price_reference = price_reference
+        self.price_check_interval = price_check_interval
+        self.max_sleep = max_sleep
+        self.logger = logger if logger is not None else logging.getLogger("oracle_guard")
+
+        self.guard_time = 0
+        self.deadlines = {}
+        self.reference_prices = {}
+
+    def refresh_deadlines(self):
+        self.guard_time = get_price_guard_time()
+        timestamps = get_last_update_timestamps(self.pool_ids)
+        self.deadlines = {
+            pool_id: timestamp + self.guard_time - self.lead_time
+            for pool_id, timestamp in timestamps.items()
+        }
+
+    def fetch_exchange_prices(self, pool_ids):
+        symbols = sorted({config.DOLA_POOL_ID_TO_SYMBOL[pool_id] for pool_id in pool_ids})
+        if not symbols:
+            return {}
+        prices = self.price_reference.get_prices(symbols)
+        return {symbol: float(price) for symbol, price in zip(symbols, prices) if not math.isnan(price)}
+
+    def reset_reference_prices(self, pool_ids):
+        if self.price_reference is None:
+            return
+        self.reference_prices.update(self.fetch_exchange_prices(pool_ids))
+
+    def moved_pools(self):
+        """Pools whose exchange price moved beyond the deviation threshold since the last feed"""
+        if self.price_reference is None:
+            return []
+        prices = self.fetch_exchange_prices(self.pool_ids)
+        moved = []
+        for pool_id in self.pool_ids:
+            symbol = config.DOLA_POOL_ID_TO_SYMBOL[pool_id]
+            if symbol not in prices or symbol not in self.reference_prices:
+                continue
+            reference_price = self.reference_prices[symbol]
+            move = abs(prices[symbol] - reference_price) / reference_price
+            if move > config.SYMBOL_TO_DEVIATION[symbol]:
+                self.logger.info(f"{symbol} moved {move:.4f} since last feed")
+                moved.append(pool_id)
+        return moved
+
+    def due_pools(self, now=None):
+        if now is None:
+            now = time.time()
+        return [pool_id for pool_id in self.pool_ids if self.deadlines[pool_id] <= now]
+
+    def sleep_until_due(self):
+        """Sleep until the earliest deadline, waking early on large price moves"""
+        while True:
+            if not self.deadlines:
+                time.sleep(self.max_sleep)
+                return []
+            remaining = min(self.deadlines.values()) - time.time()
+            if remaining <= 0:
+                return []
+            if self.price_reference is None:
+                time.sleep(min(remaining, self.max_sleep))
+                return []
+            time.sleep(min(remaining, self.price_check_interval))
+            try:
+                moved = self.moved_pools()
+            except Exception as e:
+                self.logger.warning(f"Fetch exchange prices fail: {e}")
+                continue
+            if moved:
+                return moved
+
+    def feed(self, pool_ids):
+        symbols = [config.DOLA_POOL_ID_TO_SYMBOL[pool_id] for pool_id in pool_ids]
+        self.logger.info(f"Update {symbols} price")
+        batch_feed_token_price_by_pool_ids(pool_ids)
+        self.reset_reference_prices(pool_ids)
+
+    def run_once(self):
+        moved = self.sleep_until_due()
+        # Re-read timestamps: other feeders (e.g. the relayer) may have pushed deadlines back.
+        self.refresh_deadlines()
+        due = sorted(set(self.due_pools()) | set(moved))
+        if due:
+            self.feed(due)
+            self.refresh_deadlines()
+
+    def run(self):
+        while True:
+            try:
+                if not self.deadlines:
+                    self.refresh_deadlines()
+                if not self.reference_prices:
+                    self.reset_reference_prices(self.pool_ids)
+                self.run_once()
+            except Exception as e:
+                self.logger.warning(e)
+                time.sleep(1)
+
+
 def oracle_guard(pool_ids=None):
     """Check price guard time and update price termly
 
     :return:
     """
+    # lending imports this module
+    from dola_sui_sdk.lending import get_price_reference
+
     FORMAT = '%(asctime)s - %(funcName)s - %(levelname)s - %(name)s: %(message)s'
     logger = logging.getLogger()
     logger.setLevel("INFO")
@@ -441,27 +666,13 @@ def oracle_guard(pool_ids=None):
     logger.addHandler(ch)
     local_logger = logger.getChild("oracle_guard")
 
-    kraken = ccxt.kraken()
-    kraken.load_markets()
-
     if pool_ids is None:
         pool_ids = []
 
     sui_project.active_account("OracleGuard")
-    symbols = [config.DOLA_POOL_ID_TO_SYMBOL[pool_id] for pool_id in pool_ids]
 
-    while True:
-        try:
-            for (pool_id, symbol) in zip(pool_ids, symbols):
-
-                local_logger.info(f"Check {symbol} price guard time")
-                if check_guard_price(symbol):
-                    local_logger.info(f"Update {symbol} price")
-                    feed_token_price_by_pyth(pool_id, simulate=False, kraken=kraken)
-        except Exception as e:
-            local_logger.warning(e)
-        finally:
-            time.sleep(1)
+    scheduler = OracleGuardScheduler(pool_ids, price_reference=get_price_reference(), logger=local_logger)
+    scheduler.run()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,241 @@
+import bisect
+import logging
+import threading
+import time
+
+import config
+import dola_ethereum_sdk
+import relayer
+from dola_sui_sdk.load import sui_project
+from relay_db import GasRecord
+
+# Call names whose relay fee depends on the number of price feeds
+FEED_CALL_NAMES = ['borrow', 'withdraw', 'cancel_as_collateral']
+
+GAS_RECORD_PROJECTION = {
+    'src_chain_id': True,
+    'dst_chain_id': True,
+    'call_name': True,
+    'nonce': True,
+    'core_gas': True,
+    'withdraw_gas': True,
+    'feed_nums': True,
+    'updated_at': True,
+}
+
+
+class GasWindow:
+    """The latest `size` gas records of one quote key, ordered by nonce"""
+
+    def __init__(self, size):
+        self.size = size
+        self.nonces = []
+        self.records = {}
+
+    def add(self, record):
+        nonce = record['nonce']
+        if nonce in self.records:
+            self.records[nonce] = record
+            return True
+        if len(self.nonces) >= self.size and nonce < self.nonces[0]:
+            return False
+        bisect.insort(self.nonces, nonce)
+        self.records[nonce] = record
+        if len(self.nonces) > self.size:
+            del self.records[self.nonces.pop(0)]
+        return True
+
+    def remove(self, nonce):
+        if nonce in self.records:
+            del self.records[nonce]
+            self.nonces.remove(nonce)
+
+    def max_gas(self):
+        record = max(self.records.values(), key=lambda x: x['core_gas'] + x['withdraw_gas'])
+        return record['core_gas'], record['withdraw_gas']
+
+
+class FeeQuoteEngine:
+    """Relay fee quotes computed from memory
+
+    Gas statistics are loaded from GasRecord once and then followed incrementally by
+    `updated_at`, which every GasRecord write sets: new records and updates of existing
+    ones, such as their withdraw gas, are read again from `overlap` seconds before the
+    latest one seen, so records committed late or by hosts with a skewed clock are not
+    missed. Gas prices and token prices are refreshed by the same
+    background thread, so `relay_fee` and `max_relay_fee` never touch the network.
+    The quotes match `relayer.get_relay_fee` and `relayer.get_max_relay_fee`.
+    """
+
+    def __init__(self, window=20, interval=3, price_interval=10, overlap=60, logger=None):
+        self.window = window
+        self.interval = interval
+        self.price_interval = price_interval
+        self.overlap = overlap
+        self.logger = logger or logging.getLogger("fee_quote")
+
+        self.gas_record = GasRecord().db
+        self._updated_since = None
+        self._windows = {}
+        self._history_max = {}
+        # _id -> window keys of the records ingested
+        self._record_keys = {}
+
+        # Published snapshots, replaced as a whole so quotes need no lock
+        self._window_gas = {}
+        self._history_gas = {}
+        self._gas_prices = {}
+        self._token_prices = {}
+
+        self._thread = None
+        self._stop = threading.Event()
+
+    @staticmethod
+    def window_keys(record):
+        src_chain_id = record['src_chain_id']
+        dst_chain_id = record['dst_chain_id']
+        call_name = record['call_name']
+        keys = [(src_chain_id, dst_chain_id, call_name)]
+        if record.get('feed_nums') is not None:
+            keys.append((src_chain_id, dst_chain_id, call_name, record['feed_nums']))
+        return keys
+
+    def _ingest(self, record):
+        record.setdefault('withdraw_gas', 0)
+        touched = set()
+        keys = self.window_keys(record)
+        # Updated records move to other windows when their dst_chain_id or feed_nums change
+        for key in set(self._record_keys.get(record['_id'], [])) - set(keys):
+            self._windows[key].remove(record['nonce'])
+            touched.add(key)
+        self._record_keys[record['_id']] = keys
+        for key in keys:
+            if key not in self._windows:
+                self._windows[key] = GasWindow(self.window)
+            if self._windows[key].add(record):
+                touched.add(key)
+
+        history_key = (record['src_chain_id'], record['dst_chain_id'], record['call_name'])
+        if history_key not in self._history_max or record['core_gas'] > self._history_max[history_key]['core_gas']:
+            self._history_max[history_key] = record
+            touched.add(history_key)
+        return touched
+
+    def _publish(self, touched):
+        if not touched:
+            return
+        window_gas = dict(self._window_gas)
+        history_gas = dict(self._history_gas)
+        for key in touched:
+            if key in self._windows and self._windows[key].records:
+                window_gas[key] = self._windows[key].max_gas()
+            elif key in self._windows:
+                window_gas.pop(key, None)
+            if key in self._history_max:
+                history_gas[key] = (self._history_max[key]['core_gas'], self._history_max[key]['withdraw_gas'])
+        self._window_gas = window_gas
+        self._history_gas = history_gas
+
+    def refresh_records(self):
+        touched = set()
+        updated_since = time.time() if self._updated_since is None else self._updated_since
+
+        # Not by `_id`: a record may become visible after others with a greater `_id`
+        query = {} if self._updated_since is None else {'updated_at': {'$gte': self._updated_since - self.overlap}}
+        for record in self.gas_record.find(query, GAS_RECORD_PROJECTION).sort('_id', 1):
+            touched |= self._ingest(record)
+            updated_since = max(updated_since, record.get('updated_at', 0))
+        self._updated_since = updated_since
+
+        self._publish(touched)
+
+    def refresh_prices(self):
+        gas_prices = {0: int(sui_project.client.suix_getReferenceGasPrice())}
+        for (dola_chain_id, network) in config.DOLA_CHAIN_ID_TO_NETWORK.items():
+            if dola_chain_id == 0:
+                continue
+            try:
+                # Not through brownie, whose network is shared with the request threads
+                gas_prices[dola_chain_id] = dola_ethereum_sdk.get_gas_price(network)
+            except Exception as e:
+                self.logger.warning(f"Refresh gas price of {network} fail: {e}")
+                if dola_chain_id in self._gas_prices:
+                    gas_prices[dola_chain_id] = self._gas_prices[dola_chain_id]
+        self._gas_prices = gas_prices
+
+        token_prices = dict(self._token_prices)
+        for token in set(config.NETWORK_TO_NATIVE_TOKEN.values()):
+            try:
+                token_prices[token] = relayer.get_token_price(token)
+            except Exception as e:
+                self.logger.warning(f"Refresh {token} price fail: {e}")
+        self._token_prices = token_prices
+
+    def _run(self):
+        last_price_refresh = time.time()
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh_records()
+                if time.time() - last_price_refresh >= self.price_interval:
+                    self.refresh_prices()
+                    last_price_refresh = time.time()
+            except Exception as e:
+                self.logger.warning(f"Refresh fee quote engine fail: {e}")
+
+    def start(self):
+        """Load the gas statistics and prices, then keep them fresh in the background"""
+        self.refresh_records()
+        self.refresh_prices()
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="fee_quote", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def calculate_relay_fee(self, gas, src_chain_id, dst_chain_id):
+        if gas is None:
+            return {'relay_fee': '0'}
+        (core_gas, withdraw_gas) = gas
+
+        gas_prices = self._gas_prices
+        token_prices = self._token_prices
+        src_token = relayer.get_gas_token(relayer.get_dola_network(src_chain_id))
+        dst_token = relayer.get_gas_token(relayer.get_dola_network(dst_chain_id))
+        withdraw_gas_price = gas_prices.get(0) if dst_chain_id == 0 else gas_prices.get(dst_chain_id)
+        if 0 not in gas_prices or withdraw_gas_price is None or \
+                not {'sui', src_token, dst_token} <= token_prices.keys():
+            # Prices not loaded yet, quote the slow way
+            return relayer.calculate_relay_fee([{'core_gas': core_gas, 'withdraw_gas': withdraw_gas}],
+                                               src_chain_id, dst_chain_id)
+
+        core_fee = core_gas * gas_prices[0] / pow(10, relayer.get_token_decimal('sui')) * token_prices['sui']
+        withdraw_fee = withdraw_gas * withdraw_gas_price / pow(10, relayer.get_token_decimal(dst_token)) * \
+            token_prices[dst_token]
+        relay_fee = int((core_fee + withdraw_fee) / token_prices[src_token] * pow(10, relayer.get_token_decimal(
+            src_token)))
+        return {'relay_fee': str(int(relay_fee * 1.4))}
+
+    def relay_fee(self, src_chain_id, dst_chain_id, call_name, feed_nums=0):
+        """In-memory version of `relayer.get_relay_fee`"""
+        relayer.check_valid_call_name(call_name)
+        src_chain_id = int(src_chain_id)
+        dst_chain_id = int(dst_chain_id)
+
+        if call_name in FEED_CALL_NAMES:
+            gas = self._window_gas.get((src_chain_id, dst_chain_id, call_name, int(feed_nums))) or \
+                self._window_gas.get((src_chain_id, 0, call_name, int(feed_nums)))
+        else:
+            gas = self._window_gas.get((src_chain_id, dst_chain_id, call_name))
+        return self.calculate_relay_fee(gas, src_chain_id, dst_chain_id)
+
+    def max_relay_fee(self, src_chain_id, dst_chain_id, call_name):
+        """In-memory version of `relayer.get_max_relay_fee`"""
+        relayer.check_valid_call_name(call_name)
+        src_chain_id = int(src_chain_id)
+        dst_chain_id = int(dst_chain_id)
+
+        gas = self._history_gas.get((src_chain_id, dst_chain_id, call_name))
+        return self.calculate_relay_fee(gas, src_chain_id, dst_chain_id)
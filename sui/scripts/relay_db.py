@@ -0,0 +1,468 @@
+import atexit
+import functools
+import multiprocessing.util
+import os
+import threading
+import time
+
+from dotenv import dotenv_values
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError
+from pymongo.read_preferences import read_pref_mode_from_name, make_read_preference
+from pymongo.write_concern import WriteConcern
+
+from dola_sui_sdk.load import sui_project
+from relay_indexes import backfill_vaa_hashes, ensure_indexes, vaa_from_bytes, vaa_hash, vaa_to_bytes
+from relay_store import SqliteDatabase
+
+DATABASE_NAME = 'DolaProtocol'
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+_sqlite_database = None
+
+
+def get_env_values():
+    env_file = sui_project.config['dotenv']
+    return read_env_file(sui_project.project_path.joinpath(env_file))
+
+
+@functools.lru_cache()
+def read_env_file(path):
+    """The dotenv file is read once per process, every repository construction looks up the relay store"""
+    return dotenv_values(path)
+
+
+def get_mongodb_uri():
+    return get_env_values()['MONGODB_URI']
+
+
+def client_options():
+    """
+    Pool and consistency settings shared by the sync and async clients, read from the dotenv file:
+
+    MONGODB_MAX_POOL_SIZE, MONGODB_MIN_POOL_SIZE, MONGODB_WRITE_CONCERN (e.g. 1 or majority),
+    MONGODB_JOURNAL and MONGODB_READ_PREFERENCE (e.g. primary or secondaryPreferred).
+
+    Only the settings present are passed: keyword options override those of MONGODB_URI,
+    and the others keep the URI and server defaults.
+    """
+    env_values = get_env_values()
+
+    options = {
+        'maxPoolSize': int(env_values.get('MONGODB_MAX_POOL_SIZE', 20)),
+        'minPoolSize': int(env_values.get('MONGODB_MIN_POOL_SIZE', 0)),
+    }
+    if env_values.get('MONGODB_WRITE_CONCERN'):
+        w = env_values['MONGODB_WRITE_CONCERN']
+        options['w'] = int(w) if w.isdigit() else w
+    if env_values.get('MONGODB_JOURNAL'):
+        options['journal'] = env_values['MONGODB_JOURNAL'].lower() == 'true'
+    if env_values.get('MONGODB_READ_PREFERENCE'):
+        options['readPreference'] = env_values['MONGODB_READ_PREFERENCE']
+    return options
+
+
+def get_client():
+    """The MongoClient of this process
+
+    MongoClient is not fork safe, so a child process opens its own on first use
+    instead of inheriting the pool of its parent.
+    """
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = MongoClient(get_mongodb_uri(), **client_options())
+            _client_pid = os.getpid()
+        return _client
+
+
+def close_client():
+    global _client
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+
+
+def mongodb(write_concern: WriteConcern = None, read_preference: str = None):
+    """
+    :param write_concern: override the client write concern for this database handle
+    :param read_preference: override the client read preference, e.g. secondaryPreferred
+    """
+    if read_preference is not None:
+        read_preference = make_read_preference(read_pref_mode_from_name(read_preference), None)
+    return get_client().get_database(DATABASE_NAME, write_concern=write_concern, read_preference=read_preference)
+
+
+def get_relay_store():
+    """
+    RELAY_STORE in the dotenv file selects where relay records live: `mongodb` (default)
+    or `sqlite:///path/to/relayer.db` for an embedded database without a MongoDB server.
+    """
+    return get_env_values().get('RELAY_STORE', 'mongodb')
+
+
+def database():
+    """The database of the configured relay store"""
+    global _sqlite_database
+    relay_store = get_relay_store()
+    if relay_store.startswith('sqlite:///'):
+        if _sqlite_database is None:
+            _sqlite_database = SqliteDatabase(relay_store[len('sqlite:///'):])
+        return _sqlite_database
+    return mongodb()
+
+
+def provision(db=None):
+    """Backfill the VAA hashes and create the record indexes
+
+    :return: collection name -> {index name: error} of the indexes that could not be built
+    """
+    db = db if db is not None else database()
+    backfill_vaa_hashes(db)
+    return ensure_indexes(db)
+
+
+# Write errors of a primary stepping down or shutting down, the write succeeds on a retry
+TRANSIENT_WRITE_ERRORS = {6, 7, 50, 89, 91, 189, 262, 9001, 10107, 11600, 11602, 13435, 13436}
+
+
+class WriteBuffer:
+    """Write-behind queue of one collection
+
+    Writes are grouped into ordered `bulk_write` batches, flushed when `max_batch`
+    writes are queued, every `max_delay` seconds, on `flush` and at exit. Duplicate key
+    errors are dropped: the unique indexes are what dedupes records. Other write errors,
+    such as a failed validation, are logged and their write dropped, while transient
+    ones (network, write concern, elections) keep the writes queued for the next flush.
+
+    Writes still queued are lost when the process is killed, so only writes that can be
+    redone, such as watcher inserts, belong in a buffer.
+
+    :param before: buffer flushed first on every flush, e.g. of the documents the writes reference
+    """
+
+    def __init__(self, collection, max_batch=100, max_delay=0.5, before=None):
+        self.collection = collection
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.before = before
+        self._requests = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        atexit.register(self.flush)
+        # multiprocessing children leave through os._exit, skipping atexit
+        multiprocessing.util.Finalize(self, self.flush, exitpriority=10)
+
+    def add(self, request):
+        with self._lock:
+            self._requests.append(request)
+            full = len(self._requests) >= self.max_batch
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="write_buffer", daemon=True)
+                self._thread.start()
+        if full:
+            self.flush()
+
+    def flush(self):
+        if self.before is not None:
+            self.before.flush()
+        with self._flush_lock:
+            with self._lock:
+                requests, self._requests = self._requests, []
+            while requests:
+                try:
+                    self.collection.bulk_write(requests, ordered=True)
+                    requests = []
+                except BulkWriteError as e:
+                    if not e.details.get('writeErrors'):
+                        # Write concern failed only, writes are idempotent upserts and updates to redo
+                        self._requeue(requests)
+                        raise
+                    error = e.details['writeErrors'][0]
+                    # An ordered batch stops at its first error, the writes from it on are still pending
+                    if error['code'] in TRANSIENT_WRITE_ERRORS:
+                        self._requeue(requests[error['index']:])
+                        raise
+                    if error['code'] != 11000:
+                        # Would fail again on every flush and hold back every write after it
+                        print(f"Drop {self.collection.name} write {requests[error['index']]}: {error.get('errmsg')}")
+                    requests = requests[error['index'] + 1:]
+                except Exception:
+                    # Connection errors and timeouts, retried on the next flush
+                    self._requeue(requests)
+                    raise
+
+    def _requeue(self, requests):
+        with self._lock:
+            self._requests = requests + self._requests
+
+    def _run(self):
+        while True:
+            time.sleep(self.max_delay)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Flush {self.collection.name} write buffer fail: {e}")
+
+
+class VaaStore:
+    """VAAs as binary blobs keyed by `vaa_hash`, referenced from relay records"""
+
+    def __init__(self, db=None, buffered=False):
+        db = db if db is not None else database()
+        self.db = db['Vaa']
+        self.buffer = WriteBuffer(self.db) if buffered else None
+
+    def flush(self):
+        if self.buffer is not None:
+            self.buffer.flush()
+
+    def put(self, vaa):
+        """Store a VAA once and return its hash"""
+        key = vaa_hash(vaa)
+        request = UpdateOne({'vaa_hash': key}, {'$setOnInsert': {'vaa_hash': key, 'vaa': vaa_to_bytes(vaa)}},
+                            upsert=True)
+        if self.buffer is not None:
+            self.buffer.add(request)
+        else:
+            self.db.bulk_write([request])
+        return key
+
+    def get_many(self, hashes):
+        """:return: vaa_hash -> hex VAA of the stored ones"""
+        self.flush()
+        return {
+            blob['vaa_hash']: vaa_from_bytes(blob['vaa'])
+            for blob in self.db.find({'vaa_hash': {'$in': list(hashes)}}, {'_id': False})
+        }
+
+
+class RelayRecord:
+    """
+    Relay records reference their VAAs by `vaa_hash`/`withdraw_vaa_hash`, the VAAs
+    themselves live in the VaaStore. Records written before that still carry the hex
+    `vaa`/`withdraw_vaa` until relay_vaa_migration.py moves them.
+    """
+
+    def __init__(self, db=None, buffered=False):
+        """
+        :param buffered: queue writes in a WriteBuffer, reads flush it first
+        """
+        db = db if db is not None else database()
+        self.db = db['RelayRecord']
+        self.vaa_store = VaaStore(db, buffered)
+        # VAAs first, so that a flushed record never references a missing VAA
+        self.buffer = WriteBuffer(self.db, before=self.vaa_store.buffer) if buffered else None
+
+    def _write(self, request):
+        if self.buffer is not None:
+            self.buffer.add(request)
+        else:
+            self.db.bulk_write([request])
+
+    def flush(self):
+        self.vaa_store.flush()
+        if self.buffer is not None:
+            self.buffer.flush()
+
+    def store_vaa(self, vaa):
+        """Store a VAA and return the hash to reference it by"""
+        return self.vaa_store.put(vaa)
+
+    def load_vaas(self, records):
+        """Fill in `vaa`/`withdraw_vaa` of records from the VaaStore, in one query"""
+        hashes = set()
+        for record in records:
+            for (field, hash_field) in [('vaa', 'vaa_hash'), ('withdraw_vaa', 'withdraw_vaa_hash')]:
+                if field not in record and hash_field in record:
+                    hashes.add(record[hash_field])
+        if not hashes:
+            return records
+        vaas = self.vaa_store.get_many(hashes)
+        for record in records:
+            for (field, hash_field) in [('vaa', 'vaa_hash'), ('withdraw_vaa', 'withdraw_vaa_hash')]:
+                if field not in record and record.get(hash_field) in vaas:
+                    record[field] = vaas[record[hash_field]]
+        return records
+
+    def add_other_record(self, src_chain_id, src_tx_id, nonce, call_name, block_number, sequence, vaa, relay_fee,
+                         start_time):
+        record = {
+            "src_chain_id": src_chain_id,
+            "src_tx_id": src_tx_id,
+            "nonce": nonce,
+            "call_name": call_name,
+            "block_number": block_number,
+            "sequence": sequence,
+            "vaa_hash": self.store_vaa(vaa),
+            "relay_fee": relay_fee,
+            "core_tx_id": "",
+            "core_costed_fee": 0,
+            "status": "false",
+            "reason": "Unknown",
+            "start_time": start_time,
+            "end_time": "",
+        }
+        self._write(UpdateOne({'vaa_hash': record['vaa_hash']}, {'$setOnInsert': record}, upsert=True))
+
+    def add_withdraw_record(self, src_chain_id, src_tx_id, nonce, call_name, block_number, sequence, vaa, relay_fee,
+                            start_time, core_tx_id="", core_costed_fee=0, withdraw_chain_id="",
+                            withdraw_tx_id="",
+                            withdraw_sequence=0, withdraw_vaa="", withdraw_pool="", withdraw_costed_fee=0,
+                            status='false'):
+        record = {
+            "src_chain_id": src_chain_id,
+            "src_tx_id": src_tx_id,
+            "nonce": nonce,
+            "call_name": call_name,
+            "block_number": block_number,
+            "sequence": sequence,
+            "vaa_hash": self.store_vaa(vaa),
+            "relay_fee": relay_fee,
+            "core_tx_id": core_tx_id,
+            "core_costed_fee": core_costed_fee,
+            "withdraw_chain_id": withdraw_chain_id,
+            "withdraw_tx_id": withdraw_tx_id,
+            "withdraw_sequence": withdraw_sequence,
+            "withdraw_pool": withdraw_pool,
+            "withdraw_costed_fee": withdraw_costed_fee,
+            "status": status,
+            "reason": "Unknown",
+            "start_time": start_time,
+            "end_time": "",
+        }
+        if withdraw_vaa:
+            record["withdraw_vaa_hash"] = self.store_vaa(withdraw_vaa)
+        self._write(UpdateOne({'vaa_hash': record['vaa_hash']}, {'$setOnInsert': record}, upsert=True))
+
+    def add_wait_record(self, src_chain_id, src_tx_id, nonce, sequence, block_number, relay_fee_value, date):
+        record = {
+            'src_chain_id': src_chain_id,
+            'src_tx_id': src_tx_id,
+            'nonce': nonce,
+            'sequence': sequence,
+            'block_number': block_number,
+            'relay_fee': relay_fee_value,
+            'status': 'waitForVaa',
+            'start_time': date,
+            'end_time': "",
+        }
+        # Only the first sighting of a source transaction is recorded
+        self._write(UpdateOne({'src_chain_id': src_chain_id, 'nonce': nonce, 'sequence': sequence},
+                              {'$setOnInsert': record}, upsert=True))
+
+    def update_record(self, filter, update):
+        self._write(UpdateOne(filter, update))
+
+    def update_by_vaa_hash(self, key, update):
+        # `provision` backfills vaa_hash on records written before it existed
+        self._write(UpdateOne({'vaa_hash': key}, update))
+
+    def update_by_withdraw_vaa_hash(self, key, update):
+        self._write(UpdateOne({'withdraw_vaa_hash': key}, update))
+
+    def find_by_nonce(self, src_chain_id, nonce):
+        """Records of a source transaction, with their VAAs"""
+        self.flush()
+        return self.load_vaas(list(self.db.find({'src_chain_id': src_chain_id, 'nonce': nonce})))
+
+    def find_one(self, filter):
+        self.flush()
+        return self.db.find_one(filter)
+
+    def find(self, filter):
+        self.flush()
+        return self.db.find(filter)
+
+    def recorded_sequences(self, src_chain_id, sequences):
+        """The (nonce, sequence) pairs of a source chain that already have a record, in one query"""
+        self.flush()
+        return {
+            (record['nonce'], record['sequence'])
+            for record in self.db.find({'src_chain_id': src_chain_id, 'sequence': {'$in': list(sequences)}},
+                                       {'_id': False, 'nonce': True, 'sequence': True})
+        }
+
+    def find_unrelay_txs(self, src_chain_id, call_name, limit=0):
+        self.flush()
+        cursor = self.db.find(
+            {'src_chain_id': src_chain_id, 'call_name': call_name, 'status': 'fail', 'reason': 'success'},
+            {'_id': False})
+        if limit > 0:
+            cursor = cursor.limit(limit)
+        return self.load_vaas(list(cursor))
+
+    def find_unrelay_txs_by_sequence(self, src_chain_id, sequence):
+        self.flush()
+        return self.load_vaas(list(self.db.find(
+            {
+                'src_chain_id': src_chain_id,
+                'status': 'fail',
+                'reason': 'success',
+                'sequence': sequence,
+            },
+            {'_id': False}
+        )))
+
+
+class GasRecord:
+
+    def __init__(self, db=None, buffered=False):
+        """
+        :param buffered: queue writes in a WriteBuffer, reads flush it first
+        """
+        db = db if db is not None else database()
+        self.db = db['GasRecord']
+        self.buffer = WriteBuffer(self.db) if buffered else None
+
+    def _write(self, request):
+        if self.buffer is not None:
+            self.buffer.add(request)
+        else:
+            self.db.bulk_write([request])
+
+    def flush(self):
+        if self.buffer is not None:
+            self.buffer.flush()
+
+    def add_gas_record(self, src_chain_id, nonce, dst_chain_id, call_name, core_gas=0, feed_nums=0):
+        # A retried core execution overwrites the gas of the previous attempt
+        self._write(UpdateOne(
+            {'src_chain_id': src_chain_id, 'nonce': nonce},
+            {
+                '$set': {
+                    'dst_chain_id': dst_chain_id,
+                    'call_name': call_name,
+                    'core_gas': core_gas,
+                    'feed_nums': feed_nums,
+                    'updated_at': time.time(),
+                },
+                '$setOnInsert': {'withdraw_gas': 0},
+            },
+            upsert=True))
+
+    def update_record(self, filter, update):
+        # `updated_at` is what the fee quote engine follows
+        update = {**update, '$set': {**update.get('$set', {}), 'updated_at': time.time()}}
+        self._write(UpdateOne(filter, update))
+
+    def find(self, filter):
+        self.flush()
+        return self.db.find(filter)
+
+    def find_latest(self, src_chain_id, dst_chain_id, call_name, feed_nums=None, limit=20):
+        filter = {"src_chain_id": src_chain_id, "dst_chain_id": dst_chain_id, "call_name": call_name}
+        if feed_nums is not None:
+            filter["feed_nums"] = feed_nums
+        self.flush()
+        return list(self.db.find(filter).sort('nonce', -1).limit(limit))
+
+    def find_max_core_gas(self, src_chain_id, dst_chain_id, call_name):
+        self.flush()
+        return list(self.db.find(
+            {"src_chain_id": src_chain_id, "dst_chain_id": dst_chain_id, "call_name": call_name}).sort(
+            'core_gas', -1).limit(1))
@@ -0,0 +1,180 @@
+"""Query plans and latencies of the relayer's hot RelayRecord/GasRecord queries
+
+    python relay_db_benchmark.py --uri mongodb://127.0.0.1:27017 --records 200000
+    python relay_db_benchmark.py --mongomock --records 20000
+
+Fills a scratch database with synthetic records shaped like the relayer's, runs every
+hot query without and with the indexes of relay_indexes, and prints the winning plan
+stage and latency percentiles of each. mongomock has no query planner and always
+scans, so with --mongomock the numbers are only a smoke test of the queries.
+"""
+import argparse
+import os
+import random
+import time
+
+import numpy as np
+from pymongo.errors import OperationFailure
+
+from relay_indexes import ensure_indexes, vaa_hash
+
+CALL_NAMES = ['supply', 'withdraw', 'borrow', 'repay', 'liquidate', 'as_collateral', 'cancel_as_collateral']
+SRC_CHAIN_IDS = [0, 5, 23, 24, 30]
+STATUSES = ['success'] * 90 + ['fail'] * 4 + ['waitForWithdraw', 'withdraw', 'false', 'waitForVaa', 'dropped',
+                                                'waitForVaa']
+# Guardian-signed VAAs are 1-2KB, i.e. 2-4K hex characters
+VAA_HEX_LENGTH = 3000
+
+
+def random_vaa():
+    return "0x" + os.urandom(VAA_HEX_LENGTH // 2).hex()
+
+
+def make_records(count):
+    relay_records = []
+    gas_records = []
+    for nonce in range(count):
+        src_chain_id = random.choice(SRC_CHAIN_IDS)
+        call_name = random.choice(CALL_NAMES)
+        status = random.choice(STATUSES)
+        vaa = random_vaa()
+        withdraw_vaa = random_vaa() if call_name in ['withdraw', 'borrow'] else ""
+        relay_record = {
+            'src_chain_id': src_chain_id,
+            'src_tx_id': os.urandom(32).hex(),
+            'nonce': nonce,
+            'call_name': call_name,
+            'block_number': 1000000 + nonce,
+            'sequence': nonce,
+            'vaa': vaa,
+            'vaa_hash': vaa_hash(vaa),
+            'relay_fee': random.random(),
+            'core_tx_id': os.urandom(32).hex(),
+            'core_costed_fee': random.random(),
+            'withdraw_chain_id': random.choice(SRC_CHAIN_IDS),
+            'withdraw_vaa': withdraw_vaa,
+            'status': status,
+            'reason': 'success' if status == 'fail' else 'Unknown',
+            'start_time': str(1690000000 + nonce),
+            'end_time': "",
+        }
+        if withdraw_vaa:
+            relay_record['withdraw_vaa_hash'] = vaa_hash(withdraw_vaa)
+        relay_records.append(relay_record)
+        gas_records.append({
+            'src_chain_id': src_chain_id,
+            'nonce': nonce,
+            'dst_chain_id': random.choice(SRC_CHAIN_IDS),
+            'call_name': call_name,
+            'core_gas': random.randint(1000, 100000),
+            'withdraw_gas': random.randint(0, 300000),
+            'feed_nums': random.randint(0, 3),
+        })
+    return relay_records, gas_records
+
+
+def hot_queries(relay_records):
+    sample = random.choice(relay_records)
+    return [
+        ('dedupe (src_chain_id, nonce, sequence)', 'RelayRecord',
+         lambda c: c.find_one({'src_chain_id': sample['src_chain_id'], 'nonce': sample['nonce'],
+                               'sequence': sample['sequence']}),
+         {'src_chain_id': sample['src_chain_id'], 'nonce': sample['nonce'], 'sequence': sample['sequence']}),
+        ('core queue status false + $mod', 'RelayRecord',
+         lambda c: list(c.find({'status': 'false', 'nonce': {'$mod': [3, 1]}})),
+         {'status': 'false', 'nonce': {'$mod': [3, 1]}}),
+        ('withdraw queue by chain', 'RelayRecord',
+         lambda c: list(c.find({'status': 'withdraw', 'withdraw_chain_id': 0})),
+         {'status': 'withdraw', 'withdraw_chain_id': 0}),
+        ('waitForVaa by block', 'RelayRecord',
+         lambda c: list(c.find({'status': 'waitForVaa', 'src_chain_id': 5}).sort('block_number', 1)),
+         {'status': 'waitForVaa', 'src_chain_id': 5}),
+        ('update key: vaa string', 'RelayRecord',
+         lambda c: c.find_one({'vaa': sample['vaa']}),
+         {'vaa': sample['vaa']}),
+        ('update key: vaa_hash', 'RelayRecord',
+         lambda c: c.find_one({'vaa_hash': sample['vaa_hash']}),
+         {'vaa_hash': sample['vaa_hash']}),
+        ('gas window sort nonce limit 20', 'GasRecord',
+         lambda c: list(c.find({'src_chain_id': 5, 'dst_chain_id': 0, 'call_name': 'borrow', 'feed_nums': 1})
+                        .sort('nonce', -1).limit(20)),
+         {'src_chain_id': 5, 'dst_chain_id': 0, 'call_name': 'borrow', 'feed_nums': 1}),
+        ('gas max core_gas', 'GasRecord',
+         lambda c: list(c.find({'src_chain_id': 5, 'dst_chain_id': 5, 'call_name': 'withdraw'})
+                        .sort('core_gas', -1).limit(1)),
+         {'src_chain_id': 5, 'dst_chain_id': 5, 'call_name': 'withdraw'}),
+    ]
+
+
+def winning_stage(collection, filter):
+    try:
+        plan = collection.find(filter).explain()['queryPlanner']['winningPlan']
+    except Exception:
+        return "n/a"
+    stages = []
+    while plan:
+        stages.append(plan.get('stage', '?'))
+        plan = plan.get('inputStage') or (plan.get('inputStages') or [None])[0]
+    return "<-".join(stages)
+
+
+def measure(db, queries, repeat):
+    rows = []
+    for (name, collection_name, run, filter) in queries:
+        collection = db[collection_name]
+        latencies = []
+        try:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                run(collection)
+                latencies.append((time.perf_counter() - start) * 1000)
+        except OperationFailure as e:
+            # e.g. mongomock doesn't implement $mod
+            rows.append((name, f"unsupported: {e}", float('nan'), float('nan')))
+            continue
+        rows.append((name, winning_stage(collection, filter), np.percentile(latencies, 50),
+                     np.percentile(latencies, 99)))
+    return rows
+
+
+def report(title, rows):
+    print(f"\n{title}")
+    print(f"{'query':<42} {'plan':<34} {'p50 ms':>9} {'p99 ms':>9}")
+    for (name, stage, p50, p99) in rows:
+        print(f"{name:<42} {stage[:34]:<34} {p50:>9.3f} {p99:>9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark relay record queries with and without indexes")
+    parser.add_argument("--uri", default="mongodb://127.0.0.1:27017")
+    parser.add_argument("--mongomock", action="store_true", help="use an in-process mongomock client")
+    parser.add_argument("--database", default="DolaProtocolBenchmark")
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    if args.mongomock:
+        import mongomock
+        client = mongomock.MongoClient()
+    else:
+        from pymongo import MongoClient
+        client = MongoClient(args.uri)
+
+    client.drop_database(args.database)
+    db = client[args.database]
+    try:
+        relay_records, gas_records = make_records(args.records)
+        for start in range(0, args.records, 10000):
+            db['RelayRecord'].insert_many(relay_records[start:start + 10000])
+            db['GasRecord'].insert_many(gas_records[start:start + 10000])
+
+        queries = hot_queries(relay_records)
+        report(f"{args.records} records, no indexes", measure(db, queries, args.repeat))
+        ensure_indexes(db)
+        report(f"{args.records} records, relay_indexes", measure(db, queries, args.repeat))
+    finally:
+        client.drop_database(args.database)
+
+
+if __name__ == "__main__":
+    main()
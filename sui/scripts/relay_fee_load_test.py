@@ -0,0 +1,85 @@
+"""Load test for relay_fee_service
+
+    python relay_fee_load_test.py --url http://127.0.0.1:5000 --concurrency 64 --duration 30
+
+Every worker requests the paths below in a loop and the script prints the throughput
+and latency percentiles of each path.
+"""
+import argparse
+import asyncio
+import time
+from collections import defaultdict
+
+import aiohttp
+import numpy as np
+
+DEFAULT_PATHS = [
+    "/relay_fee/5/0/supply",
+    "/relay_fee/0/5/withdraw/1",
+    "/relay_fee/23/23/borrow/2",
+    "/max_relay_fee/5/5/withdraw",
+    "/unrelay_txs/5/supply/10",
+    "/tvl",
+]
+
+
+async def worker(session, url, paths, deadline, latencies, errors):
+    k = 0
+    while time.monotonic() < deadline:
+        path = paths[k % len(paths)]
+        k += 1
+        start = time.perf_counter()
+        try:
+            async with session.get(f"{url}{path}") as response:
+                await response.read()
+                if response.status != 200:
+                    errors[path] += 1
+                    continue
+        except aiohttp.ClientError:
+            errors[path] += 1
+            continue
+        latencies[path].append(time.perf_counter() - start)
+
+
+async def run(url, paths, concurrency, duration):
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    deadline = time.monotonic() + duration
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*[
+            worker(session, url, paths[k % len(paths):] + paths[:k % len(paths)], deadline, latencies, errors)
+            for k in range(concurrency)
+        ])
+    return latencies, errors
+
+
+def report(latencies, errors, duration):
+    print(f"{'path':<36} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9} {'errors':>7}")
+    for path in sorted(set(latencies) | set(errors)):
+        samples = np.array(latencies[path]) * 1000
+        if len(samples):
+            p50, p99, worst = np.percentile(samples, 50), np.percentile(samples, 99), samples.max()
+        else:
+            p50 = p99 = worst = float('nan')
+        print(f"{path:<36} {len(samples) / duration:>9.1f} {p50:>9.2f} {p99:>9.2f} {worst:>9.2f} "
+              f"{errors[path]:>7}")
+    total = sum(len(v) for v in latencies.values())
+    print(f"total {total / duration:.1f} req/s, {sum(errors.values())} errors")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test relay_fee_service")
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--path", action="append", dest="paths",
+                        help="path to request, may be repeated (default: a mix of every route)")
+    args = parser.parse_args()
+
+    latencies, errors = asyncio.run(run(args.url, args.paths or DEFAULT_PATHS, args.concurrency, args.duration))
+    report(latencies, errors, args.duration)
+
+
+if __name__ == "__main__":
+    main()
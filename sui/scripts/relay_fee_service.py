@@ -1,47 +1,211 @@
+import asyncio
+import contextlib
+import time
 from pathlib import Path
 
-from flask import Flask
-from flask_cors import CORS
+import uvicorn
+from motor.motor_asyncio import AsyncIOMotorClient
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Route
 
 import dola_ethereum_sdk
 import dola_sui_sdk
+import relay_db
 import relayer
-from dola_sui_sdk import interfaces
-
-app = Flask(__name__)
-CORS(app)
-
-dola_ethereum_sdk.set_dola_project_path(Path("../.."))
-dola_sui_sdk.set_dola_project_path("../..")
-relayer.init_markets()
-
-
-@app.route('/unrelay_txs/<src_chain_id>/<call_name>')
-@app.route('/unrelay_txs/<src_chain_id>/<call_name>/<limit>')
-def unrelay_txs(src_chain_id, call_name, limit=0):
-    return relayer.get_unrelay_txs(src_chain_id, call_name, limit)
-
-
-@app.route('/unrelay_tx/<src_chain_id>/<sequence>')
-def unrelay_tx(src_chain_id, sequence):
-    return relayer.get_unrelay_tx_by_sequence(src_chain_id, sequence)
-
-
-@app.route('/relay_fee/<src_chain_id>/<dst_chain_id>/<call_name>')
-@app.route('/relay_fee/<src_chain_id>/<dst_chain_id>/<call_name>/<feed_nums>')
-def relay_fee(src_chain_id, dst_chain_id, call_name, feed_nums=0):
-    return relayer.get_relay_fee(src_chain_id, dst_chain_id, call_name, feed_nums)
-
-
-@app.route('/max_relay_fee/<src_chain_id>/<dst_chain_id>/<call_name>')
-def max_relay_fee(src_chain_id, dst_chain_id, call_name):
-    return relayer.get_max_relay_fee(src_chain_id, dst_chain_id, call_name)
-
-
-@app.route('/tvl')
-def total_otoken_value():
-    return {"tvl": str(interfaces.get_protocol_total_otoken_value())}
-
+from fee_quote import FeeQuoteEngine
+from relay_indexes import vaa_from_bytes
+from tvl import TvlAggregator
+
+# Seconds a response may be served from cache, per route
+CACHE_TTL = {
+    'unrelay_txs': 2,
+    'unrelay_tx': 2,
+    'relay_fee': 1,
+    'max_relay_fee': 5,
+    'tvl': 5,
+}
+
+
+class SingleFlightCache:
+    """Coalesce identical in-flight requests and keep their results for a short time
+
+    Concurrent callers with the same key share one computation, and callers arriving
+    within `ttl` seconds after it finished get the stored result.
+    """
+
+    def __init__(self):
+        self._results = {}
+        self._inflight = {}
+
+    async def get(self, key, ttl, compute):
+        cached = self._results.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+
+        if key not in self._inflight:
+            self._inflight[key] = asyncio.ensure_future(self._compute(key, ttl, compute))
+        return await asyncio.shield(self._inflight[key])
+
+    async def _compute(self, key, ttl, compute):
+        try:
+            result = await compute()
+            self._results[key] = (time.monotonic() + ttl, result)
+            return result
+        finally:
+            del self._inflight[key]
+
+    def evict_expired(self):
+        now = time.monotonic()
+        for key in [k for k, (expire, _) in self._results.items() if expire <= now]:
+            del self._results[key]
+
+
+cache = SingleFlightCache()
+db = None
+# Set instead of `db` when the relay store is SQLite, which has no async driver
+relay_record = None
+# Started by `lifespan`, importing the app makes no network calls
+fee_quote_engine = None
+tvl_aggregator = None
+
+
+async def evict_cache():
+    while True:
+        await asyncio.sleep(10)
+        cache.evict_expired()
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    global db, relay_record, fee_quote_engine, tvl_aggregator
+    dola_ethereum_sdk.set_dola_project_path(Path("../.."))
+    dola_sui_sdk.set_dola_project_path("../..")
+    relayer.init_markets()
+    fee_quote_engine = FeeQuoteEngine().start()
+    tvl_aggregator = TvlAggregator().start()
+
+    client = None
+    if relay_db.get_relay_store().startswith('sqlite:///'):
+        relay_record = relay_db.RelayRecord()
+    else:
+        client = AsyncIOMotorClient(relay_db.get_mongodb_uri(), **relay_db.client_options())
+        db = client[relay_db.DATABASE_NAME]
+    evictor = asyncio.create_task(evict_cache())
+    yield
+    evictor.cancel()
+    fee_quote_engine.stop()
+    tvl_aggregator.stop()
+    if client is not None:
+        client.close()
+
+
+async def load_vaas(records):
+    """Fill in the hex VAAs that relay records reference by hash"""
+    fields = [('vaa', 'vaa_hash'), ('withdraw_vaa', 'withdraw_vaa_hash')]
+    hashes = {record[hash_field] for record in records for (field, hash_field) in fields
+              if field not in record and hash_field in record}
+    if hashes:
+        vaas = {blob['vaa_hash']: vaa_from_bytes(blob['vaa'])
+                async for blob in db['Vaa'].find({'vaa_hash': {'$in': list(hashes)}}, {'_id': False})}
+        for record in records:
+            for (field, hash_field) in fields:
+                if field not in record and record.get(hash_field) in vaas:
+                    record[field] = vaas[record[hash_field]]
+    return records
+
+
+async def find_unrelay_txs(src_chain_id, call_name, limit):
+    relayer.check_valid_call_name(call_name)
+
+    if relay_record is not None:
+        return {'result': await run_in_threadpool(relay_record.find_unrelay_txs, int(src_chain_id), call_name,
+                                                  int(limit))}
+    cursor = db['RelayRecord'].find(
+        {'src_chain_id': int(src_chain_id), 'call_name': call_name, 'status': 'fail', 'reason': 'success'},
+        {'_id': False})
+    if int(limit) > 0:
+        cursor = cursor.limit(int(limit))
+    return {'result': await load_vaas(await cursor.to_list(length=None))}
+
+
+async def find_unrelay_tx_by_sequence(src_chain_id, sequence):
+    if relay_record is not None:
+        return {'result': await run_in_threadpool(relay_record.find_unrelay_txs_by_sequence, int(src_chain_id),
+                                                  int(sequence))}
+    cursor = db['RelayRecord'].find(
+        {
+            'src_chain_id': int(src_chain_id),
+            'status': 'fail',
+            'reason': 'success',
+            'sequence': int(sequence),
+        },
+        {'_id': False}
+    )
+    return {'result': await load_vaas(await cursor.to_list(length=None))}
+
+
+async def unrelay_txs(request):
+    src_chain_id = request.path_params['src_chain_id']
+    call_name = request.path_params['call_name']
+    limit = request.path_params.get('limit', 0)
+    result = await cache.get(('unrelay_txs', src_chain_id, call_name, limit), CACHE_TTL['unrelay_txs'],
+                             lambda: find_unrelay_txs(src_chain_id, call_name, limit))
+    return JSONResponse(result)
+
+
+async def unrelay_tx(request):
+    src_chain_id = request.path_params['src_chain_id']
+    sequence = request.path_params['sequence']
+    result = await cache.get(('unrelay_tx', src_chain_id, sequence), CACHE_TTL['unrelay_tx'],
+                             lambda: find_unrelay_tx_by_sequence(src_chain_id, sequence))
+    return JSONResponse(result)
+
+
+async def relay_fee(request):
+    src_chain_id = request.path_params['src_chain_id']
+    dst_chain_id = request.path_params['dst_chain_id']
+    call_name = request.path_params['call_name']
+    feed_nums = request.path_params.get('feed_nums', 0)
+    result = await cache.get(
+        ('relay_fee', src_chain_id, dst_chain_id, call_name, feed_nums), CACHE_TTL['relay_fee'],
+        lambda: run_in_threadpool(fee_quote_engine.relay_fee, src_chain_id, dst_chain_id, call_name, feed_nums))
+    return JSONResponse(result)
+
+
+async def max_relay_fee(request):
+    src_chain_id = request.path_params['src_chain_id']
+    dst_chain_id = request.path_params['dst_chain_id']
+    call_name = request.path_params['call_name']
+    result = await cache.get(
+        ('max_relay_fee', src_chain_id, dst_chain_id, call_name), CACHE_TTL['max_relay_fee'],
+        lambda: run_in_threadpool(fee_quote_engine.max_relay_fee, src_chain_id, dst_chain_id, call_name))
+    return JSONResponse(result)
+
+
+async def total_otoken_value(request):
+    async def compute():
+        return {"tvl": str(await run_in_threadpool(tvl_aggregator.tvl))}
+
+    return JSONResponse(await cache.get(('tvl',), CACHE_TTL['tvl'], compute))
+
+
+app = Starlette(
+    routes=[
+        Route('/unrelay_txs/{src_chain_id}/{call_name}', unrelay_txs),
+        Route('/unrelay_txs/{src_chain_id}/{call_name}/{limit}', unrelay_txs),
+        Route('/unrelay_tx/{src_chain_id}/{sequence}', unrelay_tx),
+        Route('/relay_fee/{src_chain_id}/{dst_chain_id}/{call_name}', relay_fee),
+        Route('/relay_fee/{src_chain_id}/{dst_chain_id}/{call_name}/{feed_nums}', relay_fee),
+        Route('/max_relay_fee/{src_chain_id}/{dst_chain_id}/{call_name}', max_relay_fee),
+        Route('/tvl', total_otoken_value),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'])],
+    lifespan=lifespan,
+)
 
 if __name__ == '__main__':
-    app.run(host='::', port=5000)
+    uvicorn.run(app, host='::', port=5000)
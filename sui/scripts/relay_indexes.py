@@ -0,0 +1,99 @@
+import hashlib
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+RELAY_RECORD_INDEXES = [
+    # watcher dedupe and lookups by source transaction
+    IndexModel([('src_chain_id', ASCENDING), ('nonce', ASCENDING), ('sequence', ASCENDING)],
+               name='src_chain_id_nonce_sequence'),
+    IndexModel([('src_chain_id', ASCENDING), ('sequence', ASCENDING)], name='src_chain_id_sequence'),
+    # latest record of a source chain
+    IndexModel([('src_chain_id', ASCENDING), ('start_time', DESCENDING)], name='src_chain_id_start_time'),
+    IndexModel([('src_chain_id', ASCENDING), ('block_number', DESCENDING)], name='src_chain_id_block_number'),
+    # executor queues: status false in nonce order, withdraw by chain, waitForVaa by block
+    IndexModel([('status', ASCENDING), ('nonce', ASCENDING)], name='status_nonce'),
+    IndexModel([('status', ASCENDING), ('withdraw_chain_id', ASCENDING)], name='status_withdraw_chain_id'),
+    IndexModel([('status', ASCENDING), ('src_chain_id', ASCENDING), ('block_number', ASCENDING)],
+               name='status_src_chain_id_block_number'),
+    # unrelayed transactions of the fee service
+    IndexModel([('status', ASCENDING), ('reason', ASCENDING), ('src_chain_id', ASCENDING),
+                ('call_name', ASCENDING)], name='status_reason_src_chain_id_call_name'),
+    # short keys used instead of matching on the VAA itself, one record per VAA
+    IndexModel([('vaa_hash', ASCENDING)], name='vaa_hash', unique=True,
+               partialFilterExpression={'vaa_hash': {'$exists': True}}),
+    IndexModel([('withdraw_vaa_hash', ASCENDING)], name='withdraw_vaa_hash', sparse=True),
+]
+
+GAS_RECORD_INDEXES = [
+    IndexModel([('src_chain_id', ASCENDING), ('dst_chain_id', ASCENDING), ('call_name', ASCENDING),
+                ('feed_nums', ASCENDING), ('nonce', DESCENDING)], name='route_feed_nums_nonce'),
+    IndexModel([('src_chain_id', ASCENDING), ('dst_chain_id', ASCENDING), ('call_name', ASCENDING),
+                ('nonce', DESCENDING)], name='route_nonce'),
+    IndexModel([('src_chain_id', ASCENDING), ('dst_chain_id', ASCENDING), ('call_name', ASCENDING),
+                ('core_gas', DESCENDING)], name='route_core_gas'),
+    # one gas record per source transaction
+    IndexModel([('src_chain_id', ASCENDING), ('nonce', ASCENDING)], name='src_chain_id_nonce', unique=True),
+    # records written since the last refresh of the fee quote engine
+    IndexModel([('updated_at', ASCENDING)], name='updated_at'),
+]
+
+VAA_INDEXES = [
+    # VAA blobs referenced by `vaa_hash`/`withdraw_vaa_hash` of relay records
+    IndexModel([('vaa_hash', ASCENDING)], name='vaa_hash', unique=True),
+]
+
+
+def vaa_hash(vaa: str) -> str:
+    """Short lookup key of a VAA, the first 16 bytes of its sha256 in hex
+
+    Hashed in the form of `vaa_from_bytes`, so the key doesn't depend on the `0x` prefix or case.
+    """
+    vaa = vaa.lower()
+    return hashlib.sha256((vaa if vaa.startswith("0x") else f"0x{vaa}").encode()).hexdigest()[:32]
+
+
+def vaa_to_bytes(vaa: str) -> bytes:
+    """Raw bytes of a hex VAA, stored as BinData instead of twice as many characters of hex"""
+    return bytes.fromhex(vaa[2:] if vaa.startswith("0x") else vaa)
+
+
+def vaa_from_bytes(data: bytes) -> str:
+    return f"0x{bytes(data).hex()}"
+
+
+def backfill_vaa_hashes(db, batch_size=1000):
+    """Set `vaa_hash`/`withdraw_vaa_hash` on records written before they existed
+
+    :return: number of updated records
+    """
+    relay_record = db['RelayRecord']
+    updated = 0
+    for (field, hash_field) in [('vaa', 'vaa_hash'), ('withdraw_vaa', 'withdraw_vaa_hash')]:
+        cursor = relay_record.find(
+            {field: {'$exists': True, '$ne': ""}, hash_field: {'$exists': False}},
+            {field: True}, batch_size=batch_size)
+        for record in cursor:
+            relay_record.update_one({'_id': record['_id']}, {'$set': {hash_field: vaa_hash(record[field])}})
+            updated += 1
+    return updated
+
+
+def ensure_indexes(db):
+    """Create the RelayRecord, GasRecord and Vaa indexes, existing ones are left untouched
+
+    A unique index fails to build while the collection still holds duplicates, the
+    others are created regardless.
+
+    :return: collection name -> {index name: error} of the indexes that could not be built
+    """
+    failures = {}
+    for (collection_name, indexes) in [('RelayRecord', RELAY_RECORD_INDEXES), ('GasRecord', GAS_RECORD_INDEXES),
+                                        ('Vaa', VAA_INDEXES)]:
+        failures[collection_name] = {}
+        for index in indexes:
+            try:
+                db[collection_name].create_indexes([index])
+            except OperationFailure as e:
+                failures[collection_name][index.document['name']] = str(e)
+    return failures
@@ -0,0 +1,502 @@
+"""Throughput of the relayer watcher -> executor pipeline against local fakes
+
+    python relay_pipeline_benchmark.py --events 300 --burst 30 --burst-interval 1 --executors 3
+    python relay_pipeline_benchmark.py --sources sui,polygon-main --vaa-delay 2 --rpc-latency-ms 20
+    python relay_pipeline_benchmark.py --uri mongodb://127.0.0.1:27017
+    python relay_pipeline_benchmark.py --layout process --rpc-latency-ms 20
+
+The real `relayer` roles (sui_portal_watcher, eth_portal_watcher, wormhole_vaa_guardian
+and sui_core_executor) run under the relayer's supervisor in its `--layout`: threads of
+one process per chain (grouped) or one process per role (process), against:
+
+- a fake Sui JSON-RPC node (events, payloads, gas price, balance, dryRun, execute),
+- a fake Wormhole guardian REST API serving the signed VAAs of published events,
+  optionally only `--vaa-delay` seconds after them,
+- a fake EVM JSON-RPC node per EVM source (eth_getLogs and friends),
+- an embedded SQLite relay store, or a scratch MongoDB database with --uri.
+
+Building real Move calls and EVM contract bindings needs the deployed packages, so the
+SDK transaction functions (core_*, parse_vaa, parseVM, payload lookups) are replaced by
+fakes issuing the same dryRun/execute/eth_call RPCs. Events are published in bursts and
+a relay counts as done when the core transaction of its VAA is executed; the report has
+events/s, end-to-end latency percentiles, RPC calls per relay and the peak memory of the
+role processes (proportional set size, pages shared after fork counted once).
+"""
+import argparse
+import base64
+import contextlib
+import functools
+import json
+import multiprocessing
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+import requests
+import web3
+from sui_brownie.sui_client import SuiClient
+
+import config
+import dola_ethereum_sdk
+import dola_ethereum_sdk.init as dola_ethereum_init
+import dola_ethereum_sdk.load as dola_ethereum_load
+import dola_sui_sdk
+import dola_sui_sdk.lending as dola_sui_lending
+import relay_db
+import relayer
+from dola_sui_sdk.load import sui_project
+from relay_store import SqliteDatabase
+from sui_brownie.supervisor import Supervisor
+
+BENCHMARK_ADDRESS = "0x" + "be" * 32
+RELAY_EVENT_TOPIC = '0x5ed67fb05a814ff06302127070d306aa25929e34ac0e29ed7dfe3f0212854078'
+# Guardian signatures and body before the payload, roughly the size of a 13-guardian VAA
+VAA_HEADER = bytes(range(256)) * 4
+GAS_USED = {'computationCost': "1000000", 'storageCost': "2000000", 'storageRebate': "1000000",
+            'nonRefundableStorageFee': "0"}
+CALL_TYPES = {'supply': 0, 'repay': 3, 'as_collateral': 5}
+
+
+def make_payload(src_chain_id, nonce, sequence):
+    return struct.pack('>HQQ', src_chain_id, nonce, sequence)
+
+
+def parse_payload(vaa):
+    """(src_chain_id, nonce, sequence) of a benchmark VAA"""
+    return struct.unpack('>HQQ', bytes.fromhex(vaa.replace('0x', ''))[-18:])
+
+
+def payload_hex(vaa):
+    return vaa.replace('0x', '')[-36:]
+
+
+class RpcStats:
+
+    def __init__(self):
+        self.calls = Counter()
+        self.published = {}
+        self.executed = {}
+        self._lock = threading.Lock()
+
+    def count(self, name):
+        with self._lock:
+            self.calls[name] += 1
+
+    def publish(self, key):
+        self.published[key] = time.time()
+
+    def execute(self, key):
+        with self._lock:
+            self.executed.setdefault(key, time.time())
+
+
+class FakeServer:
+    """A ThreadingHTTPServer on a free local port, `handle_rpc`/`handle_get` answer requests"""
+
+    name = "fake"
+
+    def __init__(self, stats, latency=0.0):
+        self.stats = stats
+        self.latency = latency
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                time.sleep(server.latency)
+                server.stats.count(f"{server.name}:{request['method']}")
+                try:
+                    body = {'jsonrpc': "2.0", 'id': request.get('id', 1),
+                            'result': server.handle_rpc(request['method'], request.get('params', []))}
+                except KeyError as e:
+                    body = {'jsonrpc': "2.0", 'id': request.get('id', 1),
+                            'error': {'code': -32601, 'message': f"unsupported: {e}"}}
+                self.reply(200, body)
+
+            def do_GET(self):
+                time.sleep(server.latency)
+                server.stats.count(f"{server.name}:GET")
+                self.reply(*server.handle_get(self.path))
+
+            def reply(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, name=self.name, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def handle_rpc(self, method, params):
+        raise KeyError(method)
+
+    def handle_get(self, path):
+        return 404, {'message': "not found"}
+
+    def close(self):
+        self.httpd.shutdown()
+
+
+class FakeSuiNode(FakeServer):
+    name = "sui"
+
+    def __init__(self, stats, latency=0.0):
+        self.events = []
+        self.payloads = {}
+        self._lock = threading.Lock()
+        super().__init__(stats, latency)
+
+    def publish(self, nonce, sequence, call_name, fee_amount):
+        digest = f"bench{sequence:012d}"
+        with self._lock:
+            self.events.append({
+                'id': {'txDigest': digest, 'eventSeq': "1"},
+                'parsedJson': {'app_id': 1, 'call_type': CALL_TYPES[call_name], 'sequence': str(sequence),
+                               'nonce': str(nonce), 'fee_amount': str(fee_amount)},
+                # one second apart, the watcher resumes from the latest start_time
+                'timestampMs': str(1_700_000_000_000 + sequence * 1000),
+            })
+            self.payloads[digest] = make_payload(0, nonce, sequence)
+
+    def handle_rpc(self, method, params):
+        if method == 'suix_queryEvents':
+            (_, cursor, limit, _) = params
+            with self._lock:
+                start = 0
+                if cursor is not None:
+                    start = next((i + 1 for (i, event) in enumerate(self.events)
+                                  if event['id']['txDigest'] == cursor['txDigest']), 0)
+                page = self.events[start:start + limit]
+                has_next_page = start + limit < len(self.events)
+            return {'data': page, 'nextCursor': page[-1]['id'] if page else cursor, 'hasNextPage': has_next_page}
+        if method == 'sui_getEvents':
+            wormhole = sui_project.network_config['packages']['wormhole']
+            return [{'type': f'{wormhole}::publish_message::WormholeMessage',
+                     'parsedJson': {'payload': list(self.payloads.get(params[0], b""))}}]
+        if method == 'suix_getReferenceGasPrice':
+            return "750"
+        if method == 'suix_getBalance':
+            return {'coinType': params[1], 'totalBalance': str(10 ** 15)}
+        if method in ['sui_dryRunTransactionBlock', 'sui_devInspectTransactionBlock']:
+            return {'effects': {'status': {'status': "success"}, 'gasUsed': GAS_USED}}
+        if method == 'sui_executeTransactionBlock':
+            self.stats.execute(parse_payload(params[0]))
+            return {'digest': f"exec{params[0][-36:]}",
+                    'effects': {'status': {'status': "success"}, 'gasUsed': GAS_USED}}
+        raise KeyError(method)
+
+
+class FakeGuardian(FakeServer):
+    name = "guardian"
+
+    def __init__(self, stats, latency=0.0, vaa_delay=0.0):
+        self.vaa_delay = vaa_delay
+        self.vaas = {}
+        super().__init__(stats, latency)
+
+    def sign(self, wormhole_chain_id, src_chain_id, nonce, sequence):
+        vaa = VAA_HEADER + make_payload(src_chain_id, nonce, sequence)
+        self.vaas[(wormhole_chain_id, sequence)] = (time.time() + self.vaa_delay, vaa)
+
+    def handle_get(self, path):
+        # /v1/signed_vaa/{emitter_chain_id}/{emitter_address}/{sequence}
+        parts = path.strip('/').split('/')
+        signed = self.vaas.get((int(parts[2]), int(parts[4])))
+        if signed is None or signed[0] > time.time():
+            return 404, {'code': 5, 'message': "requested VAA not found in store"}
+        return 200, {'vaaBytes': base64.b64encode(signed[1]).decode()}
+
+
+class FakeEvmNode(FakeServer):
+    name = "evm"
+
+    def __init__(self, stats, network, latency=0.0):
+        self.network = network
+        self.chain_id = config.NET_TO_WORMHOLE_CHAIN_ID[network]
+        self.block_number = 1_000_000
+        self.logs = []
+        self.payloads = {}
+        self._lock = threading.Lock()
+        super().__init__(stats, latency)
+
+    def publish(self, nonce, sequence, call_name, fee_amount):
+        with self._lock:
+            self.block_number += 1
+            tx_hash = "0x" + os.urandom(32).hex()
+            words = [sequence, nonce, fee_amount, 1, CALL_TYPES[call_name]]
+            self.logs.append({
+                'address': "0x" + "11" * 20,
+                'topics': [RELAY_EVENT_TOPIC],
+                'data': "0x" + "".join(f"{word:064x}" for word in words),
+                'blockNumber': hex(self.block_number),
+                'blockHash': "0x" + "22" * 32,
+                'transactionHash': tx_hash,
+                'transactionIndex': "0x0",
+                'logIndex': "0x0",
+                'removed': False,
+            })
+            self.payloads[tx_hash] = make_payload(self.chain_id, nonce, sequence).hex()
+
+    def handle_rpc(self, method, params):
+        if method == 'eth_chainId':
+            return hex(self.chain_id)
+        if method == 'eth_blockNumber':
+            return hex(self.block_number)
+        if method == 'eth_gasPrice':
+            return hex(30 * 10 ** 9)
+        if method == 'eth_getLogs':
+            from_block = params[0].get('fromBlock', 0)
+            from_block = int(from_block, 16) if isinstance(from_block, str) else from_block
+            with self._lock:
+                return [log for log in self.logs if int(log['blockNumber'], 16) >= from_block]
+        if method == 'eth_call':
+            # parseVM of the wormhole contract, answered with the payload
+            return "0x" + payload_hex(params[0]['data'])
+        if method == 'eth_getTransactionReceipt':
+            return {'transactionHash': params[0], 'payload': self.payloads[params[0]]}
+        raise KeyError(method)
+
+    def call(self, method, params):
+        response = requests.post(self.url, json={'jsonrpc': "2.0", 'id': 1, 'method': method, 'params': params})
+        return response.json()['result']
+
+
+class FakeLending:
+    """dola_sui_sdk.lending transaction functions issuing a dryRun and an execute each"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def _execute(self, vaa):
+        effects = self.client.sui_dryRunTransactionBlock(vaa)['effects']
+        result = self.client.sui_executeTransactionBlock(vaa, [], {'showEffects': True}, "WaitForLocalExecution")
+        gas = (int(effects['gasUsed']['computationCost']) + int(effects['gasUsed']['storageCost'])
+               - int(effects['gasUsed']['storageRebate']))
+        return gas, result['digest']
+
+    def core(self, vaa, relay_fee=0, fee_rate=0.8):
+        gas, digest = self._execute(vaa)
+        return gas, True, "success", digest
+
+    def core_with_feeds(self, vaa, relay_fee=0, fee_rate=0.8):
+        gas, digest = self._execute(vaa)
+        return gas, True, "success", 0, digest
+
+    def parse_vaa(self, vaa):
+        self.client.sui_devInspectTransactionBlock(BENCHMARK_ADDRESS, vaa, "750", None)
+        return payload_hex(vaa)
+
+
+class FakeWormholeContract:
+
+    def __init__(self, node):
+        self.node = node
+        self.address = "0x" + "33" * 20
+
+    def parseVM(self, vaa):
+        payload = self.node.call('eth_call', [{'to': self.address, 'data': vaa}, "latest"])
+        return (1, 0, 0, 0, "0x", 0, 0, payload)
+
+
+def open_store(uri):
+    if uri:
+        from pymongo import MongoClient
+        client = MongoClient(uri)
+        client.drop_database("DolaProtocolPipelineBenchmark")
+        return client["DolaProtocolPipelineBenchmark"], lambda: client.drop_database("DolaProtocolPipelineBenchmark")
+    directory = tempfile.mkdtemp()
+    return SqliteDatabase(str(Path(directory).joinpath("relayer.db"))), lambda: shutil.rmtree(directory)
+
+
+@contextlib.contextmanager
+def fake_environment(db, sui_node, guardian, evm_nodes):
+    client = SuiClient(sui_node.url, timeout=30)
+    lending = FakeLending(client)
+    evm_by_network = {node.network: node for node in evm_nodes}
+
+    def get_payload_from_chain(tx_id):
+        node = next(node for node in evm_nodes if tx_id in node.payloads)
+        return node.call('eth_getTransactionReceipt', [tx_id])['payload']
+
+    with contextlib.ExitStack() as stack:
+        def patch(target, attribute, new):
+            stack.enter_context(mock.patch.object(target, attribute, new))
+
+        patch(relay_db, 'database', lambda: db)
+        patch(dola_sui_sdk, 'set_dola_project_path', lambda *args, **kwargs: None)
+        patch(dola_ethereum_sdk, 'set_dola_project_path', lambda *args, **kwargs: None)
+        patch(dola_ethereum_sdk, 'set_ethereum_network', lambda *args, **kwargs: None)
+        patch(sui_project.get(), 'active_account', lambda *args, **kwargs: None)
+        patch(sui_project.get(), 'use_account', lambda *args, **kwargs: None)
+        patch(sui_project.get(), 'client', client)
+        stack.enter_context(mock.patch.dict(sui_project.network_config, {'wormhole_url': guardian.url}))
+        patch(relayer, 'get_token_price', lambda token: 1.0)
+        patch(relayer, 'sui_total_balance',
+              lambda: int(client.suix_getBalance(BENCHMARK_ADDRESS, '0x2::sui::SUI')['totalBalance']))
+        for call_name in ['binding', 'unbinding', 'supply', 'repay', 'as_collateral', 'cancel_as_collateral']:
+            patch(dola_sui_lending, f'core_{call_name}', lending.core)
+        for call_name in ['withdraw', 'borrow', 'liquidate']:
+            patch(dola_sui_lending, f'core_{call_name}', lending.core_with_feeds)
+        patch(dola_sui_lending, 'parse_vaa', lending.parse_vaa)
+
+        patch(relayer, 'brownie', SimpleNamespace(web3=SimpleNamespace(provider=SimpleNamespace(endpoint_uri=""))))
+        patch(dola_ethereum_init, 'fallback_endpoints_web3',
+              lambda network, external_endpoint=None: web3.Web3(web3.HTTPProvider(evm_by_network[network].url)))
+        patch(dola_ethereum_init, 'get_payload_from_chain', get_payload_from_chain)
+        patch(dola_ethereum_load, 'womrhole_package', lambda network: FakeWormholeContract(evm_by_network[network]))
+        patch(dola_ethereum_load, 'wormhole_adapter_pool_package', lambda network: FakeWormholeContract(None))
+        patch(dola_ethereum_load, 'lending_portal_package', lambda network: FakeWormholeContract(None))
+        patch(dola_ethereum_load, 'system_portal_package', lambda network: FakeWormholeContract(None))
+        yield
+
+
+def publish_bursts(args, stats, sui_node, guardian, evm_nodes):
+    sources = args.sources.split(',')
+    call_names = args.call_names.split(',')
+    nonces = Counter()
+    published = 0
+    while published < args.events:
+        for _ in range(min(args.burst, args.events - published)):
+            source = sources[published % len(sources)]
+            call_name = call_names[published % len(call_names)]
+            nonce = nonces[source]
+            nonces[source] += 1
+            if source == 'sui':
+                src_chain_id = 0
+                guardian.sign(config.NET_TO_WORMHOLE_CHAIN_ID[sui_project.network], 0, nonce, nonce)
+                sui_node.publish(nonce, nonce, call_name, fee_amount=10 ** 7)
+            else:
+                node = next(node for node in evm_nodes if node.network == source)
+                src_chain_id = node.chain_id
+                guardian.sign(node.chain_id, node.chain_id, nonce, nonce)
+                node.publish(nonce, nonce, call_name, fee_amount=10 ** 15)
+            stats.publish((src_chain_id, nonce, nonce))
+            published += 1
+        time.sleep(args.burst_interval)
+
+
+def memory_kb(pid):
+    """Proportional set size of `pid`, its resident set size where smaps_rollup is not available"""
+    for (file, field) in [(f"/proc/{pid}/smaps_rollup", "Pss:"), (f"/proc/{pid}/status", "VmRSS:")]:
+        try:
+            with open(file) as f:
+                for line in f:
+                    if line.startswith(field):
+                        return int(line.split()[1])
+        except OSError:
+            continue
+    return 0
+
+
+class MemorySampler:
+    """Peak memory of this process and of its child processes, sampled while waiting"""
+
+    def __init__(self):
+        self.peak_kb = {'benchmark': 0, 'roles': 0, 'processes': 0}
+
+    def sample(self):
+        children = multiprocessing.active_children()
+        self.peak_kb['benchmark'] = max(self.peak_kb['benchmark'], memory_kb(os.getpid()))
+        self.peak_kb['roles'] = max(self.peak_kb['roles'], sum(memory_kb(child.pid) for child in children))
+        self.peak_kb['processes'] = max(self.peak_kb['processes'], len(children))
+
+
+def report(args, stats, elapsed, memory):
+    latencies = [stats.executed[key] - stats.published[key] for key in stats.executed if key in stats.published]
+    relayed = len(latencies)
+    print(f"\n{args.events} events from {args.sources}, bursts of {args.burst} every {args.burst_interval}s, "
+          f"{args.executors} core executors, rpc latency {args.rpc_latency_ms}ms, vaa delay {args.vaa_delay}s")
+    print(f"relayed {relayed}/{args.events} in {elapsed:.1f}s: {relayed / elapsed:.2f} events/s")
+    print(f"{args.layout} layout: {memory.peak_kb['processes']} role processes, peak memory "
+          f"{memory.peak_kb['roles'] / 1024:.1f} MiB, benchmark process {memory.peak_kb['benchmark'] / 1024:.1f} MiB")
+    if latencies:
+        print("end-to-end latency s: " + "  ".join(
+            f"p{q} {np.percentile(latencies, q):.2f}" for q in [50, 90, 99]) + f"  max {max(latencies):.2f}")
+    print(f"\n{'rpc':<42} {'calls':>8} {'per relay':>10}")
+    for (name, calls) in sorted(stats.calls.items()):
+        print(f"{name:<42} {calls:>8} {calls / max(relayed, 1):>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the relayer pipeline against local fakes")
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--burst", type=int, default=20, help="events published at once")
+    parser.add_argument("--burst-interval", type=float, default=1.0, help="seconds between bursts")
+    parser.add_argument("--sources", default="sui", help="comma separated: sui and/or EVM networks")
+    parser.add_argument("--call-names", default="supply,repay,as_collateral")
+    parser.add_argument("--executors", type=int, default=3, help="sui core executors")
+    parser.add_argument("--rpc-latency-ms", type=float, default=0.0, help="added to every fake RPC")
+    parser.add_argument("--vaa-delay", type=float, default=0.0, help="seconds until the guardian serves a VAA")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--uri", default="", help="MongoDB to use instead of an embedded SQLite store")
+    parser.add_argument("--layout", choices=["grouped", "process"], default="grouped",
+                        help="see relayer.relayer_services")
+    args = parser.parse_args()
+
+    stats = RpcStats()
+    latency = args.rpc_latency_ms / 1000
+    sui_node = FakeSuiNode(stats, latency)
+    guardian = FakeGuardian(stats, latency, args.vaa_delay)
+    evm_nodes = [FakeEvmNode(stats, source, latency) for source in args.sources.split(',') if source != 'sui']
+    db, drop = open_store(args.uri)
+
+    relayer.init_logger().setLevel("WARNING")
+    health = SimpleNamespace(value=True)
+    # The Sui watcher resumes after the latest recorded Sui transaction, an empty one to start from scratch
+    db['RelayRecord'].insert_one({'src_chain_id': 0, 'src_tx_id': "", 'nonce': -1, 'sequence': -1,
+                                  'status': 'success', 'start_time': "0"})
+
+    memory = MemorySampler()
+    with fake_environment(db, sui_node, guardian, evm_nodes):
+        roles = [("sui", f"sui_core_executor_{i + 1}", functools.partial(relayer.sui_core_executor,
+                                                                         f"LendingCore{i + 1}"))
+                 for i in range(args.executors)]
+        if 'sui' in args.sources.split(','):
+            roles.append(("sui", "sui_portal_watcher", functools.partial(relayer.sui_portal_watcher, health)))
+        for node in evm_nodes:
+            roles.append((node.network, f"{node.network}_portal_watcher",
+                          functools.partial(relayer.eth_portal_watcher, health, node.network)))
+            roles.append((node.network, f"{node.network}_vaa_guardian",
+                          functools.partial(relayer.wormhole_vaa_guardian, node.network)))
+        # Role processes fork from here and inherit the fakes
+        supervisor = Supervisor(relayer.relayer_services(roles, args.layout), shutdown_grace=5)
+        supervising = threading.Thread(target=supervisor.run, name="supervisor", daemon=True)
+        supervising.start()
+
+        start = time.time()
+        publisher = threading.Thread(target=publish_bursts, args=(args, stats, sui_node, guardian, evm_nodes),
+                                     daemon=True)
+        publisher.start()
+        while (publisher.is_alive() or len(stats.executed) < args.events) and time.time() - start < args.timeout:
+            memory.sample()
+            time.sleep(0.1)
+        elapsed = (max(stats.executed.values()) if stats.executed else time.time()) - start
+        supervisor.stop()
+        supervising.join()
+
+    report(args, stats, elapsed, memory)
+    drop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+import logging
+import os
+import socket
+import threading
+import time
+
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+
+
+def instance_id():
+    """Name of this relayer instance in lease owners, unique across hosts sharing a relay store
+
+    Set RELAYER_INSTANCE to a stable name per host, the default changes with each process.
+    """
+    return os.environ.get("RELAYER_INSTANCE") or f"{socket.gethostname()}:{os.getpid()}"
+
+
+class WorkQueue:
+    """Relay records matching `filter`, handed out to consumers under a lease
+
+    Consumers sleep in `wait` until a change stream reports a record entering the
+    queue, or until `poll_interval` passes when change streams are not available
+    (standalone mongod, missing privileges). `claims` leases records one by one with
+    `find_one_and_update`, so several executors can share a queue: a record is
+    processed by one of them at a time, and returns to the queue when its lease
+    expires without it leaving the queue. A record given back with `release` is held
+    back for `retry_delay` seconds, doubled on each release up to `max_retry_delay`.
+
+    Relayer instances on several hosts share a queue the same way, leases being owned by
+    `{instance}/{owner}`. The lease of the record being processed is renewed every third of
+    `lease_seconds`, so the records of a dead instance go back to the others within
+    `lease_seconds`, while a slow relay keeps its record. Results are written with `complete`,
+    which is ignored once the lease was lost to another consumer.
+
+    The fencing covers the result write only: a consumer that lost its lease may still have
+    executed the record on chain, and the consumer that took it over then fails on the
+    consumed VAA. Consumers check the chain before recording such a failure where they can,
+    as the eth pool executor does with `consumedVaas`. Sui executions that fail that way are
+    recorded as `fail` and have to be checked against the chain by hand.
+    """
+
+    def __init__(self, relay_record, filter, sort=None, owner="", lease_seconds=60, poll_interval=3,
+                 use_change_stream=True, logger=None, instance=None, retry_delay=1, max_retry_delay=60):
+        self.relay_record = relay_record
+        self.collection = relay_record.db
+        self.filter = filter
+        self.sort = sort
+        self.owner = f"{instance or instance_id()}/{owner}"
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.logger = logger or logging.getLogger("relay_queue")
+
+        # _id -> record of the leases being renewed
+        self._held = {}
+        self._held_lock = threading.Lock()
+        self._renewer = None
+        self._wakeup = threading.Event()
+        self._watcher = None
+        if use_change_stream:
+            self._watcher = threading.Thread(target=self._watch, name="relay_queue", daemon=True)
+            self._watcher.start()
+
+    def _watch(self):
+        pipeline = [
+            {'$match': {
+                **{f'fullDocument.{key}': value for key, value in self.filter.items()},
+                # Not the lease and retry updates, a record only enters the queue through the filtered fields
+                '$or': [
+                    {'operationType': {'$in': ['insert', 'replace']}},
+                    *[{f'updateDescription.updatedFields.{key}': {'$exists': True}} for key in self.filter],
+                ],
+            }}
+        ]
+        backoff = 1
+        while True:
+            try:
+                with self.collection.watch(pipeline, full_document='updateLookup') as stream:
+                    backoff = 1
+                    for _ in stream:
+                        self._wakeup.set()
+            except PyMongoError as e:
+                self.logger.warning(f"Change stream on {self.filter} unavailable, polling every "
+                                    f"{self.poll_interval}s: {e}")
+                # Catch up on what happened while the stream was down
+                self._wakeup.set()
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 300)
+
+    def wait(self, timeout=None):
+        """Block until the queue may have new work"""
+        self._wakeup.wait(self.poll_interval if timeout is None else timeout)
+        self._wakeup.clear()
+
+    def wake(self):
+        self._wakeup.set()
+
+    def pending(self):
+        """Every record in the queue, leased or not"""
+        self.relay_record.flush()
+        return list(self.collection.find(self.filter, sort=self.sort))
+
+    def claim(self, exclude=()):
+        now = time.time()
+        filter = {**self.filter, 'lease_until': {'$not': {'$gt': now}}}
+        if exclude:
+            filter['_id'] = {'$nin': list(exclude)}
+        return self.collection.find_one_and_update(
+            filter,
+            {'$set': {'lease_owner': self.owner, 'lease_until': now + self.lease_seconds}},
+            sort=self.sort,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def claims(self):
+        """Lease the available records one at a time, each at most once per call, with their VAAs
+
+        The lease of a record is renewed until the consumer asks for the next one.
+        """
+        claimed = []
+        try:
+            self.relay_record.flush()
+            while True:
+                record = self.claim(claimed)
+                if record is None:
+                    return
+                claimed.append(record['_id'])
+                self._hold(record)
+                try:
+                    yield self.relay_record.load_vaas([record])[0]
+                finally:
+                    self._unhold(record)
+        except PyMongoError as e:
+            self.logger.warning(f"relay record claim failed! {e}")
+
+    def release(self, record):
+        """Give a record back to the queue before its lease expires, to retry it after a delay"""
+        self._unhold(record)
+        self.relay_record.flush()
+        retries = record.get('retries', 0)
+        delay = min(self.max_retry_delay, self.retry_delay * 2 ** retries)
+        self.collection.update_one({'_id': record['_id'], 'lease_owner': self.owner},
+                                   {'$set': {'lease_until': time.time() + delay, 'retries': retries + 1},
+                                    '$unset': {'lease_owner': ""}})
+
+    def complete(self, record, update):
+        """Apply the result `update` to a leased record and end its lease
+
+        Written through, whatever the buffering of the relay records. Fenced by the lease:
+        dropped when another consumer took the record over meanwhile.
+
+        :return: whether the result was applied
+        """
+        self._unhold(record)
+        update = {**update, '$unset': {**update.get('$unset', {}), 'lease_owner': "", 'lease_until': "", 'retries': ""}}
+        result = self.collection.update_one({'_id': record['_id'], 'lease_owner': self.owner}, update)
+        if result.matched_count == 0:
+            self.logger.warning(f"Lease of relay record {record['_id']} lost to another consumer, result dropped")
+            return False
+        return True
+
+    def _hold(self, record):
+        with self._held_lock:
+            self._held[record['_id']] = record
+            if self._renewer is None or not self._renewer.is_alive():
+                self._renewer = threading.Thread(target=self._renew, name="relay_queue_lease", daemon=True)
+                self._renewer.start()
+
+    def _unhold(self, record):
+        with self._held_lock:
+            self._held.pop(record['_id'], None)
+
+    def _renew(self):
+        while True:
+            time.sleep(self.lease_seconds / 3)
+            with self._held_lock:
+                held = list(self._held)
+            for _id in held:
+                try:
+                    result = self.collection.update_one({'_id': _id, 'lease_owner': self.owner},
+                                                        {'$set': {'lease_until': time.time() + self.lease_seconds}})
+                except PyMongoError as e:
+                    self.logger.warning(f"relay record lease renewal failed! {e}")
+                    continue
+                if result.matched_count == 0:
+                    self.logger.warning(f"Lease of relay record {_id} lost to another consumer")
+                    with self._held_lock:
+                        self._held.pop(_id, None)
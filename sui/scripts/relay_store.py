@@ -0,0 +1,381 @@
+"""Embedded SQLite backend for the relay record repositories
+
+`RelayRecord`, `GasRecord`, `WriteBuffer`, `WorkQueue` and `FeeQuoteEngine` only use a
+small part of the pymongo collection API. `SqliteDatabase` implements that part on
+one SQLite file in WAL mode, so a single-node relayer can run, and the relay
+pipeline can be tested and benchmarked, without a MongoDB server.
+
+Each collection is a table of JSON documents with an integer `_id`. Filters are
+translated to SQL over `json_extract`, so the indexes created through
+`create_indexes` (e.g. on `(src_chain_id, nonce)`) serve the lookups. Supported
+operators: equality, $ne, $in, $nin, $gt, $gte, $lt, $lte, $exists, $mod, $not and
+$or in filters; $set, $unset and $setOnInsert in updates. bytes values are kept as
+base64 extended JSON and cannot be filtered on. Change streams are not
+available, `watch` raises and `WorkQueue` falls back to polling.
+"""
+import base64
+import json
+import os
+import re
+import sqlite3
+import threading
+
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.results import BulkWriteResult, InsertOneResult, UpdateResult
+
+FIELD_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_.]*$')
+
+COMPARISONS = {'$gt': '>', '$gte': '>=', '$lt': '<', '$lte': '<='}
+
+
+def _encode_binary(value):
+    # bytes are BinData on MongoDB, extended JSON here
+    if isinstance(value, (bytes, bytearray)):
+        return {'$binary': base64.b64encode(value).decode()}
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _decode_binary(value):
+    if len(value) == 1 and '$binary' in value:
+        return base64.b64decode(value['$binary'])
+    return value
+
+
+def _column(field):
+    if field == '_id':
+        return '_id'
+    if not FIELD_PATTERN.match(field):
+        raise OperationFailure(f"Unsupported field name: {field}")
+    return f"json_extract(doc, '$.{field}')"
+
+
+def _condition(field, condition, params):
+    column = _column(field)
+    if not isinstance(condition, dict):
+        params.append(condition)
+        return f"{column} = ?"
+
+    clauses = []
+    for (operator, value) in condition.items():
+        if operator == '$ne':
+            params.append(value)
+            clauses.append(f"{column} IS NOT ?")
+        elif operator in ('$in', '$nin'):
+            values = list(value)
+            if not values:
+                clauses.append('0' if operator == '$in' else '1')
+                continue
+            params.extend(values)
+            placeholders = ', '.join('?' * len(values))
+            if operator == '$in':
+                clauses.append(f"{column} IN ({placeholders})")
+            else:
+                clauses.append(f"({column} IS NULL OR {column} NOT IN ({placeholders}))")
+        elif operator in COMPARISONS:
+            params.append(value)
+            clauses.append(f"{column} {COMPARISONS[operator]} ?")
+        elif operator == '$exists':
+            if field == '_id':
+                clauses.append('1' if value else '0')
+            else:
+                clauses.append(f"json_type(doc, '$.{field}') IS {'NOT NULL' if value else 'NULL'}")
+        elif operator == '$mod':
+            (divisor, remainder) = value
+            params.extend([divisor, remainder])
+            clauses.append(f"{column} % ? = ?")
+        elif operator == '$not':
+            inner = _condition(field, value, params)
+            clauses.append(f"({column} IS NULL OR NOT ({inner}))")
+        else:
+            raise OperationFailure(f"Unsupported operator: {operator}")
+    return ' AND '.join(clauses) or '1'
+
+
+def _where(filter, params):
+    clauses = []
+    for (field, condition) in (filter or {}).items():
+        if field == '$or':
+            clauses.append('(' + ' OR '.join(f"({_where(sub, params)})" for sub in condition) + ')')
+        elif field == '$and':
+            clauses.append('(' + ' AND '.join(f"({_where(sub, params)})" for sub in condition) + ')')
+        else:
+            clauses.append(_condition(field, condition, params))
+    return ' AND '.join(clauses) or '1'
+
+
+def _order_by(sort):
+    if not sort:
+        return ''
+    return ' ORDER BY ' + ', '.join(
+        f"{_column(field)} {'ASC' if direction == ASCENDING else 'DESC'}" for (field, direction) in sort)
+
+
+def _project(document, projection):
+    if not projection:
+        return document
+    included = {field for (field, keep) in projection.items() if keep and field != '_id'}
+    excluded = {field for (field, keep) in projection.items() if not keep}
+    if included:
+        result = {field: document[field] for field in included if field in document}
+        if '_id' not in excluded:
+            result['_id'] = document['_id']
+        return result
+    return {field: value for (field, value) in document.items() if field not in excluded}
+
+
+def _apply_update(document, update, inserting=False):
+    for (operator, fields) in update.items():
+        if operator == '$set' or (operator == '$setOnInsert' and inserting):
+            document.update(fields)
+        elif operator == '$unset':
+            for field in fields:
+                document.pop(field, None)
+        elif operator != '$setOnInsert':
+            raise OperationFailure(f"Unsupported update operator: {operator}")
+    return document
+
+
+def _normalize_sort(key_or_list, direction=ASCENDING):
+    if key_or_list is None:
+        return []
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction)]
+    return list(key_or_list)
+
+
+class SqliteCursor:
+
+    def __init__(self, collection, filter, projection=None, sort=None):
+        self.collection = collection
+        self.filter = filter
+        self.projection = projection
+        self._sort = _normalize_sort(sort)
+        self._limit = 0
+
+    def sort(self, key_or_list, direction=ASCENDING):
+        self._sort = _normalize_sort(key_or_list, direction)
+        return self
+
+    def limit(self, limit):
+        self._limit = int(limit)
+        return self
+
+    def __iter__(self):
+        params = []
+        sql = f"SELECT _id, doc FROM {self.collection.table} WHERE {_where(self.filter, params)}" + \
+            _order_by(self._sort)
+        if self._limit > 0:
+            sql += f" LIMIT {self._limit}"
+        rows = self.collection.database.execute(sql, params).fetchall()
+        return iter([_project(self.collection.load(row), self.projection) for row in rows])
+
+
+class SqliteCollection:
+
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+        self.table = f'"{name}"'
+        self.database.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} (_id INTEGER PRIMARY KEY AUTOINCREMENT, doc TEXT NOT NULL)")
+
+    @staticmethod
+    def load(row):
+        document = json.loads(row[1], object_hook=_decode_binary)
+        document['_id'] = row[0]
+        return document
+
+    @staticmethod
+    def dump(document):
+        return json.dumps({field: value for (field, value) in document.items() if field != '_id'},
+                          default=_encode_binary)
+
+    def _insert(self, document):
+        try:
+            cursor = self.database.execute(f"INSERT INTO {self.table} (doc) VALUES (?)", [self.dump(document)])
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKeyError(str(e), 11000)
+        document['_id'] = cursor.lastrowid
+        return cursor.lastrowid
+
+    def _replace(self, document):
+        try:
+            self.database.execute(f"UPDATE {self.table} SET doc = ? WHERE _id = ?",
+                                  [self.dump(document), document['_id']])
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKeyError(str(e), 11000)
+
+    def _find_first(self, filter, sort=None):
+        rows = list(SqliteCursor(self, filter, sort=sort).limit(1))
+        return rows[0] if rows else None
+
+    def _update_one(self, filter, update, upsert=False, sort=None):
+        document = self._find_first(filter, sort)
+        if document is not None:
+            self._replace(_apply_update(document, update))
+            return document, 1, None
+        if not upsert:
+            return None, 0, None
+        document = {field: value for (field, value) in filter.items()
+                    if not field.startswith('$') and not isinstance(value, dict)}
+        upserted_id = self._insert(_apply_update(document, update, inserting=True))
+        return document, 0, upserted_id
+
+    def insert_one(self, document):
+        with self.database.transaction():
+            return InsertOneResult(self._insert(document), True)
+
+    def find(self, filter=None, projection=None, sort=None, **kwargs):
+        return SqliteCursor(self, filter, projection, sort)
+
+    def find_one(self, filter=None, projection=None, sort=None, **kwargs):
+        document = self._find_first(filter, sort)
+        return _project(document, projection) if document is not None else None
+
+    def count_documents(self, filter):
+        params = []
+        sql = f"SELECT COUNT(*) FROM {self.table} WHERE {_where(filter, params)}"
+        return self.database.execute(sql, params).fetchone()[0]
+
+    def update_one(self, filter, update, upsert=False):
+        with self.database.transaction():
+            (_, matched, upserted_id) = self._update_one(filter, update, upsert)
+        return UpdateResult({'n': matched or int(upserted_id is not None), 'nModified': matched,
+                             'upserted': upserted_id}, True)
+
+    def find_one_and_update(self, filter, update, sort=None, return_document=ReturnDocument.BEFORE, upsert=False):
+        with self.database.transaction():
+            before = self._find_first(filter, sort)
+            if before is None and not upsert:
+                return None
+            (after, _, _) = self._update_one(filter, update, upsert, sort)
+        if return_document == ReturnDocument.AFTER:
+            return after
+        return before
+
+    def bulk_write(self, requests, ordered=True):
+        """UpdateOne/InsertOne requests in one transaction, committed up to the first write error"""
+        matched = 0
+        upserted = []
+        error = None
+        with self.database.transaction():
+            for (index, request) in enumerate(requests):
+                try:
+                    if hasattr(request, '_filter'):
+                        (_, n, upserted_id) = self._update_one(request._filter, request._doc, request._upsert)
+                        matched += n
+                        if upserted_id is not None:
+                            upserted.append({'index': index, '_id': upserted_id})
+                    else:
+                        self._insert(request._doc)
+                except OperationFailure as e:
+                    # Unsupported operators are BadValue, as MongoDB reports unknown modifiers
+                    error = {'index': index, 'code': e.code if e.code is not None else 2, 'errmsg': str(e)}
+                    break
+        if error is not None:
+            raise BulkWriteError({'writeErrors': [error], 'nMatched': matched, 'upserted': upserted})
+        return BulkWriteResult({'nMatched': matched, 'upserted': upserted}, True)
+
+    def create_indexes(self, indexes):
+        names = []
+        for index in indexes:
+            spec = index.document
+            columns = ', '.join(f"{_column(field)} {'ASC' if direction == ASCENDING else 'DESC'}"
+                                for (field, direction) in spec['key'].items())
+            unique = 'UNIQUE ' if spec.get('unique') else ''
+            where = ''
+            if spec.get('sparse') or spec.get('partialFilterExpression'):
+                # Only documents having every key field are indexed
+                where = ' WHERE ' + ' AND '.join(
+                    f"json_type(doc, '$.{field}') IS NOT NULL" for field in spec['key'])
+            name = f'"{self.name}_{spec["name"]}"'
+            try:
+                with self.database.transaction():
+                    self.database.execute(
+                        f"CREATE {unique}INDEX IF NOT EXISTS {name} ON {self.table} ({columns}){where}")
+            except sqlite3.IntegrityError as e:
+                raise OperationFailure(f"Index build failed: {e}", 11000)
+            names.append(spec['name'])
+        return names
+
+    def watch(self, *args, **kwargs):
+        raise OperationFailure("Change streams are not available on the SQLite relay store")
+
+
+class SqliteDatabase:
+    """A SQLite file standing in for the relayer's Mongo database
+
+    Every process opens its own connection in WAL mode, threads of a process share it
+    under a lock. Writes run in `BEGIN IMMEDIATE` transactions, so read-modify-write
+    operations such as `find_one_and_update` are atomic across processes.
+    """
+
+    def __init__(self, path, busy_timeout=30):
+        self.path = str(path)
+        self.name = os.path.basename(self.path)
+        self.busy_timeout = busy_timeout
+        self._lock = threading.RLock()
+        self._connection = None
+        self._pid = None
+        self._collections = {}
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            self._lock = threading.RLock()
+            self._connection = None
+            self._pid = os.getpid()
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                                               check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+        return self._connection
+
+    def execute(self, sql, params=()):
+        self._check_fork()
+        with self._lock:
+            return self.connection.execute(sql, params)
+
+    def transaction(self):
+        return _Transaction(self)
+
+    def __getitem__(self, name):
+        return self.get_collection(name)
+
+    def get_collection(self, name, **kwargs):
+        if name not in self._collections:
+            self._collections[name] = SqliteCollection(self, name)
+        return self._collections[name]
+
+    def close(self):
+        self._check_fork()
+        if self._connection is not None:
+            self._connection.close()
+        self._connection = None
+
+
+class _Transaction:
+    """Re-entrant `BEGIN IMMEDIATE` ... `COMMIT` holding the connection lock"""
+
+    def __init__(self, database):
+        self.database = database
+
+    def __enter__(self):
+        self.database._check_fork()
+        self.database._lock.acquire()
+        connection = self.database.connection
+        self.outermost = not connection.in_transaction
+        if self.outermost:
+            connection.execute("BEGIN IMMEDIATE")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self.outermost:
+                self.database.connection.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.database._lock.release()
@@ -0,0 +1,93 @@
+"""Move the hex VAAs of existing relay records into the VaaStore
+
+    python relay_vaa_migration.py --dry-run
+    python relay_vaa_migration.py --batch-size 500
+
+Records written before the VaaStore carry `vaa`/`withdraw_vaa` as hex strings. For
+each of them the VAAs are stored once as BinData in the `Vaa` collection, the record
+gets `vaa_hash`/`withdraw_vaa_hash` and loses the strings. The VAAs of a batch are
+written before its records, so an interrupted run leaves no dangling hash and can
+simply be started again.
+"""
+import argparse
+
+from pymongo import UpdateOne
+
+import relay_db
+from relay_indexes import ensure_indexes, vaa_hash, vaa_to_bytes
+
+
+def migrate_vaas(db, batch_size=500, dry_run=False):
+    """
+    :return: (migrated records, hex characters removed, binary bytes stored)
+    """
+    relay_record = db['RelayRecord']
+    vaa_store = db['Vaa']
+    migrated = 0
+    hex_size = 0
+    binary_size = 0
+
+    last_id = None
+    while True:
+        filter = {'$or': [{'vaa': {'$exists': True}}, {'withdraw_vaa': {'$exists': True}}]}
+        if last_id is not None:
+            filter['_id'] = {'$gt': last_id}
+        records = list(relay_record.find(filter, {'_id': True, 'vaa': True, 'withdraw_vaa': True})
+                       .sort('_id', 1).limit(batch_size))
+        if not records:
+            break
+        last_id = records[-1]['_id']
+
+        blobs = {}
+        updates = []
+        for record in records:
+            update = {'$unset': {}, '$set': {}}
+            for (field, hash_field) in [('vaa', 'vaa_hash'), ('withdraw_vaa', 'withdraw_vaa_hash')]:
+                if field not in record:
+                    continue
+                update['$unset'][field] = ""
+                vaa = record[field]
+                if not vaa:
+                    continue
+                key = vaa_hash(vaa)
+                update['$set'][hash_field] = key
+                blobs[key] = vaa_to_bytes(vaa)
+                hex_size += len(vaa)
+            if not update['$set']:
+                del update['$set']
+            updates.append(UpdateOne({'_id': record['_id']}, update))
+        binary_size += sum(len(blob) for blob in blobs.values())
+        migrated += len(updates)
+
+        if dry_run:
+            continue
+        if blobs:
+            vaa_store.bulk_write([
+                UpdateOne({'vaa_hash': key}, {'$setOnInsert': {'vaa_hash': key, 'vaa': blob}}, upsert=True)
+                for (key, blob) in blobs.items()
+            ], ordered=False)
+        relay_record.bulk_write(updates, ordered=False)
+        print(f"Migrated {migrated} records")
+
+    return migrated, hex_size, binary_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Store relay record VAAs as binary blobs referenced by hash")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="only count what would be migrated")
+    args = parser.parse_args()
+
+    db = relay_db.database()
+    if not args.dry_run:
+        failures = ensure_indexes(db)
+        if failures['Vaa']:
+            raise RuntimeError(f"Vaa indexes could not be built: {failures['Vaa']}")
+
+    migrated, hex_size, binary_size = migrate_vaas(db, args.batch_size, args.dry_run)
+    action = "Would migrate" if args.dry_run else "Migrated"
+    print(f"{action} {migrated} records: {hex_size} bytes of hex VAAs -> {binary_size} bytes of distinct binary VAAs")
+
+
+if __name__ == "__main__":
+    main()
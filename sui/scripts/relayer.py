@@ -1,3 +1,4 @@
+import argparse
 import asyncio.exceptions
 import base64
 import datetime
@@ -11,15 +12,14 @@ from multiprocessing import Manager
 from pathlib import Path
 
 import brownie
-import ccxt
 import requests
-from dotenv import dotenv_values
 from gql import gql
 from gql.client import log as gql_client_logs
 from gql.transport.aiohttp import log as gql_logs
-from pymongo import MongoClient
 from retrying import retry
-from sui_brownie.parallelism import ProcessExecutor
+from sui_brownie.supervisor import Service, Supervisor, heartbeat, run_group, stopping
+from sui_brownie.rpc_metrics import current_trace_id, metrics as rpc_metrics
+from sui_brownie.sui_brownie import IndexMode, ResponseProfile
 
 import config
 import dola_ethereum_sdk
@@ -30,6 +30,9 @@ import dola_sui_sdk
 import dola_sui_sdk.init as dola_sui_init
 import dola_sui_sdk.lending as dola_sui_lending
 from dola_sui_sdk.load import sui_project
+import relay_db
+from relay_db import GasRecord, RelayRecord
+from relay_queue import WorkQueue
 
 
 class ColorFormatter(logging.Formatter):
@@ -75,20 +78,27 @@ def init_logger():
     return logger
 
 
+# Token prices used for relay fee math may be this many seconds old.
+TOKEN_PRICE_MAX_AGE = 30
+
+# Services are restarted after this many seconds without heartbeat, e.g. stuck in a retry loop
+HEARTBEAT_TIMEOUT = 600
+
+
 def init_markets():
-    global kucoin
-    kucoin = ccxt.kucoin()
-    kucoin.load_markets()
+    global exchange_manager
+    exchange_manager = dola_sui_lending.get_exchange_manager()
 
 
 def fix_requests_ssl():
     requests.packages.urllib3.util.ssl_.DEFAULT_CIPHERS = 'ALL'
 
 
-@retry
+@retry(stop_max_attempt_number=5, wait_fixed=1000)
 def get_token_price(token):
     symbol = config.NATIVE_TOKEN_NAME_TO_KUCOIN_SYMBOL[token]
-    return float(kucoin.fetch_ticker(symbol)['close'])
+    # Served from the exchange manager cache, only stale symbols go to the network.
+    return exchange_manager.get_price(symbol, max_age=TOKEN_PRICE_MAX_AGE)
 
 
 def get_token_decimal(token):
@@ -147,108 +157,31 @@ def execute_sui_core(call_name, vaa, relay_fee, fee_rate=0.8):
     return gas, executed, status, feed_nums, digest
 
 
-class RelayRecord:
-
-    def __init__(self):
-        db = mongodb()
-        self.db = db['RelayRecord']
-
-    def add_other_record(self, src_chain_id, src_tx_id, nonce, call_name, block_number, sequence, vaa, relay_fee,
-                         start_time):
-        record = {
-            "src_chain_id": src_chain_id,
-            "src_tx_id": src_tx_id,
-            "nonce": nonce,
-            "call_name": call_name,
-            "block_number": block_number,
-            "sequence": sequence,
-            "vaa": vaa,
-            "relay_fee": relay_fee,
-            "core_tx_id": "",
-            "core_costed_fee": 0,
-            "status": "false",
-            "reason": "Unknown",
-            "start_time": start_time,
-            "end_time": "",
-        }
-        self.db.insert_one(record)
-
-    def add_withdraw_record(self, src_chain_id, src_tx_id, nonce, call_name, block_number, sequence, vaa, relay_fee,
-                            start_time, core_tx_id="", core_costed_fee=0, withdraw_chain_id="",
-                            withdraw_tx_id="",
-                            withdraw_sequence=0, withdraw_vaa="", withdraw_pool="", withdraw_costed_fee=0,
-                            status='false'):
-        record = {
-            "src_chain_id": src_chain_id,
-            "src_tx_id": src_tx_id,
-            "nonce": nonce,
-            "call_name": call_name,
-            "block_number": block_number,
-            "sequence": sequence,
-            "vaa": vaa,
-            "relay_fee": relay_fee,
-            "core_tx_id": core_tx_id,
-            "core_costed_fee": core_costed_fee,
-            "withdraw_chain_id": withdraw_chain_id,
-            "withdraw_tx_id": withdraw_tx_id,
-            "withdraw_sequence": withdraw_sequence,
-            "withdraw_vaa": withdraw_vaa,
-            "withdraw_pool": withdraw_pool,
-            "withdraw_costed_fee": withdraw_costed_fee,
-            "status": status,
-            "reason": "Unknown",
-            "start_time": start_time,
-            "end_time": "",
-        }
-        self.db.insert_one(record)
-
-    def add_wait_record(self, src_chain_id, src_tx_id, nonce, sequence, block_number, relay_fee_value, date):
-        record = {
-            'src_chain_id': src_chain_id,
-            'src_tx_id': src_tx_id,
-            'nonce': nonce,
-            'sequence': sequence,
-            'block_number': block_number,
-            'relay_fee': relay_fee_value,
-            'status': 'waitForVaa',
-            'start_time': date,
-            'end_time': "",
-        }
-        self.db.insert_one(record)
-
-    def update_record(self, filter, update):
-        self.db.update_one(filter, update)
-
-    def find_one(self, filter):
-        return self.db.find_one(filter)
-
-    def find(self, filter):
-        return self.db.find(filter)
-
-
-class GasRecord:
-
-    def __init__(self):
-        db = mongodb()
-        self.db = db['GasRecord']
-
-    def add_gas_record(self, src_chain_id, nonce, dst_chain_id, call_name, core_gas=0, feed_nums=0):
-        record = {
-            'src_chain_id': src_chain_id,
-            'nonce': nonce,
-            'dst_chain_id': dst_chain_id,
-            'call_name': call_name,
-            'core_gas': core_gas,
-            'withdraw_gas': 0,
-            'feed_nums': feed_nums
-        }
-        self.db.insert_one(record)
+def traced(records, key, local_logger):
+    """Attribute the Sui RPC calls made while handling each record to its `key` and log their time per step"""
+    for record in records:
+        heartbeat()
+        token = current_trace_id.set(record[key])
+        start = time.time()
+        try:
+            yield record
+        finally:
+            current_trace_id.reset(token)
+            steps = rpc_metrics.pop_trace(record[key])
+            local_logger.info(json.dumps({'trace_id': record[key], 'seconds': round(time.time() - start, 3),
+                                          'rpc': steps}))
+        # Claim no further record on shutdown
+        if stopping():
+            return
 
-    def update_record(self, filter, update):
-        self.db.update_one(filter, update)
 
-    def find(self, filter):
-        return self.db.find(filter)
+def missing_vaa(queue, record, field, local_logger):
+    """Fail a record whose VAA is not in the VaaStore, retrying it would not bring the VAA back"""
+    if record.get(field):
+        return False
+    local_logger.error(f"The {field} of relay record {record['_id']} is missing")
+    queue.complete(record, {"$set": {'status': 'fail', 'reason': f"{field} missing"}})
+    return True
 
 
 def sui_portal_watcher(health):
@@ -256,7 +189,7 @@ def sui_portal_watcher(health):
     local_logger = logger.getChild("[sui_portal_watcher]")
     local_logger.info("Start to watch sui portal ^-^")
 
-    relay_record = RelayRecord()
+    relay_record = RelayRecord(buffered=True)
 
     src_chain_id = 0
 
@@ -266,12 +199,15 @@ def sui_portal_watcher(health):
     result = list(relay_record.find({'src_chain_id': src_chain_id}).sort("start_time", -1).limit(1))
     latest_sui_tx = result[0]['src_tx_id'] if 'src_tx_id' in result[0] else ""
 
-    while True:
+    while not stopping():
+        heartbeat()
         try:
             prev_sui_tx = latest_sui_tx
             result = list(relay_record.find({'src_chain_id': src_chain_id}).sort("start_time", -1).limit(1))
             latest_sui_tx = result[0]['src_tx_id'] if 'src_tx_id' in result[0] else prev_sui_tx
             relay_events = dola_sui_init.query_pool_relay_event(latest_sui_tx)
+            recorded = relay_record.recorded_sequences(
+                src_chain_id, [int(event['parsedJson']['sequence']) for event in relay_events])
 
             for event in relay_events:
                 fields = event['parsedJson']
@@ -286,7 +222,7 @@ def sui_portal_watcher(health):
                     local_logger.error(f"src_chain_nonce: {nonce}, sequence: {sequence}")
                     raise ValueError("Health check failed, sui portal watcher blocked")
 
-                if not relay_record.find_one({'src_chain_id': src_chain_id, 'nonce': nonce, 'sequence': sequence}):
+                if (nonce, sequence) not in recorded:
                     relay_fee_amount = int(fields['fee_amount'])
                     relay_fee_value = get_fee_value(relay_fee_amount, 'sui')
 
@@ -328,21 +264,29 @@ def wormhole_vaa_guardian(network="polygon-test"):
     local_logger = logger.getChild(f"[{network}_wormhole_vaa_guardian]")
     local_logger.info("Start to wait wormhole vaa ^-^")
 
-    relay_record = RelayRecord()
+    relay_record = RelayRecord(buffered=True)
 
     src_chain_id = config.NET_TO_WORMHOLE_CHAIN_ID[network]
     emitter_address = dola_ethereum_load.wormhole_adapter_pool_package(network).address
     wormhole = dola_ethereum_load.womrhole_package(network)
 
-    while True:
+    # The VAA of a waiting record may show up at any time, so the queue is polled as well
+    queue = WorkQueue(relay_record, {'status': 'waitForVaa', 'src_chain_id': src_chain_id},
+                      sort=[("block_number", 1)], poll_interval=5, logger=local_logger)
+
+    while not stopping():
+        heartbeat()
         try:
-            wait_vaa_txs = list(relay_record.find({'status': 'waitForVaa', 'src_chain_id': src_chain_id}).sort(
-                "block_number", 1))
+            wait_vaa_txs = queue.pending()
         except Exception as e:
             local_logger.warning(f"relay record find failed! {e}")
+            queue.wait()
             continue
 
         for tx in wait_vaa_txs:
+            heartbeat()
+            if stopping():
+                break
             try:
                 nonce = tx['nonce']
                 sequence = tx['sequence']
@@ -385,7 +329,7 @@ def wormhole_vaa_guardian(network="polygon-test"):
                     f"Have a {call_name} transaction from {network}, sequence: {nonce}")
             except Exception as e:
                 local_logger.warning(f"Error: {e}")
-        time.sleep(5)
+        queue.wait()
 
 
 def eth_portal_watcher(health, network="polygon-test"):
@@ -395,7 +339,7 @@ def eth_portal_watcher(health, network="polygon-test"):
     local_logger = logger.getChild(f"[{network}_portal_watcher]")
     local_logger.info(f"Start to read {network} pool vaa ^-^")
 
-    relay_record = RelayRecord()
+    relay_record = RelayRecord(buffered=True)
 
     src_chain_id = config.NET_TO_WORMHOLE_CHAIN_ID[network]
     wormhole = dola_ethereum_load.womrhole_package(network)
@@ -417,7 +361,8 @@ def eth_portal_watcher(health, network="polygon-test"):
     result = list(relay_record.find({'src_chain_id': src_chain_id}).sort("block_number", -1).limit(1))
     latest_relay_block_number = result[0]['block_number'] if result else 0
 
-    while True:
+    while not stopping():
+        heartbeat()
         try:
             result = list(relay_record.find({'src_chain_id': src_chain_id}).sort("block_number", -1).limit(1))
             latest_relay_block_number = result[0]['block_number'] if result else latest_relay_block_number
@@ -428,6 +373,8 @@ def eth_portal_watcher(health, network="polygon-test"):
             # query relay events from latest relay block number + 1 to actual latest block number
             relay_events = dola_ethereum_init.query_relay_event_by_get_logs(w3_client, lending_portal, system_portal,
                                                                             latest_relay_block_number)
+            recorded = relay_record.recorded_sequences(
+                src_chain_id, [int(event['sequence']) for event in relay_events])
 
             for event in relay_events:
                 nonce = int(event['nonce'])
@@ -438,13 +385,7 @@ def eth_portal_watcher(health, network="polygon-test"):
                     raise ValueError(f"health check failed, {network} portal watcher blocked")
 
                 # check if the event has been recorded
-                if not list(relay_record.find(
-                        {
-                            'src_chain_id': src_chain_id,
-                            'nonce': nonce,
-                            "sequence": sequence,
-                        }
-                )):
+                if (nonce, sequence) not in recorded:
                     block_number = int(event['blockNumber'])
                     src_tx_id = event['transactionHash']
                     timestamp = int(event['blockTimestamp'])
@@ -503,7 +444,7 @@ def pool_withdraw_watcher(health):
     local_logger = logger.getChild("[pool_withdraw_watcher]")
     local_logger.info("Start to read withdraw vaa ^-^")
 
-    relay_record = RelayRecord()
+    relay_record = RelayRecord(buffered=True)
 
     sui_network = sui_project.network
 
@@ -513,7 +454,8 @@ def pool_withdraw_watcher(health):
         .sort("start_time", -1).limit(1))
     latest_sui_tx = result[0]['core_tx_id']
 
-    while True:
+    while not stopping():
+        heartbeat()
         try:
             prev_sui_tx = latest_sui_tx
             result = list(
@@ -561,7 +503,8 @@ def pool_withdraw_watcher(health):
                         dst_pool_address = f"0x{bytes(dst_pool['dola_address']).hex()}"
 
                     relay_record.update_record({'src_chain_id': source_chain_id, 'nonce': source_chain_nonce},
-                                               {"$set": {'status': 'withdraw', 'withdraw_vaa': vaa,
+                                               {"$set": {'status': 'withdraw',
+                                                         'withdraw_vaa_hash': relay_record.store_vaa(vaa),
                                                          'withdraw_chain_id': dst_chain_id,
                                                          'withdraw_sequence': sequence,
                                                          'withdraw_pool': dst_pool_address}})
@@ -574,25 +517,33 @@ def pool_withdraw_watcher(health):
         time.sleep(1)
 
 
-def sui_core_executor(relayer_account, divisor=1, remainder=0):
+def sui_core_executor(relayer_account):
     dola_sui_sdk.set_dola_project_path(Path("../.."))
-    sui_project.active_account(relayer_account)
+    # Executors may share the project with other threads, the account is theirs only
+    sui_project.use_account(relayer_account)
+    # The executors never read the object cache, don't fetch the objects of each relay, and only read
+    # status, gas and digest from the results. For this thread alone, the project is shared with other roles.
+    sui_project.use_execution(index_mode=IndexMode.SKIP, response_profile=ResponseProfile.EFFECTS)
 
-    local_logger = logger.getChild(f"[sui_core_executor_{remainder}]")
+    local_logger = logger.getChild(f"[sui_core_executor_{relayer_account}]")
     local_logger.info("Start to relay pool vaa ^-^")
 
+    # Status writes follow executions on chain and must not be lost, a lost gas record is one sample less
     relay_record = RelayRecord()
-    gas_record = GasRecord()
+    gas_record = GasRecord(buffered=True)
 
-    while True:
-        try:
-            relay_transactions = relay_record.find({"status": "false", "nonce": {"$mod": [divisor, remainder]}})
-        except Exception as e:
-            local_logger.warning(f"relay record find failed! {e}")
-            continue
+    # Core executors share the queue, each record is leased by one of them
+    queue = WorkQueue(relay_record, {"status": "false"}, sort=[("nonce", 1)], owner=relayer_account,
+                      poll_interval=1, logger=local_logger)
 
-        for tx in relay_transactions:
+    while not stopping():
+        heartbeat()
+        relay_transactions = queue.claims()
+
+        for tx in traced(relay_transactions, 'vaa_hash', local_logger):
             try:
+                if missing_vaa(queue, tx, 'vaa', local_logger):
+                    continue
                 relay_fee_value = tx['relay_fee']
                 relay_fee = get_fee_amount(relay_fee_value)
                 call_name = tx['call_name']
@@ -601,6 +552,7 @@ def sui_core_executor(relayer_account, divisor=1, remainder=0):
                 if sui_total_balance() < int(1e9):
                     local_logger.warning(
                         f"Relayer balance is not enough, need {relay_fee_value} sui")
+                    queue.release(tx)
                     time.sleep(5)
                     continue
 
@@ -634,58 +586,63 @@ def sui_core_executor(relayer_account, divisor=1, remainder=0):
                     timestamp = int(time.time())
                     date = str(datetime.datetime.utcfromtimestamp(timestamp))
                     if call_name in ["withdraw", "borrow"]:
-                        relay_record.update_record({'vaa': tx['vaa']},
-                                                   {"$set": {'relay_fee': relay_fee_value,
-                                                             'status': 'waitForWithdraw',
-                                                             'end_time': date,
-                                                             'core_tx_id': digest,
-                                                             'core_costed_fee': core_costed_fee}})
+                        queue.complete(tx,
+                                       {"$set": {'relay_fee': relay_fee_value,
+                                                 'status': 'waitForWithdraw',
+                                                 'end_time': date,
+                                                 'core_tx_id': digest,
+                                                 'core_costed_fee': core_costed_fee}})
                     else:
-                        relay_record.update_record({'vaa': tx['vaa']},
-                                                   {"$set": {'relay_fee': relay_fee_value, 'status': 'success',
-                                                             'core_tx_id': digest,
-                                                             'core_costed_fee': core_costed_fee,
-                                                             'end_time': date}})
+                        queue.complete(tx,
+                                       {"$set": {'relay_fee': relay_fee_value, 'status': 'success',
+                                                 'core_tx_id': digest,
+                                                 'core_costed_fee': core_costed_fee,
+                                                 'end_time': date}})
                     local_logger.info("Execute sui core success! ")
                     local_logger.info(f"relay fee: {relay_fee_value} USD, consumed fee: {core_costed_fee} USD")
                 else:
-                    relay_record.update_record({'vaa': tx['vaa']},
-                                               {"$set": {'status': 'fail', 'reason': status}})
+                    queue.complete(tx, {"$set": {'status': 'fail', 'reason': status}})
                     local_logger.warning("Execute sui core fail! ")
                     local_logger.warning(f"relay fee: {relay_fee_value} USD, consumed fee: {core_costed_fee} USD")
                     local_logger.warning(f"status: {status}")
             except AssertionError as e:
                 # status = eval(str(e))
-                relay_record.update_record({'vaa': tx['vaa']},
-                                           {"$set": {'status': 'fail', 'reason': str(e)}})
+                queue.complete(tx, {"$set": {'status': 'fail', 'reason': str(e)}})
                 local_logger.warning("Execute sui core fail! ")
                 local_logger.warning(f"status: {str(e)}")
             except Exception as e:
                 traceback.print_exc()
                 local_logger.error(f"Execute sui core fail\n {e}")
-        time.sleep(1)
+                queue.release(tx)
+        queue.wait()
 
 
 def sui_pool_executor(relayer_account):
     dola_sui_sdk.set_dola_project_path(Path("../.."))
-    sui_project.active_account(relayer_account)
+    # Executors may share the project with other threads, the account is theirs only
+    sui_project.use_account(relayer_account)
+    # The executors never read the object cache, don't fetch the objects of each relay, and only read
+    # status, gas and digest from the results. For this thread alone, the project is shared with other roles.
+    sui_project.use_execution(index_mode=IndexMode.SKIP, response_profile=ResponseProfile.EFFECTS)
 
     local_logger = logger.getChild("[sui_pool_executor]")
     local_logger.info("Start to relay sui withdraw vaa ^-^")
 
+    # Status writes follow executions on chain and must not be lost, a lost gas record is one sample less
     relay_record = RelayRecord()
-    gas_record = GasRecord()
+    gas_record = GasRecord(buffered=True)
 
-    while True:
-        try:
-            relay_transactions = relay_record.find(
-                {"status": "withdraw", "withdraw_chain_id": 0})
-        except Exception as e:
-            local_logger.warning(f"relay record find failed! {e}")
-            continue
+    queue = WorkQueue(relay_record, {"status": "withdraw", "withdraw_chain_id": 0}, owner=relayer_account,
+                      logger=local_logger)
 
-        for withdraw_tx in relay_transactions:
+    while not stopping():
+        heartbeat()
+        relay_transactions = queue.claims()
+
+        for withdraw_tx in traced(relay_transactions, 'withdraw_vaa_hash', local_logger):
             try:
+                if missing_vaa(queue, withdraw_tx, 'withdraw_vaa', local_logger):
+                    continue
                 core_costed_fee = (
                     withdraw_tx['core_costed_fee']
                     if "core_costed_fee" in withdraw_tx
@@ -704,6 +661,7 @@ def sui_pool_executor(relayer_account):
                 if sui_total_balance() < int(1e9):
                     local_logger.warning(
                         f"Relayer balance is not enough, need {relay_fee_value} sui")
+                    queue.release(withdraw_tx)
                     time.sleep(5)
                     continue
 
@@ -723,9 +681,9 @@ def sui_pool_executor(relayer_account):
                     withdraw_cost_fee = get_fee_value(tx_gas_amount, 'sui')
 
                     date = str(datetime.datetime.utcfromtimestamp(timestamp))
-                    relay_record.update_record({'withdraw_vaa': vaa},
-                                               {"$set": {'status': 'success', 'withdraw_cost_fee': withdraw_cost_fee,
-                                                         'end_time': date, 'withdraw_tx_id': digest}})
+                    queue.complete(withdraw_tx,
+                                   {"$set": {'status': 'success', 'withdraw_cost_fee': withdraw_cost_fee,
+                                             'end_time': date, 'withdraw_tx_id': digest}})
 
                     local_logger.info("Execute sui withdraw success! ")
                     local_logger.info(
@@ -742,35 +700,44 @@ def sui_pool_executor(relayer_account):
                         local_logger.warning(
                             f"call: {call_name} source_chain: {source_chain_id}, nonce: {source_nonce}")
                 else:
-                    relay_record.update_record({'vaa': withdraw_tx['vaa']},
-                                               {"$set": {'status': 'fail',
-                                                         'reason': status}})
+                    queue.complete(withdraw_tx, {"$set": {'status': 'fail', 'reason': status}})
                     local_logger.warning("Execute sui core fail! ")
                     local_logger.warning(f"status: {status}")
             except Exception as e:
                 traceback.print_exc()
                 local_logger.error(f"Execute sui pool withdraw fail\n {e}")
-        time.sleep(3)
+                queue.release(withdraw_tx)
+        queue.wait()
+
 
+def eth_withdraw_vaa_consumed(withdraw_tx):
+    """Whether the pool already received the withdraw VAA, e.g. from an executor whose lease expired meanwhile"""
+    network = get_dola_network(withdraw_tx['withdraw_chain_id'])
+    vm = dola_ethereum_load.womrhole_package(network).parseVM(withdraw_tx['withdraw_vaa'])
+    return dola_ethereum_load.wormhole_adapter_pool_package(network).consumedVaas(list(vm)[10])
 
-def eth_pool_executor():
+
+def eth_pool_executor(role):
     dola_ethereum_sdk.set_dola_project_path(Path("../.."))
-    local_logger = logger.getChild("[eth_pool_executor]")
+    local_logger = logger.getChild(f"[{role}]")
     local_logger.info("Start to relay eth withdraw vaa ^-^")
 
+    # Status writes follow executions on chain and must not be lost, a lost gas record is one sample less
     relay_record = RelayRecord()
-    gas_record = GasRecord()
+    gas_record = GasRecord(buffered=True)
 
-    while True:
-        try:
-            relay_transactions = relay_record.find(
-                {"status": "withdraw", "withdraw_chain_id": {"$ne": 0}})
-        except Exception as e:
-            local_logger.warning(f"relay record find failed! {e}")
-            continue
+    queue = WorkQueue(relay_record, {"status": "withdraw", "withdraw_chain_id": {"$ne": 0}},
+                      owner=role, logger=local_logger)
+
+    while not stopping():
+        heartbeat()
+        relay_transactions = queue.claims()
 
         for withdraw_tx in relay_transactions:
+            heartbeat()
             try:
+                if missing_vaa(queue, withdraw_tx, 'withdraw_vaa', local_logger):
+                    continue
                 dola_chain_id = withdraw_tx['withdraw_chain_id']
                 network = get_dola_network(dola_chain_id)
                 dola_ethereum_sdk.set_ethereum_network(network)
@@ -797,6 +764,7 @@ def eth_pool_executor():
                 if network in ['arbitrum-main', 'optimism-main'] and int(ethereum_account.balance()) < int(0.01 * 1e18):
                     local_logger.warning(
                         f"Relayer balance is not enough, need 0.01 {get_gas_token(network)}, but available {ethereum_account.balance()}")
+                    queue.release(withdraw_tx)
                     time.sleep(5)
                     continue
 
@@ -817,9 +785,9 @@ def eth_pool_executor():
                 date = str(datetime.datetime.utcfromtimestamp(int(timestamp)))
 
                 withdraw_cost_fee = get_fee_value(tx_gas_amount, get_gas_token(network))
-                relay_record.update_record({'withdraw_vaa': withdraw_tx['withdraw_vaa']},
-                                           {"$set": {'status': 'success', 'withdraw_cost_fee': withdraw_cost_fee,
-                                                     'end_time': date, 'withdraw_tx_id': tx_id}})
+                queue.complete(withdraw_tx,
+                               {"$set": {'status': 'success', 'withdraw_cost_fee': withdraw_cost_fee,
+                                         'end_time': date, 'withdraw_tx_id': tx_id}})
 
                 local_logger.info(f"Execute {network} withdraw success! ")
                 local_logger.info(
@@ -837,11 +805,23 @@ def eth_pool_executor():
                         f"call: {call_name} source: {source_chain}, nonce: {source_nonce}")
             except ValueError as e:
                 local_logger.warning(f"Execute eth pool withdraw fail\n {e}")
-                relay_record.update_record({'withdraw_vaa': withdraw_tx['withdraw_vaa']},
-                                           {"$set": {'status': 'fail', 'reason': str(e)}})
+                try:
+                    consumed = eth_withdraw_vaa_consumed(withdraw_tx)
+                except Exception as check_error:
+                    local_logger.warning(f"Check withdraw vaa on chain fail\n {check_error}")
+                    queue.release(withdraw_tx)
+                    continue
+                if consumed:
+                    # Its result was dropped with the lease, don't record a failure over the withdrawal
+                    queue.complete(withdraw_tx,
+                                   {"$set": {'status': 'success', 'reason': 'withdraw vaa already consumed'}})
+                else:
+                    queue.complete(withdraw_tx, {"$set": {'status': 'fail', 'reason': str(e)}})
             except Exception as e:
                 traceback.print_exc()
                 local_logger.error(f"Execute eth pool withdraw fail\n {e}")
+                queue.release(withdraw_tx)
+        queue.wait()
 
 
 def check_valid_call_name(call_name):
@@ -851,72 +831,35 @@ def check_valid_call_name(call_name):
 
 
 def get_unrelay_txs(src_chain_id, call_name, limit):
-    db = mongodb()
-    relay_record = db['RelayRecord']
-
     check_valid_call_name(call_name)
 
-    if int(limit) > 0:
-        result = list(relay_record.find(
-            {'src_chain_id': int(src_chain_id), 'call_name': call_name, 'status': 'fail', 'reason': 'success'},
-            {'_id': False}).limit(
-            int(limit)))
-    else:
-        result = list(relay_record.find(
-            {'src_chain_id': int(src_chain_id), 'call_name': call_name, 'status': 'fail', 'reason': 'success'},
-            {'_id': False}))
-
-    return {'result': result}
+    return {'result': RelayRecord().find_unrelay_txs(int(src_chain_id), call_name, int(limit))}
 
 
 def get_unrelay_tx_by_sequence(src_chain_id, sequence):
-    db = mongodb()
-    relay_record = db['RelayRecord']
-
-    return {'result': list(
-        relay_record.find(
-            {
-                'src_chain_id': int(src_chain_id),
-                'status': 'fail',
-                'reason': 'success',
-                'sequence': int(sequence),
-            },
-            {'_id': False}
-        )
-    )}
+    return {'result': RelayRecord().find_unrelay_txs_by_sequence(int(src_chain_id), int(sequence))}
 
 
 # The largest relay fee in total history
 def get_max_relay_fee(src_chain_id, dst_chain_id, call_name):
-    db = mongodb()
-    gas_record = db['GasRecord']
-
     check_valid_call_name(call_name)
 
-    result = list(gas_record.find(
-        {"src_chain_id": int(src_chain_id), "dst_chain_id": int(dst_chain_id), "call_name": call_name}).sort(
-        'core_gas', -1).limit(1))
+    result = GasRecord().find_max_core_gas(int(src_chain_id), int(dst_chain_id), call_name)
 
     return calculate_relay_fee(result, int(src_chain_id), int(dst_chain_id))
 
 
 # The largest relay fee of the last five transactions
 def get_relay_fee(src_chain_id, dst_chain_id, call_name, feed_num):
-    db = mongodb()
-    gas_record = db['GasRecord']
+    gas_record = GasRecord()
 
     check_valid_call_name(call_name)
 
     if call_name in ['borrow', 'withdraw', 'cancel_as_collateral']:
-        result = list(gas_record.find(
-            {"src_chain_id": int(src_chain_id), "dst_chain_id": int(dst_chain_id), "call_name": call_name,
-             "feed_nums": int(feed_num)}).sort('nonce', -1).limit(20)) or list(gas_record.find(
-            {"src_chain_id": int(src_chain_id), "dst_chain_id": 0, "call_name": call_name,
-             "feed_nums": int(feed_num)}).sort('nonce', -1).limit(20))
+        result = gas_record.find_latest(int(src_chain_id), int(dst_chain_id), call_name, int(feed_num)) or \
+                 gas_record.find_latest(int(src_chain_id), 0, call_name, int(feed_num))
     else:
-        result = list(gas_record.find(
-            {"src_chain_id": int(src_chain_id), "dst_chain_id": int(dst_chain_id), "call_name": call_name}).sort(
-            'nonce', -1).limit(20))
+        result = gas_record.find_latest(int(src_chain_id), int(dst_chain_id), call_name)
     return calculate_relay_fee(result, int(src_chain_id), int(dst_chain_id))
 
 
@@ -930,8 +873,7 @@ def calculate_relay_fee(records, src_chain_id, dst_chain_id):
     if int(dst_chain_id) == 0:
         withdraw_gas_price = core_gas_price
     else:
-        dola_ethereum_sdk.set_ethereum_network(dst_net)
-        withdraw_gas_price = int(brownie.web3.eth.gas_price)
+        withdraw_gas_price = dola_ethereum_sdk.get_gas_price(dst_net)
 
     max_record = max(records, key=lambda x: x['core_gas'] + x['withdraw_gas'])
 
@@ -952,7 +894,14 @@ def calculate_withdraw_fee(withdraw_gas, gas_price, dst_net):
     return get_fee_value(withdraw_fee_amount, get_gas_token(dst_net))
 
 
-@retry
+def waiting_for_vaa(exception):
+    """Retry while the VAA is not signed yet, reporting the waiting service alive"""
+    heartbeat()
+    return not stopping()
+
+
+# Bounded, a VAA that never shows up must not stop the heartbeat of the services sharing the process
+@retry(stop_max_delay=60000, wait_fixed=1000, retry_on_exception=waiting_for_vaa)
 def get_signed_vaa_by_wormhole(
         emitter: str,
         sequence: int,
@@ -1000,19 +949,6 @@ def get_signed_vaa(
     return response.json()
 
 
-def get_mongodb_uri():
-    env_file = sui_project.config['dotenv']
-    env_values = dotenv_values(sui_project.project_path.joinpath(env_file))
-    return env_values['MONGODB_URI']
-
-
-def mongodb():
-    mongo_uri = get_mongodb_uri()
-    client = MongoClient(mongo_uri)
-
-    return client['DolaProtocol']
-
-
 def sui_total_balance():
     return int(sui_project.client.suix_getBalance(sui_project.account.account_address, '0x2::sui::SUI')['totalBalance'])
 
@@ -1065,9 +1001,37 @@ def test_validate_vaa():
     assert check_payload_hash(payload, payload_by_evm)
 
 
+def relayer_services(roles, layout="grouped"):
+    """Supervised services running `roles`, (group, name, target) tuples
+
+    grouped: one process per group, its roles being threads sharing the Sui project, web3
+        providers, Mongo client and price cache of that process. A group holds the roles of
+        one brownie network, as the active network is global to a process.
+    process: one process per role.
+    """
+    if layout == "process":
+        return [Service(name, target, heartbeat_timeout=HEARTBEAT_TIMEOUT) for (_, name, target) in roles]
+    assert layout == "grouped", f"Unknown layout {layout}"
+    groups = {}
+    for (group, name, target) in roles:
+        groups.setdefault(group, []).append(
+            Service(name, target, kind=Service.THREAD, heartbeat_timeout=HEARTBEAT_TIMEOUT))
+    # A group stops its heartbeat when one of its threads hangs, and is restarted as a whole
+    return [Service(group, functools.partial(run_group, services), heartbeat_timeout=HEARTBEAT_TIMEOUT)
+            for (group, services) in groups.items()]
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Dola relayer")
+    parser.add_argument("--layout", choices=["grouped", "process"], default="grouped",
+                        help="roles as threads of one process per chain, or one process per role")
+    layout = parser.parse_args().layout
+
     init_logger()
     init_markets()
+    for (collection, failures) in relay_db.provision().items():
+        for (index, error) in failures.items():
+            logger.warning(f"Create {collection} index {index} fail: {error}")
     # fix request ssl error
     fix_requests_ssl()
 
@@ -1082,52 +1046,55 @@ def main():
 
     q = manager.Queue()
 
-    pt = ProcessExecutor(executor=21)
-
     sui_dola_chain_id = config.NET_TO_DOLA_CHAIN_ID['sui-mainnet']
     polygon_dola_chain_id = config.NET_TO_DOLA_CHAIN_ID['polygon-main']
     optimism_dola_chain_id = config.NET_TO_DOLA_CHAIN_ID['optimism-main']
     arbitrum_dola_chain_id = config.NET_TO_DOLA_CHAIN_ID['arbitrum-main']
     base_dola_chain_id = config.NET_TO_DOLA_CHAIN_ID['base-main']
 
-    pt.run([
+    roles = [
         # One monitoring pool balance per chain
-        functools.partial(dola_monitor.sui_pool_monitor, logger.getChild("[sui_pool_monitor]"),
-                          all_pools[sui_dola_chain_id], q),
-        functools.partial(dola_monitor.eth_pool_monitor, logger.getChild("[polygon_pool_monitor]"),
-                          polygon_dola_chain_id,
-                          all_pools[polygon_dola_chain_id], q),
-        functools.partial(dola_monitor.eth_pool_monitor, logger.getChild("[optimism_pool_monitor]"),
-                          optimism_dola_chain_id,
-                          all_pools[optimism_dola_chain_id], q),
-        functools.partial(dola_monitor.eth_pool_monitor, logger.getChild("[arbitrum_pool_monitor]"),
-                          arbitrum_dola_chain_id,
-                          all_pools[arbitrum_dola_chain_id], q),
-        functools.partial(dola_monitor.eth_pool_monitor, logger.getChild("[base_pool_monitor]"),
-                          base_dola_chain_id,
-                          all_pools[base_dola_chain_id], q),
+        ("sui", "sui_pool_monitor",
+         functools.partial(dola_monitor.sui_pool_monitor, logger.getChild("[sui_pool_monitor]"),
+                           all_pools[sui_dola_chain_id], q)),
+        ("polygon-main", "polygon_pool_monitor",
+         functools.partial(dola_monitor.eth_pool_monitor, logger.getChild("[polygon_pool_monitor]"),
+                           polygon_dola_chain_id, all_pools[polygon_dola_chain_id], q)),
+        ("optimism-main", "optimism_pool_monitor",
+         functools.partial(dola_monitor.eth_pool_monitor, logger.getChild("[optimism_pool_monitor]"),
+                           optimism_dola_chain_id, all_pools[optimism_dola_chain_id], q)),
+        ("arbitrum-main", "arbitrum_pool_monitor",
+         functools.partial(dola_monitor.eth_pool_monitor, logger.getChild("[arbitrum_pool_monitor]"),
+                           arbitrum_dola_chain_id, all_pools[arbitrum_dola_chain_id], q)),
+        ("base-main", "base_pool_monitor",
+         functools.partial(dola_monitor.eth_pool_monitor, logger.getChild("[base_pool_monitor]"),
+                           base_dola_chain_id, all_pools[base_dola_chain_id], q)),
         # Protocol health monitoring
-        functools.partial(dola_monitor.dola_monitor, logger.getChild("[dola_monitor]"), q, health, lock),
-        # Two core executor
-        functools.partial(sui_core_executor, "LendingCore1", 3, 0),
-        functools.partial(sui_core_executor, "LendingCore2", 3, 1),
-        functools.partial(sui_core_executor, "LendingCore3", 3, 2),
+        ("sui", "dola_monitor",
+         functools.partial(dola_monitor.dola_monitor, logger.getChild("[dola_monitor]"), q, health, lock)),
+        # Core executors sharing one queue
+        ("sui", "sui_core_executor_1", functools.partial(sui_core_executor, "LendingCore1")),
+        ("sui", "sui_core_executor_2", functools.partial(sui_core_executor, "LendingCore2")),
+        ("sui", "sui_core_executor_3", functools.partial(sui_core_executor, "LendingCore3")),
         # User transaction watcher
-        functools.partial(sui_portal_watcher, health),
-        functools.partial(eth_portal_watcher, health, "polygon-main"),
-        functools.partial(wormhole_vaa_guardian, "polygon-main"),
-        functools.partial(eth_portal_watcher, health, "arbitrum-main"),
-        functools.partial(wormhole_vaa_guardian, "arbitrum-main"),
-        functools.partial(eth_portal_watcher, health, "optimism-main"),
-        functools.partial(wormhole_vaa_guardian, "optimism-main"),
-        functools.partial(eth_portal_watcher, health, "base-main"),
-        functools.partial(wormhole_vaa_guardian, "base-main"),
+        ("sui", "sui_portal_watcher", functools.partial(sui_portal_watcher, health)),
+        ("polygon-main", "polygon_portal_watcher", functools.partial(eth_portal_watcher, health, "polygon-main")),
+        ("polygon-main", "polygon_vaa_guardian", functools.partial(wormhole_vaa_guardian, "polygon-main")),
+        ("arbitrum-main", "arbitrum_portal_watcher", functools.partial(eth_portal_watcher, health, "arbitrum-main")),
+        ("arbitrum-main", "arbitrum_vaa_guardian", functools.partial(wormhole_vaa_guardian, "arbitrum-main")),
+        ("optimism-main", "optimism_portal_watcher", functools.partial(eth_portal_watcher, health, "optimism-main")),
+        ("optimism-main", "optimism_vaa_guardian", functools.partial(wormhole_vaa_guardian, "optimism-main")),
+        ("base-main", "base_portal_watcher", functools.partial(eth_portal_watcher, health, "base-main")),
+        ("base-main", "base_vaa_guardian", functools.partial(wormhole_vaa_guardian, "base-main")),
         # User withdraw watcher
-        functools.partial(pool_withdraw_watcher, health),
+        ("sui", "pool_withdraw_watcher", functools.partial(pool_withdraw_watcher, health)),
         # User withdraw executor
-        functools.partial(sui_pool_executor, "LendingPool"),
-        eth_pool_executor,
-    ])
+        ("sui", "sui_pool_executor", functools.partial(sui_pool_executor, "LendingPool")),
+        # Switches the brownie network per withdrawal, alone in its process
+        ("eth_pool_executor", "eth_pool_executor", functools.partial(eth_pool_executor, "eth_pool_executor")),
+    ]
+
+    Supervisor(relayer_services(roles, layout)).run()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,62 @@
+"""Import-time budget of the sdks
+
+Every relayer process and CLI tool imports them, so importing must stay cheap and must not
+construct projects, derive keys or start anything.
+
+    python -m unittest test_import_time
+    IMPORT_TIME_BUDGET=0.5 python -m unittest test_import_time
+"""
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+# Seconds allowed for the imports of one process, interpreter startup excluded
+IMPORT_TIME_BUDGET = float(os.environ.get("IMPORT_TIME_BUDGET", 1))
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+for module in sys.argv[1:]:
+    __import__(module)
+elapsed = time.perf_counter() - start
+state = {"seconds": elapsed, "threads": __import__("threading").active_count()}
+if "dola_sui_sdk" in sys.modules:
+    import sui_brownie.sui_brownie
+    state["sui_projects"] = len(sui_brownie.sui_brownie._load_project)
+if "dola_ethereum_sdk" in sys.modules:
+    state["ethereum_project_loaded"] = "DOLA_ETHEREUM_PROJECT" in sys.modules["dola_ethereum_sdk"].DOLA_CONFIG
+print(json.dumps(state))
+"""
+
+
+def available(*modules):
+    return all(importlib.util.find_spec(module) is not None for module in modules)
+
+
+class TestImportTime(unittest.TestCase):
+    def probe(self, *modules):
+        # A fresh interpreter, modules imported by earlier tests would hide the cost
+        result = subprocess.run([sys.executable, "-c", PROBE, *modules], cwd=Path(__file__).parent,
+                                capture_output=True, text=True, check=True)
+        return json.loads(result.stdout.splitlines()[-1])
+
+    @unittest.skipUnless(available("sui_brownie", "numpy", "yaml"), "sui sdk dependencies not installed")
+    def test_dola_sui_sdk(self):
+        state = self.probe("dola_sui_sdk", "dola_sui_sdk.load", "dola_sui_sdk.init", "dola_sui_sdk.lending")
+        assert state["sui_projects"] == 0, "a SuiProject was created on import"
+        assert state["threads"] == 1, "a thread was started on import"
+        assert state["seconds"] < IMPORT_TIME_BUDGET, f"import took {state['seconds']:.2f}s"
+
+    @unittest.skipUnless(available("brownie", "dola_ethereum_sdk"), "ethereum sdk dependencies not installed")
+    def test_dola_ethereum_sdk(self):
+        state = self.probe("dola_ethereum_sdk", "dola_ethereum_sdk.load", "dola_ethereum_sdk.init")
+        assert not state["ethereum_project_loaded"], "the brownie project was loaded on import"
+        assert state["seconds"] < IMPORT_TIME_BUDGET, f"import took {state['seconds']:.2f}s"
+
+
+if __name__ == "__main__":
+    unittest.main()
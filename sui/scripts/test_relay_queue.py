@@ -0,0 +1,151 @@
+"""Relayer instances sharing one relay store through leased work queues
+
+Each instance is a process with its own WorkQueue, as relayers on separate hosts would be,
+against an embedded SQLite relay store.
+
+    python -m unittest test_relay_queue
+"""
+import multiprocessing
+import os
+import shutil
+import signal
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from relay_db import RelayRecord
+from relay_queue import WorkQueue
+from relay_store import SqliteDatabase
+
+LEASE_SECONDS = 0.5
+
+
+def open_queue(path, instance, buffered=False):
+    relay_record = RelayRecord(SqliteDatabase(path), buffered=buffered)
+    # Same account name on every host, told apart by the instance
+    return WorkQueue(relay_record, {'status': 'false'}, sort=[('nonce', 1)], owner="LendingCore1",
+                     lease_seconds=LEASE_SECONDS, poll_interval=0.05, use_change_stream=False, instance=instance,
+                     retry_delay=LEASE_SECONDS)
+
+
+def relayer_instance(path, instance, slow_nonce=None, slow_seconds=0):
+    work_queue = open_queue(path, instance)
+    # Logged to the store, a multiprocessing.Queue may be left locked by a killed instance
+    processed = SqliteDatabase(path)['Processed']
+    while True:
+        for record in work_queue.claims():
+            processed.insert_one({'instance': instance, 'nonce': record['nonce']})
+            time.sleep(slow_seconds if record['nonce'] == slow_nonce else 0.01)
+            work_queue.complete(record, {'$set': {'status': 'success', 'relayed_by': instance}})
+        work_queue.wait()
+
+
+class TestRelayQueue(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = str(Path(directory).joinpath("relayer.db"))
+        self.records = SqliteDatabase(self.path)['RelayRecord']
+        for nonce in range(20):
+            self.records.insert_one({'status': 'false', 'nonce': nonce})
+        self.processed = SqliteDatabase(self.path)['Processed']
+
+    def start(self, instance, **kwargs):
+        process = multiprocessing.Process(target=relayer_instance, args=(self.path, instance), kwargs=kwargs,
+                                          daemon=True)
+        process.start()
+        self.addCleanup(process.kill)
+        return process
+
+    @staticmethod
+    def wait_until(condition, timeout=20):
+        deadline = time.time() + timeout
+        while not condition():
+            assert time.time() < deadline, "timed out"
+            time.sleep(0.05)
+
+    def wait_relayed(self):
+        self.wait_until(lambda: self.records.count_documents({'status': 'success'}) == 20)
+
+    def processed_by(self):
+        """(instance, nonce) of every relay started, in order"""
+        return [(document['instance'], document['nonce']) for document in self.processed.find({}, sort=[('_id', 1)])]
+
+    def relayed_by(self, nonce):
+        return self.records.find_one({'nonce': nonce})['relayed_by']
+
+    def test_each_record_relayed_once(self):
+        self.start("host-a")
+        self.start("host-b")
+        self.wait_relayed()
+        processed = self.processed_by()
+        assert sorted(nonce for (_, nonce) in processed) == list(range(20))
+        assert {instance for (instance, _) in processed} == {"host-a", "host-b"}
+
+    def test_failover(self):
+        # host-a dies in the middle of relaying nonce 0
+        host_a = self.start("host-a", slow_nonce=0, slow_seconds=3600)
+        self.wait_until(lambda: self.processed_by() == [("host-a", 0)])
+        os.kill(host_a.pid, signal.SIGKILL)
+        host_a.join()
+
+        start = time.time()
+        self.start("host-b")
+        self.wait_relayed()
+        # The leases of host-a expired and host-b took over all of its work
+        assert self.relayed_by(0) == "host-b"
+        assert time.time() - start < 10 * LEASE_SECONDS
+        assert sorted(nonce for (instance, nonce) in self.processed_by() if instance == "host-b") == list(range(20))
+
+    def test_slow_relay_keeps_its_lease(self):
+        self.start("host-a", slow_nonce=0, slow_seconds=4 * LEASE_SECONDS)
+        self.wait_until(lambda: self.processed_by() == [("host-a", 0)])
+        self.start("host-b")
+        self.wait_relayed()
+        # Renewed while being relayed, host-b never got it
+        assert self.relayed_by(0) == "host-a"
+        assert sorted(nonce for (_, nonce) in self.processed_by()) == list(range(20))
+
+    def test_released_record_is_retried_after_a_delay(self):
+        work_queue = open_queue(self.path, "host-a")
+        record = work_queue.claim()
+        work_queue.release(record)
+        # Held back, the next record comes first
+        assert work_queue.claim()['nonce'] == 1
+        document = self.records.find_one({'_id': record['_id']})
+        assert document['retries'] == 1 and 'lease_owner' not in document
+
+        self.records.update_one({'_id': record['_id']}, {'$set': {'lease_until': 0}})
+        record = work_queue.claim()
+        assert record['nonce'] == 0
+        work_queue.release(record)
+        # The delay doubles on each release
+        assert self.records.find_one({'_id': record['_id']})['lease_until'] - time.time() > 1.5 * LEASE_SECONDS
+
+    def test_result_is_written_through_a_buffered_relay_record(self):
+        # As the watchers open them, a dying instance loses the writes still in the buffer
+        work_queue = open_queue(self.path, "host-a", buffered=True)
+        record = work_queue.claim()
+        assert work_queue.complete(record, {'$set': {'status': 'success', 'relayed_by': "host-a"}})
+        document = self.records.find_one({'_id': record['_id']})
+        assert (document['status'], document['relayed_by']) == ("success", "host-a")
+
+    def test_result_of_a_lost_lease_is_dropped(self):
+        host_a = open_queue(self.path, "host-a")
+        host_b = open_queue(self.path, "host-b")
+        record = host_a.claim()
+        # host-a stalled past its lease, e.g. a long GC pause or partition
+        self.records.update_one({'_id': record['_id']}, {'$set': {'lease_until': 0}})
+        taken = host_b.claim()
+        assert taken['_id'] == record['_id']
+
+        assert not host_a.complete(record, {'$set': {'status': 'fail', 'relayed_by': "host-a"}})
+        assert host_b.complete(taken, {'$set': {'status': 'success', 'relayed_by': "host-b"}})
+        document = self.records.find_one({'_id': record['_id']})
+        assert (document['status'], document['relayed_by']) == ("success", "host-b")
+        assert 'lease_owner' not in document
+
+
+if __name__ == "__main__":
+    unittest.main()
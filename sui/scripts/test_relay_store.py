@@ -0,0 +1,165 @@
+"""The part of the pymongo collection API the relayer uses, on the SQLite relay store
+
+    python -m unittest test_relay_store
+"""
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from pymongo import DESCENDING, IndexModel, InsertOne, ReturnDocument, UpdateOne
+from pymongo.errors import AutoReconnect, BulkWriteError, DuplicateKeyError, OperationFailure
+
+from relay_db import WriteBuffer
+from relay_store import SqliteDatabase
+
+
+class TestRelayStore(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.db = SqliteDatabase(Path(directory).joinpath("relayer.db"))
+        self.records = self.db['RelayRecord']
+        self.records.create_indexes([IndexModel([('vaa_hash', 1)], name='vaa_hash', unique=True, sparse=True)])
+        for nonce in range(6):
+            self.records.insert_one({'nonce': nonce, 'status': 'false' if nonce % 2 else 'withdraw',
+                                     'withdraw_chain_id': nonce % 3, 'vaa_hash': f"h{nonce}"})
+
+    def nonces(self, filter, **kwargs):
+        return [record['nonce'] for record in self.records.find(filter, sort=[('nonce', 1)], **kwargs)]
+
+    def test_filters(self):
+        assert self.nonces({'status': 'false'}) == [1, 3, 5]
+        assert self.nonces({'nonce': {'$gt': 1, '$lte': 4}}) == [2, 3, 4]
+        assert self.nonces({'nonce': {'$in': [0, 5, 9]}}) == [0, 5]
+        assert self.nonces({'nonce': {'$nin': [0, 5]}}) == [1, 2, 3, 4]
+        assert self.nonces({'nonce': {'$in': []}}) == []
+        assert self.nonces({'withdraw_chain_id': {'$ne': 0}}) == [1, 2, 4, 5]
+        assert self.nonces({'status': 'withdraw', 'withdraw_chain_id': 0}) == [0]
+        assert self.nonces({'$or': [{'nonce': 0}, {'withdraw_chain_id': 2}]}) == [0, 2, 5]
+        assert self.nonces({'nonce': {'$mod': [3, 1]}}) == [1, 4]
+
+    def test_missing_fields(self):
+        self.records.update_one({'nonce': 2}, {'$set': {'lease_until': 10}})
+        self.records.update_one({'nonce': 3}, {'$set': {'lease_until': 30}})
+        # As on MongoDB, documents without the field match $ne, $nin and $not
+        assert self.nonces({'lease_until': {'$not': {'$gt': 20}}}) == [0, 1, 2, 4, 5]
+        assert self.nonces({'lease_until': {'$ne': 10}}) == [0, 1, 3, 4, 5]
+        assert self.nonces({'lease_until': {'$nin': [30]}}) == [0, 1, 2, 4, 5]
+        assert self.nonces({'lease_until': {'$exists': True}}) == [2, 3]
+
+    def test_sort_limit_projection(self):
+        assert [record['nonce'] for record in self.records.find({}).sort('nonce', DESCENDING).limit(2)] == [5, 4]
+        record = self.records.find_one({'nonce': 1}, {'_id': False, 'status': True})
+        assert record == {'status': 'false'}
+        record = self.records.find_one({'nonce': 1}, {'vaa_hash': False})
+        assert set(record) == {'_id', 'nonce', 'status', 'withdraw_chain_id'}
+        assert self.records.count_documents({'status': 'false'}) == 3
+
+    def test_updates(self):
+        result = self.records.update_one({'nonce': 1}, {'$set': {'status': 'success'}, '$unset': {'vaa_hash': ""}})
+        assert (result.matched_count, result.modified_count) == (1, 1)
+        assert self.records.find_one({'nonce': 1}, {'_id': False}) == \
+            {'nonce': 1, 'status': 'success', 'withdraw_chain_id': 1}
+        assert self.records.update_one({'nonce': 9}, {'$set': {'status': 'success'}}).matched_count == 0
+        with self.assertRaises(OperationFailure):
+            self.records.update_one({'nonce': 0}, {'$push': {'tags': 'x'}})
+
+    def test_upsert(self):
+        result = self.records.update_one({'nonce': 9}, {'$setOnInsert': {'status': 'waitForVaa'}}, upsert=True)
+        assert result.upserted_id is not None
+        # $setOnInsert is ignored once the document exists
+        self.records.update_one({'nonce': 9}, {'$setOnInsert': {'status': 'false'}, '$set': {'sequence': 1}},
+                                upsert=True)
+        assert self.records.find_one({'nonce': 9}, {'_id': False}) == {'nonce': 9, 'status': 'waitForVaa',
+                                                                      'sequence': 1}
+
+    def test_find_one_and_update(self):
+        before = self.records.find_one_and_update({'status': 'false'}, {'$set': {'lease_owner': "a"}},
+                                                  sort=[('nonce', DESCENDING)])
+        assert (before['nonce'], 'lease_owner' in before) == (5, False)
+        after = self.records.find_one_and_update({'status': 'false', 'lease_owner': {'$exists': False}},
+                                                 {'$set': {'lease_owner': "b"}}, sort=[('nonce', DESCENDING)],
+                                                 return_document=ReturnDocument.AFTER)
+        assert (after['nonce'], after['lease_owner']) == (3, "b")
+        assert self.records.find_one_and_update({'nonce': 9}, {'$set': {'lease_owner': "c"}}) is None
+
+    def test_duplicate_key(self):
+        with self.assertRaises(DuplicateKeyError):
+            self.records.insert_one({'nonce': 6, 'vaa_hash': "h0"})
+        # Sparse: documents without the key don't collide
+        self.records.insert_one({'nonce': 6})
+        self.records.insert_one({'nonce': 7})
+
+    def test_bulk_write_reports_unsupported_operators_as_write_errors(self):
+        with self.assertRaises(BulkWriteError) as raised:
+            self.records.bulk_write([UpdateOne({'nonce': 0}, {'$push': {'tags': 'x'}})])
+        [error] = raised.exception.details['writeErrors']
+        assert (error['index'], error['code']) == (0, 2)
+
+    def test_ordered_bulk_write_stops_at_first_duplicate(self):
+        requests = [
+            InsertOne({'nonce': 6, 'vaa_hash': "h6"}),
+            UpdateOne({'nonce': 0}, {'$set': {'status': 'success'}}),
+            InsertOne({'nonce': 7, 'vaa_hash': "h1"}),
+            InsertOne({'nonce': 8, 'vaa_hash': "h8"}),
+        ]
+        with self.assertRaises(BulkWriteError) as raised:
+            self.records.bulk_write(requests, ordered=True)
+        # The shape WriteBuffer reads to resume after the duplicate
+        [error] = raised.exception.details['writeErrors']
+        assert (error['index'], error['code']) == (2, 11000)
+        assert raised.exception.details['nMatched'] == 1
+        # The writes before the duplicate are committed, the ones after it are not
+        assert self.nonces({'nonce': {'$gte': 6}}) == [6]
+        assert self.records.find_one({'nonce': 0})['status'] == 'success'
+
+    def test_write_buffer_skips_duplicates(self):
+        buffer = WriteBuffer(self.records, max_delay=60)
+        buffer.add(InsertOne({'nonce': 6, 'vaa_hash': "h6"}))
+        buffer.add(InsertOne({'nonce': 7, 'vaa_hash': "h1"}))
+        buffer.add(InsertOne({'nonce': 8, 'vaa_hash': "h8"}))
+        buffer.flush()
+        assert self.nonces({'nonce': {'$gte': 6}}) == [6, 8]
+
+    def test_write_buffer_drops_a_failing_write(self):
+        buffer = WriteBuffer(self.records, max_delay=60)
+        buffer.add(InsertOne({'nonce': 6}))
+        buffer.add(UpdateOne({'nonce': 0}, {'$push': {'tags': 'x'}}))
+        buffer.add(UpdateOne({'nonce': 1}, {'$set': {'status': 'success'}}))
+        buffer.add(InsertOne({'nonce': 7}))
+        buffer.flush()
+        # The writes after the failing one are not held back
+        assert self.nonces({'nonce': {'$gte': 6}}) == [6, 7]
+        assert self.records.find_one({'nonce': 1})['status'] == 'success'
+        buffer.flush()
+        assert buffer._requests == []
+
+    def test_write_buffer_keeps_writes_on_transient_errors(self):
+        records = self.records
+
+        class Unreachable:
+            name = records.name
+            down = True
+
+            def bulk_write(self, requests, ordered=True):
+                if self.down:
+                    raise AutoReconnect("connection refused")
+                return records.bulk_write(requests, ordered)
+
+        collection = Unreachable()
+        buffer = WriteBuffer(collection, max_delay=60)
+        buffer.add(InsertOne({'nonce': 6}))
+        with self.assertRaises(AutoReconnect):
+            buffer.flush()
+        collection.down = False
+        buffer.flush()
+        assert self.nonces({'nonce': 6}) == [6]
+
+    def test_unsupported_operator(self):
+        with self.assertRaises(OperationFailure):
+            list(self.records.find({'nonce': {'$regex': "1"}}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import logging
+import threading
+import time
+
+import config
+from dola_sui_sdk import interfaces, sui_project
+from dola_sui_sdk.lending import get_price_reference
+
+
+class TvlAggregator:
+    """Protocol TVL kept in memory
+
+    The otoken supply of every reserve is read once, then only the reserves named by
+    new `LendingReserveStatsEvent`s are read again. A full resync every
+    `resync_interval` seconds picks up interest accrued by reserves without activity.
+    Prices come from a running `PriceReference`, by default the one shared with the
+    oracle checks of the process, so `tvl` makes no network calls.
+    """
+
+    def __init__(self, pool_ids=None, price_reference=None, interval=5, resync_interval=300,
+                 event_package=None, logger=None):
+        self.pool_ids = list(pool_ids) if pool_ids is not None else list(config.DOLA_POOL_ID_TO_SYMBOL)
+        self.symbols = [config.DOLA_POOL_ID_TO_SYMBOL[pool_id] for pool_id in self.pool_ids]
+        self.price_reference = price_reference if price_reference is not None else get_price_reference()
+        self.interval = interval
+        self.resync_interval = resync_interval
+        self.logger = logger or logging.getLogger("tvl")
+
+        # Event types are named after the package that first defined them
+        event_package = event_package or sui_project.network_config['packages']['dola_protocol']['origin']
+        self.event_type = f"{event_package}::lending_logic::LendingReserveStatsEvent"
+        self._cursor = None
+
+        self.supplies = {}
+        self._last_resync = 0
+        self._thread = None
+        self._stop = threading.Event()
+
+    def refresh_supplies(self, pool_ids):
+        supplies = interfaces.get_otoken_total_supplies(pool_ids)
+        # Replace the whole dict so readers never see a partial update
+        self.supplies = {**self.supplies, **supplies}
+
+    def resync(self):
+        self._cursor = self.latest_event_cursor()
+        self.refresh_supplies(self.pool_ids)
+        self._last_resync = time.time()
+
+    def latest_event_cursor(self):
+        events = sui_project.client.suix_queryEvents(
+            {"MoveEventType": self.event_type}, cursor=None, limit=1, descending_order=True)
+        return events['data'][0]['id'] if events['data'] else None
+
+    def changed_pools(self):
+        """Pools named by reserve stats events since the last call"""
+        changed = set()
+        while True:
+            events = sui_project.client.suix_queryEvents(
+                {"MoveEventType": self.event_type}, cursor=self._cursor, limit=50, descending_order=False)
+            for event in events['data']:
+                changed.add(int(event['parsedJson']['pool_id']))
+            if events['nextCursor'] is not None:
+                self._cursor = events['nextCursor']
+            if not events['hasNextPage']:
+                break
+        return changed & set(self.pool_ids)
+
+    def run_once(self):
+        if time.time() - self._last_resync >= self.resync_interval:
+            self.resync()
+            return
+        changed = self.changed_pools()
+        if changed:
+            self.refresh_supplies(sorted(changed))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                self.logger.warning(f"Refresh tvl fail: {e}")
+
+    def start(self):
+        self.resync()
+        self.price_reference.start()
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="tvl", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        # The price reference may be shared, it keeps running
+        self._stop.set()
+
+    def tvl(self):
+        """Same value as `interfaces.get_protocol_total_otoken_value`"""
+        supplies = self.supplies
+        prices = self.price_reference.get_prices(self.symbols)
+        return sum(supplies[pool_id] / 1e8 * price for pool_id, price in zip(self.pool_ids, prices))
@@ -0,0 +1,104 @@
+"""
+On-disk cache of normalized Move modules.
+
+A published Sui package never changes (upgrades get a new package id), so the result of
+`sui_getNormalizedMoveModulesByPackage` can be kept forever under its package id.
+
+File layout of `{cache_dir}/{package_id}.abi`:
+
+    MAGIC
+    4 bytes big endian header length
+    header: json {module_name: [offset, length]}, offsets relative to the end of the header
+    one zlib compressed json document per module
+
+The file is memory-mapped and only the header parsed on load, each module is decompressed
+on first access.
+"""
+from __future__ import annotations
+
+import json
+import mmap
+import struct
+import zlib
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Union
+
+from atomicwrites import atomic_write
+
+MAGIC = b"SUIABI1\n"
+
+
+class PackageAbi(Mapping):
+    """Module name -> normalized module, decoded lazily from the cached bytes"""
+
+    def __init__(self, data, index: dict, start: int):
+        self.data = data
+        self.index = index
+        self.start = start
+        self.modules = {}
+
+    def __getitem__(self, module_name):
+        if module_name not in self.modules:
+            (offset, length) = self.index[module_name]
+            offset += self.start
+            self.modules[module_name] = json.loads(zlib.decompress(self.data[offset:offset + length]))
+        return self.modules[module_name]
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    @classmethod
+    def decode(cls, data) -> PackageAbi:
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError("not an abi cache file")
+        start = len(MAGIC) + 4
+        (header_length,) = struct.unpack(">I", data[len(MAGIC):start])
+        index = json.loads(bytes(data[start:start + header_length]))
+        return cls(data, index, start + header_length)
+
+    @staticmethod
+    def encode(modules: dict) -> bytes:
+        index = {}
+        blobs = []
+        offset = 0
+        for module_name in modules:
+            blob = zlib.compress(json.dumps(modules[module_name], separators=(",", ":")).encode(), 6)
+            index[module_name] = [offset, len(blob)]
+            blobs.append(blob)
+            offset += len(blob)
+        header = json.dumps(index, separators=(",", ":")).encode()
+        return MAGIC + struct.pack(">I", len(header)) + header + b"".join(blobs)
+
+
+class AbiCache:
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = cache_dir
+
+    def path(self, package_id: str) -> Path:
+        return self.cache_dir.joinpath(f"{package_id}.abi")
+
+    def load(self, package_id: str) -> Union[PackageAbi, None]:
+        """Cached modules of the package, None if not cached or unreadable"""
+        path = self.path(package_id)
+        if not path.exists():
+            return None
+        try:
+            with open(path, "rb") as f:
+                # Stays valid when another process replaces the file
+                return PackageAbi.decode(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        except Exception as e:
+            print(f"Warning: read abi cache {path} occurs {e}")
+            return None
+
+    def store(self, package_id: str, modules: dict):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            # Processes loading the same package race to write identical content
+            with atomic_write(str(self.path(package_id)), mode="wb", overwrite=True) as f:
+                f.write(PackageAbi.encode(modules))
+        except Exception as e:
+            print(f"Warning: write abi cache for {package_id} occurs {e}")
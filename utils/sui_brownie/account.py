@@ -4,32 +4,98 @@
 from __future__ import annotations
 
 import base64
+import hashlib
 import json
+import os
+from pathlib import Path
 from typing import Union
 
+from atomicwrites import atomic_write
+from nacl.secret import SecretBox
+from nacl.signing import SigningKey
+
 from . import ed25519
 
 
+class KeyCache:
+    """Keys derived from mnemonics, stored encrypted in `cache_dir`.
+
+    Deriving a key from a mnemonic costs a 2048 round PBKDF2. Each entry is named and
+    encrypted with different blake2b digests of its mnemonic, so reading it back needs
+    the mnemonic just like deriving the key does.
+    """
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def digest(mnemonic: str, person: bytes) -> bytes:
+        return hashlib.blake2b(mnemonic.encode(), digest_size=32, person=person).digest()
+
+    def path(self, mnemonic: str) -> Path:
+        return self.cache_dir.joinpath(self.digest(mnemonic, b"sui-key-name").hex())
+
+    def load(self, mnemonic: str) -> Union[ed25519.PrivateKey, None]:
+        path = self.path(mnemonic)
+        if not path.exists():
+            return None
+        try:
+            key = SecretBox(self.digest(mnemonic, b"sui-key-secret")).decrypt(path.read_bytes())
+            return ed25519.PrivateKey(SigningKey(key))
+        except Exception as e:
+            print(f"Warning: read key cache {path} occurs {e}")
+            return None
+
+    def store(self, mnemonic: str, private_key: ed25519.PrivateKey):
+        self.cache_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        data = SecretBox(self.digest(mnemonic, b"sui-key-secret")).encrypt(private_key.key.encode())
+        try:
+            with atomic_write(str(self.path(mnemonic)), mode="wb", overwrite=True) as f:
+                os.chmod(f.name, 0o600)
+                f.write(data)
+        except Exception as e:
+            print(f"Warning: write key cache occurs {e}")
+
+
 class Account:
-    """Represents an account as well as the private, public key-pair for the Aptos blockchain."""
+    """Represents an account as well as the private, public key-pair for the Aptos blockchain.
 
-    account_address: str
-    private_key: ed25519.PrivateKey
+    The key of a mnemonic account is derived on first use, through `key_cache` if given.
+    """
 
     def __init__(
             self,
             mnemonic: str = None,
-            private_key: Union[str, ed25519.PrivateKey] = None
+            private_key: Union[str, ed25519.PrivateKey] = None,
+            key_cache: KeyCache = None
     ):
         assert mnemonic is not None or private_key is not None
         self.mnemonic = mnemonic
-        if mnemonic is not None:
-            self.private_key: ed25519.PrivateKey = ed25519.PrivateKey.from_mnemonic(mnemonic)
-        else:
+        self.key_cache = key_cache
+        self._private_key: ed25519.PrivateKey = None
+        self._public_key: ed25519.PublicKey = None
+        self._account_address: str = None
+        if mnemonic is None:
             if isinstance(private_key, ed25519.PrivateKey):
-                self.private_key: ed25519.PrivateKey = private_key
+                self._private_key = private_key
             else:
-                self.private_key: ed25519.PrivateKey = ed25519.PrivateKey.from_hex(private_key)
+                self._private_key = ed25519.PrivateKey.from_hex(private_key)
+
+    @property
+    def private_key(self) -> ed25519.PrivateKey:
+        if self._private_key is None:
+            self._private_key = self.derive_private_key()
+        return self._private_key
+
+    def derive_private_key(self) -> ed25519.PrivateKey:
+        if self.key_cache is not None:
+            private_key = self.key_cache.load(self.mnemonic)
+            if private_key is not None:
+                return private_key
+        private_key = ed25519.PrivateKey.from_mnemonic(self.mnemonic)
+        if self.key_cache is not None:
+            self.key_cache.store(self.mnemonic, private_key)
+        return private_key
 
     def __eq__(self, other: Account) -> bool:
         return (
@@ -41,8 +107,10 @@ class Account:
         return self.private_key.sign(data)
 
     @property
-    def account_address(self):
-        return str(self.private_key.public_key().address())
+    def account_address(self) -> str:
+        if self._account_address is None:
+            self._account_address = str(self.public_key().address())
+        return self._account_address
 
     @staticmethod
     def generate() -> Account:
@@ -79,7 +147,9 @@ class Account:
     def public_key(self) -> ed25519.PublicKey:
         """Returns the public key for the associated account"""
 
-        return self.private_key.public_key()
+        if self._public_key is None:
+            self._public_key = self.private_key.public_key()
+        return self._public_key
 
     def keystore(self) -> str:
         return self.private_key.generate_keystore()
@@ -0,0 +1,112 @@
+"""
+Persistent index of the objects and packages known to a SuiProject.
+
+Rows are (key, owner, object_id) in insertion order, key being an object type or a package
+name. Additions are buffered and written in one SQLite transaction at most every
+`flush_interval` seconds, and only the newest `retention` ids are kept per key and owner,
+so recording the objects of a transaction costs a few row inserts instead of rewriting
+the whole cache.
+"""
+from __future__ import annotations
+
+import atexit
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+import weakref
+from pathlib import Path
+from typing import List, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    object_id TEXT NOT NULL,
+    UNIQUE (key, owner, object_id)
+);
+"""
+
+_indexes = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_all():
+    for index in list(_indexes):
+        index.flush()
+
+
+class ObjectIndex:
+    def __init__(self, path: Path, retention=256, flush_interval=1.0):
+        self.path = path
+        self.retention = retention
+        self.flush_interval = flush_interval
+        self.pending: List[Tuple[str, str, str]] = []
+        self._lock = threading.Lock()
+        self._timer = None
+        self._pid = os.getpid()
+        _indexes.add(self)
+
+    @contextlib.contextmanager
+    def connect(self):
+        """A transaction on a new connection, connections must not cross a fork"""
+        conn = sqlite3.connect(str(self.path), timeout=30)
+        try:
+            with conn:
+                conn.executescript(SCHEMA)
+                yield conn
+        finally:
+            conn.close()
+
+    def load(self) -> List[Tuple[str, str, str]]:
+        """All rows, oldest first"""
+        with self.connect() as conn:
+            return conn.execute("SELECT key, owner, object_id FROM objects ORDER BY seq").fetchall()
+
+    def is_empty(self) -> bool:
+        with self.connect() as conn:
+            return conn.execute("SELECT 1 FROM objects LIMIT 1").fetchone() is None
+
+    def import_json(self, file: Path):
+        """Rows of the former `{network}-objects.json` cache: {key: {owner: [object_id]}}"""
+        with open(str(file), "r") as f:
+            data = json.load(f)
+        for key in data:
+            for owner in data[key]:
+                for object_id in data[key][owner]:
+                    self.pending.append((str(key), str(owner), object_id))
+        self.flush()
+
+    def add(self, key, owner, object_id):
+        with self._lock:
+            if self._pid != os.getpid():
+                # The timer thread didn't survive the fork
+                self._pid = os.getpid()
+                self._timer = None
+            self.pending.append((str(key), str(owner), object_id))
+            if self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            rows = self.pending
+            self.pending = []
+            self._timer = None
+        if not rows:
+            return
+        try:
+            with self.connect() as conn:
+                conn.executemany("INSERT OR IGNORE INTO objects (key, owner, object_id) VALUES (?, ?, ?)", rows)
+                for (key, owner) in {(key, owner) for (key, owner, _) in rows}:
+                    conn.execute(
+                        "DELETE FROM objects WHERE key = ? AND owner = ? AND seq <= "
+                        "(SELECT seq FROM objects WHERE key = ? AND owner = ? ORDER BY seq DESC LIMIT 1 OFFSET ?)",
+                        (key, owner, key, owner, self.retention))
+        except Exception as e:
+            print(f"Write object index fail, err:{e}")
+            with self._lock:
+                self.pending = rows + self.pending
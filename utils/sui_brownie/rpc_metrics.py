@@ -0,0 +1,218 @@
+"""
+Per-call metrics of the Sui JSON-RPC client.
+
+Every call made through `SuiClient.call` is recorded in `metrics`: latency histograms per
+method and per endpoint, request/response sizes, retries and error classes. The totals are
+exported with `metrics.prometheus()` (text exposition format) or `metrics.snapshot()`, and
+each call can be logged as one JSON line on the `sui_brownie.rpc` logger at DEBUG level.
+
+A trace id set with `trace(...)` is attached to the calls made inside it, so the time of
+one relay can be split into inspect, dry-run, execute and query steps:
+
+    with trace(vaa_hash):
+        ...
+    metrics.pop_trace(vaa_hash)  # {"inspect": {"calls": 1, "seconds": 0.2}, ...}
+"""
+from __future__ import annotations
+
+import bisect
+import contextlib
+import contextvars
+import json
+import logging
+import threading
+from collections import OrderedDict, defaultdict
+
+logger = logging.getLogger("sui_brownie.rpc")
+
+current_trace_id = contextvars.ContextVar("sui_brownie_trace_id", default=None)
+
+# Seconds, tuned for fullnode calls: local reads are a few ms, executes with
+# WaitForLocalExecution up to several seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+STEPS = {
+    "sui_devInspectTransactionBlock": "inspect",
+    "sui_dryRunTransactionBlock": "dry_run",
+    "sui_executeTransactionBlock": "execute",
+}
+
+# Traces that are never popped are dropped oldest first
+MAX_TRACES = 10000
+
+
+def step_of(method):
+    return STEPS.get(method, "query")
+
+
+def error_class(e):
+    """Short, low cardinality label of a failed attempt"""
+    if isinstance(e, RpcError):
+        return f"rpc_{e.code}"
+    status_code = getattr(e, "status_code", None)
+    if status_code is not None:
+        return f"http_{status_code}"
+    return type(e).__name__
+
+
+@contextlib.contextmanager
+def trace(trace_id):
+    """Attribute the RPC calls made in this context to `trace_id`"""
+    token = current_trace_id.set(trace_id)
+    try:
+        yield trace_id
+    finally:
+        current_trace_id.reset(token)
+
+
+class RpcError(AssertionError):
+    """JSON-RPC error response.
+
+    An AssertionError, as callers already handle the former `assert "error" not in response`.
+    """
+
+    def __init__(self, response):
+        super().__init__(response)
+        error = response.get("error") or {}
+        self.code = error.get("code") if isinstance(error, dict) else None
+        self.response = response
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for (bound, count) in zip(list(self.buckets) + ["+Inf"], self.counts):
+            total += count
+            yield bound, total
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile"""
+        if not self.count:
+            return 0
+        rank = q * self.count
+        for (bound, total) in self.cumulative():
+            if total >= rank:
+                return bound if bound != "+Inf" else self.buckets[-1]
+
+
+class RpcMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.method_latency = defaultdict(Histogram)
+            self.endpoint_latency = defaultdict(Histogram)
+            self.request_bytes = defaultdict(int)
+            self.response_bytes = defaultdict(int)
+            self.retries = defaultdict(int)
+            self.errors = defaultdict(int)
+            self.traces = OrderedDict()
+
+    def observe(self, method, endpoint, seconds, request_bytes=0, response_bytes=0, error=None):
+        """Record one HTTP attempt of `method` against `endpoint`"""
+        trace_id = current_trace_id.get()
+        with self.lock:
+            self.method_latency[method].observe(seconds)
+            self.endpoint_latency[endpoint].observe(seconds)
+            self.request_bytes[method] += request_bytes
+            self.response_bytes[method] += response_bytes
+            if error is not None:
+                self.errors[(method, endpoint, error)] += 1
+            if trace_id is not None:
+                steps = self.traces.pop(trace_id, None) or defaultdict(lambda: {"calls": 0, "seconds": 0.0})
+                steps[step_of(method)]["calls"] += 1
+                steps[step_of(method)]["seconds"] += seconds
+                self.traces[trace_id] = steps
+                while len(self.traces) > MAX_TRACES:
+                    self.traces.popitem(last=False)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(json.dumps({
+                "method": method,
+                "endpoint": endpoint,
+                "seconds": round(seconds, 6),
+                "request_bytes": request_bytes,
+                "response_bytes": response_bytes,
+                "error": error,
+                "trace_id": trace_id,
+            }))
+
+    def retried(self, method):
+        with self.lock:
+            self.retries[method] += 1
+
+    def pop_trace(self, trace_id):
+        """Time spent per step by the calls of `trace_id`, forgetting the trace"""
+        with self.lock:
+            return dict(self.traces.pop(trace_id, {}))
+
+    def snapshot(self):
+        """Structured summary, e.g. for periodic logging"""
+        with self.lock:
+            return {
+                "methods": {
+                    method: {
+                        "calls": h.count,
+                        "seconds": round(h.sum, 6),
+                        "p50": h.quantile(0.5),
+                        "p99": h.quantile(0.99),
+                        "request_bytes": self.request_bytes[method],
+                        "response_bytes": self.response_bytes[method],
+                        "retries": self.retries[method],
+                    }
+                    for (method, h) in self.method_latency.items()
+                },
+                "endpoints": {
+                    endpoint: {"calls": h.count, "seconds": round(h.sum, 6), "p50": h.quantile(0.5),
+                               "p99": h.quantile(0.99)}
+                    for (endpoint, h) in self.endpoint_latency.items()
+                },
+                "errors": [
+                    {"method": method, "endpoint": endpoint, "error": error, "count": count}
+                    for ((method, endpoint, error), count) in self.errors.items()
+                ],
+            }
+
+    def prometheus(self):
+        """Prometheus text exposition format"""
+        lines = []
+
+        def histogram(name, label, histograms):
+            lines.append(f"# TYPE {name} histogram")
+            for (value, h) in histograms.items():
+                for (bound, total) in h.cumulative():
+                    lines.append(f'{name}_bucket{{{label}="{value}",le="{bound}"}} {total}')
+                lines.append(f'{name}_sum{{{label}="{value}"}} {h.sum}')
+                lines.append(f'{name}_count{{{label}="{value}"}} {h.count}')
+
+        def counter(name, label, values):
+            lines.append(f"# TYPE {name} counter")
+            for (value, count) in values.items():
+                lines.append(f'{name}{{{label}="{value}"}} {count}')
+
+        with self.lock:
+            histogram("sui_rpc_request_duration_seconds", "method", self.method_latency)
+            histogram("sui_rpc_endpoint_duration_seconds", "endpoint", self.endpoint_latency)
+            counter("sui_rpc_request_bytes_total", "method", self.request_bytes)
+            counter("sui_rpc_response_bytes_total", "method", self.response_bytes)
+            counter("sui_rpc_retries_total", "method", self.retries)
+            lines.append("# TYPE sui_rpc_errors_total counter")
+            for ((method, endpoint, error), count) in self.errors.items():
+                lines.append(f'sui_rpc_errors_total{{method="{method}",endpoint="{endpoint}",error="{error}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = RpcMetrics()
@@ -1,34 +1,33 @@
 from __future__ import annotations
 
 import base64
+import contextlib
+import contextvars
 import copy
 import functools
 import hashlib
 import json
-import multiprocessing
 import os
-import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from pprint import pprint
 from typing import Union, Dict
 
 import toml
 import yaml
-from atomicwrites import atomic_write
 from dotenv import dotenv_values
 from retrying import retry
 
 from . import bcs
-from .account import Account
+from .abi_cache import AbiCache
+from .account import Account, KeyCache
 from .bcs import *
-from .parallelism import ThreadExecutor
+from .object_index import ObjectIndex
 from .sui_client import SuiClient
 
 _load_project = []
 
-_cache_file_lock = multiprocessing.Lock()
-
 
 class AttributeDict:
     """Dictionaries that can be indexed by  '.' to index the dictionary"""
@@ -302,6 +301,59 @@ class ModuleAttributeDict(AttributeDict):
         return ModuleAttributeDict(copy.deepcopy(self.data))
 
 
+class LazyModuleAttributeDict(ModuleAttributeDict):
+    """Module of a package whose structs and functions are created on first access"""
+
+    def __init__(self, package: SuiPackage, module_name: str):
+        self.package = package
+        self.module_name = module_name
+        self._data = None
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = self.package.materialize_module(self.module_name)
+        return self._data
+
+
+class IndexMode:
+    """How `SuiProject._execute` updates the object cache with the objects of a transaction"""
+    # Fetch the created and mutated objects with sui_multiGetObjects
+    RPC = "rpc"
+    # Use the objectChanges of the execute response, no extra call
+    OBJECT_CHANGES = "object_changes"
+    # Like RPC, in a background thread
+    ASYNC = "async"
+    # Leave the cache alone
+    SKIP = "skip"
+
+
+class ResponseProfile:
+    """Sections of the execute response asked from the node"""
+    # Digest only, the transaction status is not checked
+    MINIMAL = "minimal"
+    # Status, gas used and changed object references
+    EFFECTS = "effects"
+    FULL = "full"
+
+
+RESPONSE_OPTIONS = {
+    ResponseProfile.MINIMAL: {},
+    ResponseProfile.EFFECTS: {"showEffects": True},
+    ResponseProfile.FULL: {
+        "showInput": True,
+        "showRawInput": False,
+        "showEffects": True,
+        "showEvents": True,
+        "showObjectChanges": True,
+        "showBalanceChanges": True
+    },
+}
+
+# Per call overrides of the SuiProject execution settings, see SuiProject.executing
+_execute_options = contextvars.ContextVar("sui_brownie_execute_options", default={})
+
+
 SIGNATURE_SCHEME_TO_FLAG = {
     "ED25519": 0,
     "Secp256k1": 1
@@ -1220,8 +1272,19 @@ class SuiPackage:
         else:
             self.package_path = self.package_path
 
-    @retry(stop_max_attempt_number=10, wait_random_min=3000, wait_random_max=5000)
     def get_abi(self):
+        """Normalized modules of the package, from the abi cache when present"""
+        package_id = SuiObject.normal_package_id(self.package_id)
+        result = self.project.abi_cache.load(package_id)
+        if result is None:
+            result = self.fetch_abi()
+            self.project.abi_cache.store(package_id, result)
+            # Keep only the compact form around
+            result = self.project.abi_cache.load(package_id) or result
+        return result
+
+    @retry(stop_max_attempt_number=10, wait_random_min=3000, wait_random_max=5000)
+    def fetch_abi(self):
         try:
             result = self.project.client.sui_getNormalizedMoveModulesByPackage(self.package_id)
         except Exception as e:
@@ -1233,23 +1296,27 @@ class SuiPackage:
         if self.package_id is None:
             return
 
-        result = self.get_abi()
-
-        self.abi = result
-        for module_name in result:
-            # Update
-            for struct_name in result[module_name].get("structs", dict()):
-                # refuse process include type param object
-                if len(result[module_name]["structs"][struct_name].get("type_parameters", [])):
-                    continue
-                object_type = SuiObject.from_type(f"{self.package_id}::{module_name}::{struct_name}")
-                object_type.package_name = self.package_name
-                self.modules[module_name][struct_name] = object_type
-            for func_name in result[module_name].get("exposedFunctions", dict()):
-                abi = result[module_name]["exposedFunctions"][func_name]
-                abi["module_name"] = module_name
-                abi["func_name"] = func_name
-                self.modules[module_name][func_name] = ModuleFunction(self, abi)
+        self.abi = self.get_abi()
+        for module_name in self.abi:
+            self.modules[module_name] = LazyModuleAttributeDict(self, module_name)
+
+    def materialize_module(self, module_name):
+        """Struct and function name -> SuiObject and ModuleFunction of one module"""
+        module = self.abi[module_name]
+        data = {}
+        for struct_name in module.get("structs", dict()):
+            # refuse process include type param object
+            if len(module["structs"][struct_name].get("type_parameters", [])):
+                continue
+            object_type = SuiObject.from_type(f"{self.package_id}::{module_name}::{struct_name}")
+            object_type.package_name = self.package_name
+            data[struct_name] = object_type
+        for func_name in module.get("exposedFunctions", dict()):
+            abi = module["exposedFunctions"][func_name]
+            abi["module_name"] = module_name
+            abi["func_name"] = func_name
+            data[func_name] = ModuleFunction(self, abi)
+        return data
 
     # ####### Publish
 
@@ -1622,25 +1689,39 @@ class SuiProject:
     def __init__(
             self,
             project_path: Union[Path, str] = Path.cwd(),
-            network: str = "sui-testnet"
+            network: str = "sui-testnet",
+            cache_retention: int = 256
     ):
         self.project_path = project_path
         self.network = network
+        # Object ids kept per type and owner
+        self.cache_retention = cache_retention
         self.gas_budget = 500000000
+        self.index_mode = IndexMode.RPC
+        self.response_profile = ResponseProfile.FULL
+        self.request_type = "WaitForLocalExecution"
+        self._index_executor = None
+        self._index_executor_pid = None
 
         self.config = {}
         self.network_config = {}
         self.client: SuiClient = None
         self.accounts: Dict[str, Account] = {}
         self.__active_account = None
+        self.active_account_name = None
+        # Account of the current thread or task, see use_account
+        self._context_account = contextvars.ContextVar(f"sui_brownie_account_{id(self)}", default=None)
         self.packages: Dict[str, List[SuiPackage]] = DefaultDict([])
 
         self.cache_dir = Path(os.environ.get('HOME')).joinpath(".sui-brownie")
         if not self.cache_dir.exists():
             self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # Former json cache, imported into the object index once
         self.cache_file = self.cache_dir.joinpath(f"{self.network}-objects.json")
+        self.object_index = ObjectIndex(self.cache_dir.joinpath(f"{self.network}-objects.db"), self.cache_retention)
         self.cache_objects: Dict[Union[SuiObject, str], Dict[str, list]] = DefaultDict(DefaultDict(NonDupList()))
         self.cli_config_file = self.cache_dir.joinpath(".cli.yaml")
+        self.abi_cache = AbiCache(self.cache_dir.joinpath("abi"))
         self.cli_config: SuiCliConfig = None
 
         self.load_config()
@@ -1656,6 +1737,43 @@ class SuiProject:
         """Set global gas budget"""
         self.gas_budget = gas_budget
 
+    def set_index_mode(self, index_mode):
+        """Set how executed transactions update the object cache, see IndexMode"""
+        self.index_mode = index_mode
+
+    def set_response_profile(self, response_profile, request_type=None):
+        """Set the sections of execute responses, see ResponseProfile, and optionally the request type"""
+        self.response_profile = response_profile
+        if request_type is not None:
+            self.request_type = request_type
+
+    @staticmethod
+    def use_execution(index_mode=None, response_profile=None, request_type=None):
+        """Execution settings of the current thread or asyncio task only, overriding the project's.
+        Lets services sharing the project in one process each keep their own, see `use_account`.
+        """
+        options = dict(_execute_options.get())
+        for (key, value) in [("index_mode", index_mode), ("response_profile", response_profile),
+                             ("request_type", request_type)]:
+            if value is not None:
+                options[key] = value
+        return _execute_options.set(options)
+
+    @classmethod
+    @contextlib.contextmanager
+    def executing(cls, index_mode=None, response_profile=None, request_type=None):
+        """Execution settings of the transactions executed in this context, overriding the project's"""
+        token = cls.use_execution(index_mode, response_profile, request_type)
+        try:
+            yield
+        finally:
+            _execute_options.reset(token)
+
+    @classmethod
+    def indexing(cls, index_mode):
+        """Index mode of the transactions executed in this context, overriding the project's"""
+        return cls.executing(index_mode=index_mode)
+
     def read_item_from_cache(self, item: Union[str, SuiObject]):
         if item in self.cache_objects:
             if self.account.account_address in self.cache_objects[item]:
@@ -1685,11 +1803,23 @@ class SuiProject:
     def active_account(self, account_name):
         assert account_name in self.accounts, f"{account_name} not found in {list(self.accounts.keys())}"
         self.__active_account = self.accounts[account_name]
+        self.active_account_name = account_name
         print(f"\nActive account {account_name}, address:{self.__active_account.account_address}")
         self.cli_config = SuiCliConfig(self.cli_config_file, str(self.client.endpoint), self.network, self.account)
 
+    def use_account(self, account_name):
+        """Active `account_name` for the current thread or asyncio task only, overriding `active_account`.
+        Lets several executors share the project in one process, each signing with its own account.
+        """
+        assert account_name in self.accounts, f"{account_name} not found in {list(self.accounts.keys())}"
+        self._context_account.set(self.accounts[account_name])
+        print(f"\nUse account {account_name}, address:{self.accounts[account_name].account_address}")
+
     @property
     def account(self) -> Account:
+        account = self._context_account.get()
+        if account is not None:
+            return account
         if self.__active_account is None:
             print("account not active")
         return self.__active_account
@@ -1715,13 +1845,15 @@ class SuiProject:
         env = dotenv_values(self.project_path.joinpath(env_file))
         assert "sui_wallets" in self.config, "Unassigned activation accounts"
         assert "from_mnemonic" in self.config["sui_wallets"], "Wallet config format error"
+        # Accounts derive their key on first use, optionally through an encrypted on-disk cache
+        key_cache = KeyCache(self.cache_dir.joinpath("keys")) if self.config["sui_wallets"].get("key_cache") else None
         for account_name, env_name in self.config["sui_wallets"]["from_mnemonic"].items():
             env_name = env_name.replace("$", "").replace("{", "").replace("}", "")
             assert env_name in env, f"{env_name} env not exist"
             if env[env_name][:2] == "0x":
                 self.accounts[account_name] = Account(private_key=env[env_name])
             else:
-                self.accounts[account_name] = Account(mnemonic=env[env_name])
+                self.accounts[account_name] = Account(mnemonic=env[env_name], key_cache=key_cache)
 
         # Create client
         assert "node_url" in self.network_config, "Endpoint not config"
@@ -1732,60 +1864,42 @@ class SuiProject:
         self.accounts[account_name] = Account.generate()
 
     def reload_cache(self):
-        data = self.read_cache()
-        for k1 in data:
+        if self.cache_file.exists() and self.object_index.is_empty():
+            try:
+                self.object_index.import_json(self.cache_file)
+            except Exception as e:
+                print(f"Warning: import cache occurs {e}")
+        for (k1, k2, object_id) in self.object_index.load():
             try:
                 sui_object = SuiObject.from_type(k1)
-                for k2 in data[k1]:
-                    for object_id in data[k1][k2]:
-                        self.add_object_to_cache(sui_object, k2, object_id, persist=False)
+                self.add_object_to_cache(sui_object, k2, object_id, persist=False)
             except:
-                for k2 in data[k1]:
-                    for package_id in data[k1][k2]:
-                        self.add_package_to_cache(k1, package_id, persist=False)
+                self.add_package_to_cache(k1, object_id, persist=False)
 
     def read_cache(self):
-        if not self.cache_file.exists():
-            return {}
-
-        with open(str(self.cache_file), "r") as f:
-            try:
-                data = json.load(f)
-            except Exception as e:
-                print(f"Warning: read cache occurs {e}")
-                return {}
+        data = {}
+        for (k1, k2, object_id) in self.object_index.load():
+            data.setdefault(k1, {}).setdefault(k2, []).append(object_id)
         return data
 
     def write_cache(self):
-        def write_cache_worker():
-            output = DefaultDict({})
-            for k1 in self.cache_objects:
-                for k2 in self.cache_objects[k1]:
-                    output[str(k1)][str(k2)] = self.cache_objects[k1][k2]
-            while True:
-                try:
-                    _cache_file_lock.acquire(timeout=10)
-                    with atomic_write(str(self.cache_file), overwrite=True) as f:
-                        json.dump(output, f, indent=1, sort_keys=True)
-                    _cache_file_lock.release()
-                    break
-                except Exception as e:
-                    print(f"Write cache fail, err:{e}")
-                    time.sleep(1)
-
-        pt = ThreadExecutor(executor=1, mode="all")
-        pt.run([write_cache_worker])
+        """Write pending cache additions now instead of at the next debounced flush"""
+        self.object_index.flush()
 
     def add_object_to_cache(self, sui_object: SuiObject, owner, sui_object_id, persist=True):
-        self.cache_objects[sui_object][owner].append(sui_object_id)
+        object_ids = self.cache_objects[sui_object][owner]
+        object_ids.append(sui_object_id)
+        del object_ids[:-self.cache_retention]
         if persist:
-            self.write_cache()
+            self.object_index.add(sui_object, owner, sui_object_id)
 
     def add_package_to_cache(self, package_name, package_id, persist=True):
         assert package_name is not None, f"{package_id} name is none"
-        self.cache_objects[package_name]["Shared"].append(package_id)
+        package_ids = self.cache_objects[package_name]["Shared"]
+        package_ids.append(package_id)
+        del package_ids[:-self.cache_retention]
         if persist:
-            self.write_cache()
+            self.object_index.add(package_name, "Shared", package_id)
 
     def add_package(self, package: SuiPackage):
         self.packages[package.package_id].append(package)
@@ -1813,7 +1927,7 @@ class SuiProject:
             self,
             tx_bytes,
             signatures,
-            request_type="WaitForLocalExecution",
+            request_type=None,
             module=None,
             function=None,
     ):
@@ -1832,27 +1946,26 @@ class SuiProject:
             locally before returning the client. The local execution makes sure this node is aware of this transaction
             when client fires subsequent queries. However if the node fails to execute the transaction locally in a
             timely manner, a bool type in the response is set to False to indicated the case
+            Defaults to the project's request_type.
         :return:
         """
-        result = self.client.sui_executeTransactionBlock(
-            tx_bytes,
-            signatures,
-            {
-                "showInput": True,
-                "showRawInput": False,
-                "showEffects": True,
-                "showEvents": True,
-                "showObjectChanges": True,
-                "showBalanceChanges": True
-            },
-            request_type
-        )
+        options = _execute_options.get()
+        if request_type is None:
+            request_type = options.get("request_type", self.request_type)
+        show = dict(RESPONSE_OPTIONS[options.get("response_profile", self.response_profile)])
+        if show and options.get("index_mode", self.index_mode) == IndexMode.OBJECT_CHANGES:
+            show["showObjectChanges"] = True
+
+        result = self.client.sui_executeTransactionBlock(tx_bytes, signatures, show, request_type)
 
+        if "effects" not in result:
+            print(f"Execute {module}::{function} submitted, transactionDigest: {result['digest']}")
+            return result
         if result["effects"]["status"]["status"] != "success":
             pprint(result)
         assert result["effects"]["status"]["status"] == "success"
-        self.update_object_index(result["effects"])
-        print(f"Execute {module}::{function} success, transactionDigest: {result['effects']['transactionDigest']}")
+        self.index_transaction(result)
+        print(f"Execute {module}::{function} success, transactionDigest: {result['digest']}")
         return result
 
     def generate_signature(self, msg: bytes):
@@ -1948,6 +2061,63 @@ class SuiProject:
                 raise ValueError
         return object_infos
 
+    def index_transaction(self, result):
+        index_mode = _execute_options.get().get("index_mode", self.index_mode)
+        if index_mode == IndexMode.RPC:
+            self.update_object_index(result["effects"])
+        elif index_mode == IndexMode.OBJECT_CHANGES:
+            self.update_object_index_from_changes(result.get("objectChanges", []))
+        elif index_mode == IndexMode.ASYNC:
+            if self._index_executor is None or self._index_executor_pid != os.getpid():
+                # Worker threads don't survive a fork
+                self._index_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="object_index")
+                self._index_executor_pid = os.getpid()
+            self._index_executor.submit(self._update_object_index_async, result["effects"])
+        elif index_mode != IndexMode.SKIP:
+            raise ValueError(f"Unknown index mode {index_mode}")
+
+    def _update_object_index_async(self, effects):
+        try:
+            self.update_object_index(effects)
+        except Exception as e:
+            print(f"Warning: update object index occurs {e}")
+
+    def add_owned_object_to_cache(self, object_type, owner, sui_object_id):
+        sui_object = SuiObject.from_type(object_type)
+        if "Shared" in owner:
+            self.add_object_to_cache(sui_object, "Shared", sui_object_id)
+        elif "AddressOwner" in owner:
+            self.add_object_to_cache(sui_object, owner["AddressOwner"], sui_object_id)
+        elif "ObjectOwner" in owner:
+            pass
+        else:
+            raise ValueError(f'{str(owner)},{sui_object_id}')
+
+    def update_object_index_from_changes(self, object_changes):
+        """
+        Update Object cache from the objectChanges of an executed transaction
+        :param object_changes:
+            [
+              {
+                "type": "created",
+                "sender": "0x61fbb5b4f342a40bdbf87fe4a946b9e38d18cf8ffc7b0000b975175c7b6a9576",
+                "owner": {
+                  "Shared": {
+                    "initial_shared_version": 2
+                  }
+                },
+                "objectType": "0xb5189942a34446f1d037b446df717987e20a5717::main1::Hello",
+                "objectId": "0xe8d8c7ce863f313da3dbd92a83ef26d128b88fe66bf26e0e0d09cdaf727d1d84",
+                "version": "2",
+                "digest": "EnRQXe1hDGAJCFyF2ds2GmPHdvf9V6yxf24LisEsDkYt"
+              }
+            ]
+        :return:
+        """
+        for change in object_changes:
+            if change["type"] in ["created", "mutated"]:
+                self.add_owned_object_to_cache(change["objectType"], change["owner"], change["objectId"])
+
     def update_object_index(self, result):
         """
         Update Object cache after contract deployment and transaction execution
@@ -1985,16 +2155,8 @@ class SuiProject:
                 if sui_object_info["data"]["type"] == "package":
                     continue
                 else:
-                    sui_object = SuiObject.from_type(sui_object_info["data"]["type"])
-                    if "Shared" in sui_object_info["data"]["owner"]:
-                        self.add_object_to_cache(sui_object, "Shared", sui_object_id)
-                    elif "AddressOwner" in sui_object_info["data"]["owner"]:
-                        owner = sui_object_info["data"]["owner"]["AddressOwner"]
-                        self.add_object_to_cache(sui_object, owner, sui_object_id)
-                    elif "ObjectOwner" in sui_object_info["data"]["owner"]:
-                        pass
-                    else:
-                        raise ValueError(f'{str(sui_object_info["data"]["owner"])},{sui_object_id}')
+                    self.add_owned_object_to_cache(sui_object_info["data"]["type"], sui_object_info["data"]["owner"],
+                                                   sui_object_id)
 
     def get_account_sui(self):
         result = self.client.suix_getCoins(self.account.account_address, "0x2::sui::SUI", None, None)
@@ -1,6 +1,12 @@
+import json
+import random
+import time
+
 from retrying import retry
 import httpx
 
+from .rpc_metrics import RpcError, current_trace_id, error_class, metrics
+
 
 class ApiError(Exception):
     """Error thrown when the API returns >= 400"""
@@ -12,6 +18,10 @@ class ApiError(Exception):
 
 
 class SuiClient:
+    # Attempts per call and the random wait between them, in seconds
+    max_attempts = 5
+    retry_wait = (0.5, 1)
+
     def __init__(self, base_url, timeout):
         self.base_urls = [base_url]
         self.endpoint = base_url
@@ -40,6 +50,47 @@ class SuiClient:
             self.update_endpoint()
             raise e
 
+    def call(self, method, params=None):
+        """JSON-RPC call, recorded in `rpc_metrics.metrics`.
+
+        Failed HTTP attempts switch to the next endpoint and are retried like `post`,
+        a JSON-RPC error response raises RpcError without retrying.
+        """
+        headers = {"Content-Type": "application/json"}
+        trace_id = current_trace_id.get()
+        if trace_id is not None:
+            headers["X-Trace-Id"] = str(trace_id)
+        content = json.dumps({
+            "jsonrpc": "2.0",
+            "id": 1,
+            "method": method,
+            "params": params or []
+        }).encode()
+
+        for attempt in range(1, self.max_attempts + 1):
+            endpoint = self.endpoint
+            start = time.perf_counter()
+            try:
+                response = self._client.post(url=endpoint, content=content, headers=headers)
+                if response.status_code >= 400:
+                    raise ApiError(response.text, response.status_code)
+                result = response.json()
+            except Exception as e:
+                metrics.observe(method, endpoint, time.perf_counter() - start, len(content), error=error_class(e))
+                self.update_endpoint()
+                if attempt == self.max_attempts:
+                    raise e
+                metrics.retried(method)
+                time.sleep(random.uniform(*self.retry_wait))
+                continue
+
+            error = RpcError(result) if "error" in result else None
+            metrics.observe(method, endpoint, time.perf_counter() - start, len(content), len(response.content),
+                            error=error and error_class(error))
+            if error is not None:
+                raise error
+            return result["result"]
+
     def sui_devInspectTransactionBlock(
             self,
             sender_address,
@@ -47,42 +98,13 @@ class SuiClient:
             gas_price,
             epoch,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "sui_devInspectTransactionBlock",
-                "params": [
-                    sender_address,
-                    tx_bytes,
-                    gas_price,
-                    epoch
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("sui_devInspectTransactionBlock", [sender_address, tx_bytes, gas_price, epoch])
 
     def sui_dryRunTransactionBlock(
             self,
             tx_bytes,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "sui_dryRunTransactionBlock",
-                "params": [
-                    tx_bytes,
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("sui_dryRunTransactionBlock", [tx_bytes])
 
     def sui_executeTransactionBlock(
             self,
@@ -91,42 +113,13 @@ class SuiClient:
             options,
             request_type,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "sui_executeTransactionBlock",
-                "params": [
-                    tx_bytes,
-                    signatures,
-                    options,
-                    request_type,
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("sui_executeTransactionBlock", [tx_bytes, signatures, options, request_type])
 
     def sui_getCheckpoint(
             self,
             cid
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "sui_getCheckpoint",
-                "params": [
-                    cid
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("sui_getCheckpoint", [cid])
 
     def sui_getCheckpoints(
             self,
@@ -134,58 +127,18 @@ class SuiClient:
             limit,
             descending_order,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "sui_getCheckpoints",
-                "params": [
-                    cursor,
-                    limit,
-                    descending_order,
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("sui_getCheckpoints", [cursor, limit, descending_order])
 
     def sui_getEvents(
             self,
             transaction_digest,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "sui_getEvents",
-                "params": [
-                    transaction_digest
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("sui_getEvents", [transaction_digest])
 
     def sui_getLatestCheckpointSequenceNumber(
             self,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "sui_getLatestCheckpointSequenceNumber",
-                "params": [
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("sui_getLatestCheckpointSequenceNumber")
 
     def sui_getMoveFunctionArgTypes(
             self,
@@ -193,22 +146,7 @@ class SuiClient:
             module,
             function,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "sui_getMoveFunctionArgTypes",
-                "params": [
-                    package,
-                    module,
-                    function,
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("sui_getMoveFunctionArgTypes", [package, module, function])
 
     def sui_getNormalizedMoveFunction(
             self,
@@ -216,62 +154,20 @@ class SuiClient:
             module_name,
             function_name,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "sui_getNormalizedMoveFunction",
-                "params": [
-                    package,
-                    module_name,
-                    function_name,
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("sui_getNormalizedMoveFunction", [package, module_name, function_name])
 
     def sui_getNormalizedMoveModule(
             self,
             package,
             module_name,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "sui_getNormalizedMoveModule",
-                "params": [
-                    package,
-                    module_name,
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("sui_getNormalizedMoveModule", [package, module_name])
 
     def sui_getNormalizedMoveModulesByPackage(
             self,
             package
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "sui_getNormalizedMoveModulesByPackage",
-                "params": [
-                    package
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("sui_getNormalizedMoveModulesByPackage", [package])
 
     def sui_getNormalizedMoveStruct(
             self,
@@ -279,123 +175,40 @@ class SuiClient:
             module_name,
             struct_name,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "sui_getNormalizedMoveStruct",
-                "params": [
-                    package,
-                    module_name,
-                    struct_name,
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("sui_getNormalizedMoveStruct", [package, module_name, struct_name])
 
     def sui_getObject(
             self,
             object_id,
             options,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "sui_getObject",
-                "params": [
-                    object_id,
-                    options,
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("sui_getObject", [object_id, options])
 
     def sui_getTotalTransactionBlocks(
             self,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "sui_getTotalTransactionBlocks",
-                "params": [
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("sui_getTotalTransactionBlocks")
 
     def sui_getTransactionBlock(
             self,
             digest,
             options,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "sui_getTransactionBlock",
-                "params": [
-                    digest,
-                    options,
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("sui_getTransactionBlock", [digest, options])
 
     def sui_multiGetObjects(
             self,
             object_ids,
             options,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "sui_multiGetObjects",
-                "params": [
-                    object_ids,
-                    options,
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("sui_multiGetObjects", [object_ids, options])
 
     def sui_multiGetTransactionBlocks(
             self,
             digests,
             options,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "sui_multiGetTransactionBlocks",
-                "params": [
-                    digests,
-                    options,
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("sui_multiGetTransactionBlocks", [digests, options])
 
     def sui_tryGetPastObject(
             self,
@@ -403,62 +216,20 @@ class SuiClient:
             version,
             options,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "sui_tryGetPastObject",
-                "params": [
-                    object_id,
-                    version,
-                    options,
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("sui_tryGetPastObject", [object_id, version, options])
 
     def sui_tryMultiGetPastObjects(
             self,
             past_objects,
             options,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "sui_tryMultiGetPastObjects",
-                "params": [
-                    past_objects,
-                    options,
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("sui_tryMultiGetPastObjects", [past_objects, options])
 
     def suix_getAllBalances(
             self,
             owner,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "suix_getAllBalances",
-                "params": [
-                    owner
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("suix_getAllBalances", [owner])
 
     def suix_getAllCoins(
             self,
@@ -466,62 +237,20 @@ class SuiClient:
             cursor,
             limit,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "suix_getAllCoins",
-                "params": [
-                    owner,
-                    cursor,
-                    limit,
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("suix_getAllCoins", [owner, cursor, limit])
 
     def suix_getBalance(
             self,
             owner,
             coin_type,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "suix_getBalance",
-                "params": [
-                    owner,
-                    coin_type,
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("suix_getBalance", [owner, coin_type])
 
     def suix_getCoinMetadata(
             self,
             coin_type,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "suix_getCoinMetadata",
-                "params": [
-                    coin_type,
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("suix_getCoinMetadata", [coin_type])
 
     def suix_getCoins(
             self,
@@ -530,80 +259,25 @@ class SuiClient:
             cursor,
             limit,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "suix_getCoins",
-                "params": [
-                    owner,
-                    coin_type,
-                    cursor,
-                    limit,
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("suix_getCoins", [owner, coin_type, cursor, limit])
 
     def suix_getCommitteeInfo(
             self,
             epoch
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "suix_getCommitteeInfo",
-                "params": [
-                    epoch
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("suix_getCommitteeInfo", [epoch])
 
     def suix_getCurrentEpoch(
             self,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "suix_getCurrentEpoch",
-                "params": [
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("suix_getCurrentEpoch")
 
     def suix_getDynamicFieldObject(
             self,
             parent_object_id,
             name,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "suix_getDynamicFieldObject",
-                "params": [
-                    parent_object_id,
-                    name,
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("suix_getDynamicFieldObject", [parent_object_id, name])
 
     def suix_getDynamicFields(
             self,
@@ -611,22 +285,7 @@ class SuiClient:
             name,
             limit
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "suix_getDynamicFields",
-                "params": [
-                    parent_object_id,
-                    name,
-                    limit
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("suix_getDynamicFields", [parent_object_id, name, limit])
 
     def suix_getEpochs(
             self,
@@ -634,73 +293,22 @@ class SuiClient:
             limit,
             descending_order,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "suix_getEpochs",
-                "params": [
-                    cursor,
-                    limit,
-                    descending_order,
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("suix_getEpochs", [cursor, limit, descending_order])
 
     def suix_getLatestSuiSystemState(
             self,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "suix_getLatestSuiSystemState",
-                "params": [
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("suix_getLatestSuiSystemState")
 
     def suix_getMoveCallMetrics(
             self,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "suix_getMoveCallMetrics",
-                "params": [
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("suix_getMoveCallMetrics")
 
     def suix_getNetworkMetrics(
             self,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "suix_getNetworkMetrics",
-                "params": [
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("suix_getNetworkMetrics")
 
     def suix_getOwnedObjects(
             self,
@@ -709,97 +317,30 @@ class SuiClient:
             cursor,
             limit,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "suix_getOwnedObjects",
-                "params": [
-                    address,
-                    query,
-                    cursor,
-                    limit,
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("suix_getOwnedObjects", [address, query, cursor, limit])
 
     def suix_getReferenceGasPrice(
             self
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "suix_getReferenceGasPrice",
-                "params": [
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("suix_getReferenceGasPrice")
 
     def suix_getStakes(
             self,
             owner
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "suix_getStakes",
-                "params": [
-                    owner
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("suix_getStakes", [owner])
 
     def suix_getStakesByIds(
             self,
             staked_sui_ids,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "suix_getStakesByIds",
-                "params": [
-                    staked_sui_ids,
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("suix_getStakesByIds", [staked_sui_ids])
 
     def suix_getTotalSupply(
             self,
             coin_type,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "suix_getTotalSupply",
-                "params": [
-                    coin_type,
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("suix_getTotalSupply", [coin_type])
 
     def suix_queryEvents(
             self,
@@ -808,23 +349,7 @@ class SuiClient:
             limit,
             descending_order,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "suix_queryEvents",
-                "params": [
-                    query,
-                    cursor,
-                    limit,
-                    descending_order,
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("suix_queryEvents", [query, cursor, limit, descending_order])
 
     def suix_queryObjects(
             self,
@@ -832,22 +357,7 @@ class SuiClient:
             cursor,
             limit,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "suix_queryObjects",
-                "params": [
-                    query,
-                    cursor,
-                    limit,
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("suix_queryObjects", [query, cursor, limit])
 
     def suix_queryTransactionBlocks(
             self,
@@ -856,23 +366,7 @@ class SuiClient:
             limit,
             descending_order,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "suix_queryTransactionBlocks",
-                "params": [
-                    query,
-                    cursor,
-                    limit,
-                    descending_order,
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("suix_queryTransactionBlocks", [query, cursor, limit, descending_order])
 
     def suix_subscribeEvent(
             self,
@@ -881,23 +375,7 @@ class SuiClient:
             gas_price,
             epoch,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "suix_subscribeEvent",
-                "params": [
-                    sender_address,
-                    tx_bytes,
-                    gas_price,
-                    epoch
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("suix_subscribeEvent", [sender_address, tx_bytes, gas_price, epoch])
 
     def unsafe_batchTransaction(
             self,
@@ -907,24 +385,16 @@ class SuiClient:
             gas_budget,
             txn_builder_mode,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "unsafe_batchTransaction",
-                "params": [
-                    signer,
-                    single_transaction_params,
-                    gas,
-                    gas_budget,
-                    txn_builder_mode,
-                ]
-            },
+        return self.call(
+            "unsafe_batchTransaction",
+            [
+                signer,
+                single_transaction_params,
+                gas,
+                gas_budget,
+                txn_builder_mode
+            ]
         )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
 
     def unsafe_mergeCoins(
             self,
@@ -934,24 +404,7 @@ class SuiClient:
             gas,
             gas_budget
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "unsafe_mergeCoins",
-                "params": [
-                    signer,
-                    primary_coin,
-                    coin_to_merge,
-                    gas,
-                    gas_budget
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("unsafe_mergeCoins", [signer, primary_coin, coin_to_merge, gas, gas_budget])
 
     def unsafe_moveCall(
             self,
@@ -965,28 +418,20 @@ class SuiClient:
             gas_budget,
             execution_mode
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "unsafe_moveCall",
-                "params": [
-                    signer,
-                    package_object_id,
-                    module,
-                    function,
-                    type_arguments,
-                    arguments,
-                    gas,
-                    gas_budget,
-                    execution_mode
-                ]
-            },
+        return self.call(
+            "unsafe_moveCall",
+            [
+                signer,
+                package_object_id,
+                module,
+                function,
+                type_arguments,
+                arguments,
+                gas,
+                gas_budget,
+                execution_mode
+            ]
         )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
 
     def unsafe_pay(
             self,
@@ -997,25 +442,7 @@ class SuiClient:
             gas,
             gas_budget
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "unsafe_pay",
-                "params": [
-                    signer,
-                    input_coins,
-                    recipients,
-                    amounts,
-                    gas,
-                    gas_budget
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("unsafe_pay", [signer, input_coins, recipients, amounts, gas, gas_budget])
 
     def unsafe_payAllSui(
             self,
@@ -1024,23 +451,7 @@ class SuiClient:
             recipient,
             gas_budget
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "unsafe_payAllSui",
-                "params": [
-                    signer,
-                    input_coins,
-                    recipient,
-                    gas_budget
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("unsafe_payAllSui", [signer, input_coins, recipient, gas_budget])
 
     def unsafe_paySui(
             self,
@@ -1050,24 +461,7 @@ class SuiClient:
             amounts,
             gas_budget
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "unsafe_paySui",
-                "params": [
-                    signer,
-                    input_coins,
-                    recipients,
-                    amounts,
-                    gas_budget
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("unsafe_paySui", [signer, input_coins, recipients, amounts, gas_budget])
 
     def unsafe_publish(
             self,
@@ -1077,24 +471,7 @@ class SuiClient:
             gas,
             gas_budget
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "unsafe_publish",
-                "params": [
-                    sender,
-                    compiled_modules,
-                    dependencies,
-                    gas,
-                    gas_budget
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("unsafe_publish", [sender, compiled_modules, dependencies, gas, gas_budget])
 
     def unsafe_requestAddStake(
             self,
@@ -1105,25 +482,7 @@ class SuiClient:
             gas,
             gas_budget
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "unsafe_requestAddStake",
-                "params": [
-                    signer,
-                    coins,
-                    amount,
-                    validator,
-                    gas,
-                    gas_budget
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("unsafe_requestAddStake", [signer, coins, amount, validator, gas, gas_budget])
 
     def unsafe_requestWithdrawStake(
             self,
@@ -1132,23 +491,7 @@ class SuiClient:
             gas,
             gas_budget,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "unsafe_requestWithdrawStake",
-                "params": [
-                    signer,
-                    staked_sui,
-                    gas,
-                    gas_budget,
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("unsafe_requestWithdrawStake", [signer, staked_sui, gas, gas_budget])
 
     def unsafe_splitCoin(
             self,
@@ -1158,24 +501,7 @@ class SuiClient:
             gas,
             gas_budget
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "unsafe_splitCoin",
-                "params": [
-                    signer,
-                    coin_object_id,
-                    split_amounts,
-                    gas,
-                    gas_budget
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("unsafe_splitCoin", [signer, coin_object_id, split_amounts, gas, gas_budget])
 
     def unsafe_splitCoinEqual(
             self,
@@ -1185,24 +511,7 @@ class SuiClient:
             gas,
             gas_budget
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "unsafe_splitCoinEqual",
-                "params": [
-                    signer,
-                    coin_object_id,
-                    split_count,
-                    gas,
-                    gas_budget
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("unsafe_splitCoinEqual", [signer, coin_object_id, split_count, gas, gas_budget])
 
     def unsafe_transferObject(
             self,
@@ -1212,24 +521,7 @@ class SuiClient:
             gas_budget,
             recipient,
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "unsafe_transferObject",
-                "params": [
-                    signer,
-                    object_id,
-                    gas,
-                    gas_budget,
-                    recipient,
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("unsafe_transferObject", [signer, object_id, gas, gas_budget, recipient])
 
     def unsafe_transferSui(
             self,
@@ -1239,21 +531,4 @@ class SuiClient:
             recipient,
             amount
     ):
-        response = self.post(
-            f"{self.endpoint}",
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "unsafe_transferSui",
-                "params": [
-                    signer,
-                    sui_object_id,
-                    gas_budget,
-                    recipient,
-                    amount
-                ]
-            },
-        )
-        response = response.json()
-        assert "error" not in response, response
-        return response["result"]
+        return self.call("unsafe_transferSui", [signer, sui_object_id, gas_budget, recipient, amount])
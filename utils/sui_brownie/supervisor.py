@@ -0,0 +1,303 @@
+"""
+Supervised long-running services.
+
+A `Supervisor` runs named services, each in its own process, in a thread or as a coroutine
+on a shared event loop. Services that exit, crash or stop sending heartbeats are restarted
+with exponential backoff, and all of them are stopped on SIGINT/SIGTERM:
+
+    Supervisor([
+        Service("sui_core_executor_1", functools.partial(sui_core_executor, "LendingCore1"),
+                heartbeat_timeout=600),
+        Service("price_refresher", refresh_prices, kind=Service.ASYNC),
+    ]).run()
+
+A service calls `heartbeat()` in its loop to report that it is alive, and may check
+`stopping()` to finish its current unit of work and return on shutdown. Services that
+don't are terminated after the shutdown grace period.
+
+Services sharing a process, e.g. to share clients and caches, are grouped with `run_group`:
+
+    Service("sui", functools.partial(run_group, [
+        Service("sui_core_executor_1", ..., kind=Service.THREAD),
+        Service("sui_core_executor_2", ..., kind=Service.THREAD),
+    ]))
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+import multiprocessing
+import signal
+import threading
+import time
+from typing import Callable, List
+
+logger = logging.getLogger("sui_brownie.supervisor")
+
+current_service = contextvars.ContextVar("sui_brownie_service", default=None)
+
+
+def heartbeat():
+    """Report the calling service as alive, a no-op outside a supervised service"""
+    liveness = current_service.get()
+    if liveness is not None:
+        liveness.last_beat.value = time.time()
+
+
+def stopping() -> bool:
+    """Whether the supervisor asked the calling service to stop"""
+    liveness = current_service.get()
+    return liveness is not None and liveness.stop.is_set()
+
+
+class Liveness:
+    """State shared by the supervisor and one run of a service, across processes too"""
+
+    def __init__(self):
+        self.last_beat = multiprocessing.Value("d", time.time(), lock=False)
+        self.stop = multiprocessing.Event()
+
+
+def run_group(services: List[Service], check_interval=1, shutdown_grace=5):
+    """Supervise `services` within the calling service, usually as its threads or coroutines"""
+    Supervisor(services, check_interval=check_interval, shutdown_grace=shutdown_grace).run()
+
+
+def _run_process(liveness, target):
+    # Ctrl-C reaches the whole process group, the supervisor alone decides on shutdown
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    current_service.set(liveness)
+    target()
+
+
+class Service:
+    PROCESS = "process"
+    THREAD = "thread"
+    # `target` is a coroutine function
+    ASYNC = "async"
+
+    def __init__(self, name: str, target: Callable, kind=PROCESS, restart=True, heartbeat_timeout=None,
+                 backoff=1, max_backoff=60):
+        """
+        :param name: unique, used in logs and status
+        :param target: callable taking no argument, usually a functools.partial
+        :param kind: Service.PROCESS, Service.THREAD or Service.ASYNC
+        :param restart: restart the service whenever it returns or raises
+        :param heartbeat_timeout: seconds without heartbeat after which the service is considered hung,
+            None to not check. Hung processes and coroutines are restarted, hung threads only reported.
+        :param backoff: seconds before the first restart, doubled on each consecutive failure
+        :param max_backoff: upper bound of the restart delay, a service running for that long
+            is considered stable again and restarts after `backoff`
+        """
+        assert kind in [self.PROCESS, self.THREAD, self.ASYNC], f"Unknown service kind {kind}"
+        self.name = name
+        self.target = target
+        self.kind = kind
+        self.restart = restart
+        self.heartbeat_timeout = heartbeat_timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+
+class Worker:
+    """A service and its current run"""
+
+    def __init__(self, service: Service):
+        self.service = service
+        # multiprocessing.Process, threading.Thread or concurrent.futures.Future
+        self.handle = None
+        self.liveness = None
+        self.started_at = None
+        self.hung = False
+        self.error = None
+        self.last_exit = None
+        self.restarts = 0
+        self.failures = 0
+        self.next_start = 0
+        self.finished = False
+
+    def alive(self):
+        if self.handle is None:
+            return False
+        if self.service.kind == Service.ASYNC:
+            return not self.handle.done()
+        return self.handle.is_alive()
+
+    def exit_reason(self):
+        if self.service.kind == Service.PROCESS:
+            return f"exit code {self.handle.exitcode}"
+        if self.service.kind == Service.ASYNC:
+            if self.handle.cancelled():
+                return "cancelled"
+            self.error = self.handle.exception()
+        return f"raised {self.error!r}" if self.error is not None else "returned"
+
+
+class Supervisor:
+    def __init__(self, services: List[Service], check_interval=1, shutdown_grace=10):
+        names = [service.name for service in services]
+        assert len(names) == len(set(names)), f"Duplicate service names in {names}"
+        self.workers = {service.name: Worker(service) for service in services}
+        self.check_interval = check_interval
+        self.shutdown_grace = shutdown_grace
+        self._stop = threading.Event()
+        self._loop = None
+        self._loop_thread = None
+
+    def run(self):
+        """Start the services and supervise them until `stop` or SIGINT/SIGTERM.
+
+        Run as a service itself, the supervisor also stops with it, and sends its heartbeat
+        only while none of its services hung.
+        """
+        handlers = {}
+        # Within a service, signals are left to the enclosing supervisor
+        if threading.current_thread() is threading.main_thread() and current_service.get() is None:
+            for sig in [signal.SIGINT, signal.SIGTERM]:
+                handlers[sig] = signal.signal(sig, lambda signum, frame: self.stop())
+        try:
+            self.start()
+            while not self._stop.wait(self.check_interval) and not stopping():
+                self.check()
+                if not any(worker.hung for worker in self.workers.values()):
+                    heartbeat()
+        finally:
+            self.shutdown()
+            for (sig, handler) in handlers.items():
+                signal.signal(sig, handler)
+
+    def stop(self):
+        self._stop.set()
+
+    def start(self):
+        for worker in self.workers.values():
+            self._start(worker)
+
+    def check(self):
+        """Restart the services that exited or hung, once their backoff elapsed"""
+        now = time.time()
+        for worker in self.workers.values():
+            if worker.finished:
+                continue
+            if worker.handle is None:
+                if now >= worker.next_start:
+                    worker.restarts += 1
+                    self._start(worker)
+            elif not worker.alive():
+                self._exited(worker, now)
+            elif self._hung(worker, now) and not worker.hung:
+                worker.hung = True
+                logger.warning(f"Service {worker.service.name} sent no heartbeat for "
+                               f"{now - worker.liveness.last_beat.value:.0f}s")
+                if worker.service.kind == Service.PROCESS:
+                    worker.handle.terminate()
+                elif worker.service.kind == Service.ASYNC:
+                    worker.handle.cancel()
+            elif worker.hung and not self._hung(worker, now):
+                worker.hung = False
+                logger.info(f"Service {worker.service.name} is alive again")
+
+    def status(self):
+        """Liveness of each service, e.g. for a health endpoint"""
+        now = time.time()
+        return {
+            name: {
+                "kind": worker.service.kind,
+                "alive": worker.alive(),
+                "healthy": worker.alive() and not worker.hung,
+                "restarts": worker.restarts,
+                "uptime": now - worker.started_at if worker.alive() else 0,
+                "last_heartbeat": worker.liveness.last_beat.value if worker.liveness is not None else None,
+                "last_exit": worker.last_exit,
+            }
+            for (name, worker) in self.workers.items()
+        }
+
+    def shutdown(self):
+        """Ask every service to stop, terminating those still running after `shutdown_grace` seconds"""
+        self._stop.set()
+        running = [worker for worker in self.workers.values() if worker.alive()]
+        for worker in running:
+            worker.liveness.stop.set()
+        deadline = time.time() + self.shutdown_grace
+        while any(worker.alive() for worker in running) and time.time() < deadline:
+            time.sleep(0.1)
+
+        for worker in running:
+            if not worker.alive():
+                continue
+            logger.warning(f"Service {worker.service.name} didn't stop within {self.shutdown_grace}s")
+            if worker.service.kind == Service.PROCESS:
+                worker.handle.terminate()
+                worker.handle.join(1)
+                if worker.handle.is_alive():
+                    worker.handle.kill()
+            elif worker.service.kind == Service.ASYNC:
+                worker.handle.cancel()
+            # Threads are daemons and end with the interpreter
+
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop_thread.join(1)
+            self._loop = None
+
+    def _hung(self, worker, now):
+        timeout = worker.service.heartbeat_timeout
+        return timeout is not None and now - worker.liveness.last_beat.value > timeout
+
+    def _start(self, worker: Worker):
+        service = worker.service
+        worker.liveness = Liveness()
+        worker.started_at = time.time()
+        worker.hung = False
+        worker.error = None
+        if service.kind == Service.PROCESS:
+            worker.handle = multiprocessing.Process(target=_run_process, args=(worker.liveness, service.target),
+                                                    name=service.name, daemon=True)
+            worker.handle.start()
+        elif service.kind == Service.THREAD:
+            worker.handle = threading.Thread(target=self._run_thread, args=(worker,), name=service.name,
+                                             daemon=True)
+            worker.handle.start()
+        else:
+            worker.handle = asyncio.run_coroutine_threadsafe(self._run_async(worker), self._event_loop())
+        logger.info(f"Service {service.name} started")
+
+    def _exited(self, worker: Worker, now):
+        service = worker.service
+        worker.last_exit = worker.exit_reason()
+        worker.handle = None
+        if not service.restart or self._stop.is_set():
+            worker.finished = True
+            logger.warning(f"Service {service.name} {worker.last_exit}")
+            return
+        if now - worker.started_at >= service.max_backoff:
+            worker.failures = 0
+        delay = min(service.max_backoff, service.backoff * 2 ** worker.failures)
+        worker.failures += 1
+        worker.next_start = now + delay
+        logger.warning(f"Service {service.name} {worker.last_exit}, restart in {delay}s")
+
+    @staticmethod
+    def _run_thread(worker: Worker):
+        current_service.set(worker.liveness)
+        try:
+            worker.service.target()
+        except Exception as e:
+            worker.error = e
+            logger.exception(f"Service {worker.service.name} failed")
+
+    @staticmethod
+    async def _run_async(worker: Worker):
+        current_service.set(worker.liveness)
+        await worker.service.target()
+
+    def _event_loop(self):
+        """The loop of the asyncio services, running in its own thread"""
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            self._loop_thread = threading.Thread(target=self._loop.run_forever, name="supervisor_asyncio",
+                                                 daemon=True)
+            self._loop_thread.start()
+        return self._loop
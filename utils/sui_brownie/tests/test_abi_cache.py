@@ -0,0 +1,100 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from sui_brownie.abi_cache import AbiCache
+from sui_brownie.sui_brownie import SuiPackage, _load_project
+
+FIXTURES = Path(__file__).parent.joinpath("fixtures", "benchmark_rpc.json")
+
+
+def normalized_modules(abis):
+    """Normalized modules as returned by sui_getNormalizedMoveModulesByPackage"""
+    modules = {}
+    for (name, abi) in abis.items():
+        abi = dict(abi)
+        module_name = abi.pop("module_name")
+        abi.pop("func_name")
+        modules.setdefault(module_name, {"structs": {"Cap": {"abilities": {"abilities": ["Key"]}}},
+                                         "exposedFunctions": {}})
+        modules[module_name]["exposedFunctions"][name] = abi
+    return modules
+
+
+class CountingClient:
+    def __init__(self, modules):
+        self.modules = modules
+        self.calls = 0
+
+    def sui_getNormalizedMoveModulesByPackage(self, package_id):
+        self.calls += 1
+        return json.loads(json.dumps(self.modules))
+
+
+class CachedProject:
+    def __init__(self, cache_dir, modules):
+        self.abi_cache = AbiCache(cache_dir)
+        self.client = CountingClient(modules)
+
+
+class TestAbiCache(unittest.TestCase):
+    def setUp(self):
+        with open(FIXTURES) as f:
+            self.fixtures = json.load(f)
+        self.modules = normalized_modules(self.fixtures["abis"])
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = AbiCache(Path(self.tmp.name))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        package_id = self.fixtures["dola_protocol"]
+        assert self.cache.load(package_id) is None
+        self.cache.store(package_id, self.modules)
+
+        abi = self.cache.load(package_id)
+        assert set(abi) == set(self.modules)
+        # Modules are decoded on first access only
+        assert abi.modules == {}
+        module_name = next(iter(self.modules))
+        assert abi[module_name] == self.modules[module_name]
+        assert list(abi.modules) == [module_name]
+        assert dict(abi) == self.modules
+
+    def test_corrupt_file(self):
+        package_id = self.fixtures["dola_protocol"]
+        self.cache.path(package_id).write_bytes(b"not an abi")
+        assert self.cache.load(package_id) is None
+
+    def test_package_skips_rpc(self):
+        project = CachedProject(Path(self.tmp.name), self.modules)
+        _load_project.insert(0, project)
+        self.addCleanup(_load_project.remove, project)
+        package_id = self.fixtures["dola_protocol"]
+        first = SuiPackage(package_id=package_id, package_name="dola_protocol")
+        second = SuiPackage(package_id=package_id, package_name="dola_protocol")
+
+        assert project.client.calls == 1
+        assert list(first.modules.keys()) == list(second.modules.keys()) == list(self.modules)
+        supply = second.lending_core_wormhole_adapter.supply
+        assert supply.abi["parameters"] == first.lending_core_wormhole_adapter.supply.abi["parameters"]
+
+    def test_lazy_modules(self):
+        project = CachedProject(Path(self.tmp.name), self.modules)
+        _load_project.insert(0, project)
+        self.addCleanup(_load_project.remove, project)
+        package = SuiPackage(package_id=self.fixtures["wormhole"], package_name="wormhole")
+
+        assert all(module._data is None for module in package.modules.values())
+        assert package.abi.modules == {}
+
+        assert package.vaa.parse_and_verify.abi["func_name"] == "parse_and_verify"
+        assert str(package.vaa["Cap"]) == f"{package.package_id}::vaa::Cap"
+        assert package.modules["lending_core_wormhole_adapter"]._data is None
+        assert list(package.abi.modules) == ["vaa"]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,9 @@
+import tempfile
 import unittest
+from pathlib import Path
 
 from sui_brownie import Account
+from sui_brownie.account import KeyCache
 
 
 class TestAccount(unittest.TestCase):
@@ -33,3 +36,24 @@ class TestAccount(unittest.TestCase):
         for mnemonic, pubkey, address in self.TEST_CASES:
             acc = Account(mnemonic=mnemonic)
             assert acc.public_key().verify(msg, acc.private_key.sign(msg))
+
+    def test_lazy_derivation(self):
+        mnemonic, _, address = self.TEST_CASES[0]
+        acc = Account(mnemonic=mnemonic)
+        assert acc._private_key is None
+        assert acc.account_address == address
+        assert acc.public_key() is acc.public_key()
+
+    def test_key_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            key_cache = KeyCache(Path(cache_dir))
+            for mnemonic, pubkey, address in self.TEST_CASES:
+                assert key_cache.load(mnemonic) is None
+                assert Account(mnemonic=mnemonic, key_cache=key_cache).account_address == address
+
+                cached = key_cache.load(mnemonic)
+                assert cached == Account(mnemonic=mnemonic).private_key
+                assert Account(mnemonic=mnemonic, key_cache=key_cache).account_address == address
+                # The mnemonic is neither in the name nor in the content of the entry
+                assert mnemonic.split()[0] not in key_cache.path(mnemonic).name
+                assert cached.key.encode() not in key_cache.path(mnemonic).read_bytes()
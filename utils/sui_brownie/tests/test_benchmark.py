@@ -0,0 +1,173 @@
+import json
+import os
+import platform
+import statistics
+import time
+import timeit
+import unittest
+from pathlib import Path
+
+from sui_brownie import Account, Argument, U8, U16
+from sui_brownie.bcs import encode_list
+from sui_brownie.ed25519 import PrivateKey
+from sui_brownie.sui_brownie import SuiProject, TransactionBuild, _load_project
+
+FIXTURES = Path(__file__).parent.joinpath("fixtures", "benchmark_rpc.json")
+
+# Run history, compared against the previous run to spot regressions. Only kept when set,
+# plain test runs write nothing.
+RESULTS_FILE = Path(os.environ["SUI_BROWNIE_BENCHMARK_RESULTS"]) if os.environ.get(
+    "SUI_BROWNIE_BENCHMARK_RESULTS") else None
+
+# Seconds each benchmark is timed for, raise for stable numbers
+BENCHMARK_TIME = float(os.environ.get("SUI_BROWNIE_BENCHMARK_TIME", 0.2))
+
+
+class RecordedClient:
+    """Answers the RPCs of transaction construction from recorded responses"""
+
+    def __init__(self, fixtures):
+        self.fixtures = fixtures
+
+    def sui_multiGetObjects(self, object_ids, options):
+        return [self.fixtures["sui_multiGetObjects"][object_id] for object_id in object_ids]
+
+    def suix_getCoins(self, owner, coin_type, cursor, limit):
+        return self.fixtures["suix_getCoins"]
+
+
+class RecordedProject:
+    """The parts of SuiProject used by TransactionBuild, without config files or network"""
+
+    get_objects = SuiProject.get_objects
+    generate_signature = SuiProject.generate_signature
+
+    def __init__(self, fixtures):
+        self.client = RecordedClient(fixtures)
+        self.account = Account(mnemonic=fixtures["mnemonic"])
+
+
+class TestBenchmark(unittest.TestCase):
+    results = {}
+
+    @classmethod
+    def setUpClass(cls):
+        with open(FIXTURES) as f:
+            cls.fixtures = json.load(f)
+        cls.project = RecordedProject(cls.fixtures)
+        _load_project.insert(0, cls.project)
+        TransactionBuild.project.cache_clear()
+
+        objects = cls.fixtures["object_ids"]
+        cls.vaa = list(bytes.fromhex(cls.fixtures["vaa"][2:]))
+        cls.supply_args = [objects["GovernanceGenesis"], objects["PoolManagerInfo"], objects["UserManagerInfo"],
+                           objects["WormholeState"], objects["CoreState"], objects["PriceOracle"],
+                           objects["Storage"], cls.vaa, objects["Clock"]]
+
+    @classmethod
+    def tearDownClass(cls):
+        _load_project.remove(cls.project)
+        TransactionBuild.project.cache_clear()
+        cls.store_results()
+
+    @classmethod
+    def store_results(cls):
+        if RESULTS_FILE is None:
+            return
+        history = []
+        if RESULTS_FILE.exists():
+            with open(RESULTS_FILE) as f:
+                history = json.load(f)
+        previous = history[-1]["results"] if history else {}
+
+        print(f"\n{'benchmark':<40} {'min us':>12} {'median us':>12} {'vs previous':>12}")
+        for (name, result) in sorted(cls.results.items()):
+            change = ""
+            if name in previous:
+                change = f"{(result['min'] / previous[name]['min'] - 1) * 100:+.1f}%"
+            print(f"{name:<40} {result['min'] * 1e6:>12.1f} {result['median'] * 1e6:>12.1f} {change:>12}")
+
+        history.append({
+            "time": int(time.time()),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "results": cls.results,
+        })
+        RESULTS_FILE.parent.mkdir(parents=True, exist_ok=True)
+        with open(RESULTS_FILE, "w") as f:
+            json.dump(history, f, indent=1)
+
+    def benchmark(self, name, func):
+        """Time `func` asv style: calls per sample calibrated to ~BENCHMARK_TIME/5, 5 samples"""
+        timer = timeit.Timer(func)
+        number, _ = timer.autorange()
+        number = max(1, int(number * BENCHMARK_TIME / 5 / 0.2))
+        samples = [t / number for t in timer.repeat(repeat=5, number=number)]
+        self.results[name] = {"min": min(samples), "median": statistics.median(samples), "number": number}
+        return func()
+
+    def move_call(self):
+        return TransactionBuild.move_call(
+            self.fixtures["sender"],
+            self.fixtures["dola_protocol"],
+            self.fixtures["abis"]["supply"],
+            [],
+            self.supply_args,
+            gas_price=750,
+            gas_budget=int(1e9),
+        )
+
+    def test_move_call(self):
+        msg = self.benchmark("TransactionBuild.move_call", self.move_call)
+        assert len(msg.value.value.kind.value.inputs) == len(self.supply_args)
+
+    def test_batch_transaction(self):
+        objects = self.fixtures["object_ids"]
+        abis = self.fixtures["abis"]
+
+        def batch_transaction():
+            return TransactionBuild.batch_transaction(
+                self.fixtures["sender"],
+                [objects["WormholeState"], self.vaa, objects["Clock"]],
+                [
+                    [self.fixtures["wormhole"], abis["parse_and_verify"], [],
+                     [Argument("Input", U16(0)), Argument("Input", U16(1)), Argument("Input", U16(2))]],
+                    [self.fixtures["wormhole"], abis["take_payload"], [], [Argument("Result", U16(0))]],
+                ],
+                gas_price=750,
+                gas_budget=int(1e9),
+            )
+
+        msg = self.benchmark("TransactionBuild.batch_transaction", batch_transaction)
+        assert len(msg.value.value.kind.value.commands) == 2
+
+    def test_generate_call_arg_vaa(self):
+        call_arg = self.benchmark("TransactionBuild.generate_call_arg vaa",
+                                  lambda: TransactionBuild.generate_call_arg({"Vector": "U8"}, self.vaa, {}))
+        # uleb128 length prefix + the VAA bytes
+        assert [v.v0 for v in call_arg.value.v0][2:] == self.vaa
+
+    def test_encode_list(self):
+        data = [U8(v) for v in self.vaa]
+        encoded = self.benchmark("bcs.encode_list vaa", lambda: encode_list(data))
+        assert encoded[2:] == bytes(self.vaa)
+
+    def test_intent_message_encode(self):
+        msg = self.move_call()
+        encoded = self.benchmark("IntentMessage.encode", lambda: msg.encode)
+        assert encoded[:3] == bytes([0, 0, 0])
+
+    def test_generate_signature(self):
+        msg = self.move_call().encode
+        signature = self.benchmark("SuiProject.generate_signature",
+                                   lambda: self.project.generate_signature(msg))
+        assert signature == self.project.generate_signature(msg)
+
+    def test_from_mnemonic(self):
+        private_key = self.benchmark("PrivateKey.from_mnemonic",
+                                     lambda: PrivateKey.from_mnemonic(self.fixtures["mnemonic"]))
+        assert str(private_key.public_key().address()) == self.fixtures["sender"]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,6 @@
 import unittest
 
-from sui_client import SuiClient
+from sui_brownie.sui_client import SuiClient
 
 
 class TestSuiBrownie(unittest.TestCase):
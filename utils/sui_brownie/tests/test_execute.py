@@ -0,0 +1,197 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
+
+from sui_brownie.sui_brownie import IndexMode, ResponseProfile, SuiObject, SuiProject, _load_project
+
+OWNER = "0x61fbb5b4f342a40bdbf87fe4a946b9e38d18cf8ffc7b0000b975175c7b6a9576"
+STORAGE = "0x5a1e5a1e5a1e5a1e5a1e5a1e5a1e5a1e5a1e5a1e5a1e5a1e5a1e5a1e5a1e5a1e"
+COIN = "0xc014c014c014c014c014c014c014c014c014c014c014c014c014c014c014c014"
+STORAGE_TYPE = "0xd01a::lending_core_storage::Storage"
+COIN_TYPE = "0x2::coin::Coin<0x2::sui::SUI>"
+
+EXECUTE_RESULT = {
+    "digest": "3Dd1Lj7bQz3GBBdSbRkqQWrBSbhpDoNrLdhdgkdFJQvf",
+    "effects": {
+        "status": {"status": "success"},
+        "mutated": [
+            {"owner": {"Shared": {"initial_shared_version": 2}}, "reference": {"objectId": STORAGE}},
+            {"owner": {"AddressOwner": OWNER}, "reference": {"objectId": COIN}},
+        ],
+    },
+    "objectChanges": [
+        {"type": "mutated", "owner": {"Shared": {"initial_shared_version": 2}}, "objectType": STORAGE_TYPE,
+         "objectId": STORAGE},
+        {"type": "mutated", "owner": {"AddressOwner": OWNER}, "objectType": COIN_TYPE, "objectId": COIN},
+    ],
+}
+
+OBJECTS = {
+    STORAGE: {"objectId": STORAGE, "type": STORAGE_TYPE, "owner": {"Shared": {"initial_shared_version": 2}}},
+    COIN: {"objectId": COIN, "type": COIN_TYPE, "owner": {"AddressOwner": OWNER}},
+}
+
+
+class FakeNode(BaseHTTPRequestHandler):
+    calls = []
+    executes = []
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.calls.append(request["method"])
+        if request["method"] == "sui_executeTransactionBlock":
+            (_, _, options, request_type) = request["params"]
+            self.executes.append((options, request_type))
+            result = {"digest": EXECUTE_RESULT["digest"]}
+            if options.get("showEffects"):
+                result["effects"] = EXECUTE_RESULT["effects"]
+            if options.get("showObjectChanges"):
+                result["objectChanges"] = EXECUTE_RESULT["objectChanges"]
+        else:
+            assert request["method"] == "sui_multiGetObjects"
+            result = [{"data": OBJECTS[object_id]} for object_id in request["params"][0]]
+        body = json.dumps({"jsonrpc": "2.0", "id": 1, "result": result}).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestExecute(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeNode)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        FakeNode.calls.clear()
+        FakeNode.executes.clear()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        project_path = Path(tmp.name).joinpath("project")
+        project_path.mkdir()
+        project_path.joinpath("brownie-config.yaml").write_text(
+            "networks:\n"
+            "  sui-testnet:\n"
+            f"    node_url: http://127.0.0.1:{self.server.server_port}\n"
+            "sui_wallets:\n"
+            "  from_mnemonic:\n"
+            "    TestAccount: ${TEST_ACCOUNT}\n"
+            "    OtherAccount: ${OTHER_ACCOUNT}\n")
+        project_path.joinpath(".env").write_text(f"TEST_ACCOUNT=0x{'01' * 32}\nOTHER_ACCOUNT=0x{'02' * 32}\n")
+
+        with mock.patch.dict(os.environ, {"HOME": tmp.name}):
+            self.project = SuiProject(project_path=project_path, network="sui-testnet")
+        self.addCleanup(_load_project.remove, self.project)
+        self.addCleanup(self.project.write_cache)
+
+    def cached(self):
+        return (list(self.project.cache_objects[SuiObject.from_type(STORAGE_TYPE)]["Shared"]),
+                list(self.project.cache_objects[SuiObject.from_type(COIN_TYPE)][OWNER]))
+
+    def test_rpc(self):
+        self.project.index_transaction(EXECUTE_RESULT)
+        assert FakeNode.calls == ["sui_multiGetObjects"]
+        assert self.cached() == ([STORAGE], [COIN])
+
+    def test_object_changes(self):
+        self.project.set_index_mode(IndexMode.OBJECT_CHANGES)
+        self.project.index_transaction(EXECUTE_RESULT)
+        assert FakeNode.calls == []
+        assert self.cached() == ([STORAGE], [COIN])
+
+    def test_skip_per_call(self):
+        with self.project.indexing(IndexMode.SKIP):
+            self.project.index_transaction(EXECUTE_RESULT)
+        assert FakeNode.calls == []
+        assert self.cached() == ([], [])
+
+    def test_async(self):
+        self.project.set_index_mode(IndexMode.ASYNC)
+        self.project.index_transaction(EXECUTE_RESULT)
+        self.project._index_executor.shutdown(wait=True)
+        assert FakeNode.calls == ["sui_multiGetObjects"]
+        assert self.cached() == ([STORAGE], [COIN])
+
+    def execute(self):
+        return self.project._execute("AAAA", ["AAAA"], module="lending", function="supply")
+
+    def test_full_profile(self):
+        result = self.execute()
+        ((options, request_type),) = FakeNode.executes
+        assert options["showEvents"] and options["showBalanceChanges"]
+        assert request_type == "WaitForLocalExecution"
+        assert "objectChanges" in result
+
+    def test_effects_profile(self):
+        self.project.set_response_profile(ResponseProfile.EFFECTS, "WaitForEffectsCert")
+        result = self.execute()
+        assert FakeNode.executes == [({"showEffects": True}, "WaitForEffectsCert")]
+        assert result["effects"]["status"]["status"] == "success"
+        # Still indexed from the effects
+        assert FakeNode.calls == ["sui_executeTransactionBlock", "sui_multiGetObjects"]
+
+    def test_effects_profile_with_object_changes_index(self):
+        self.project.set_response_profile(ResponseProfile.EFFECTS)
+        self.project.set_index_mode(IndexMode.OBJECT_CHANGES)
+        self.execute()
+        ((options, _),) = FakeNode.executes
+        assert options == {"showEffects": True, "showObjectChanges": True}
+        assert self.cached() == ([STORAGE], [COIN])
+
+    def test_minimal_profile_per_call(self):
+        with self.project.executing(response_profile=ResponseProfile.MINIMAL):
+            result = self.execute()
+        assert result == {"digest": EXECUTE_RESULT["digest"]}
+        assert FakeNode.calls == ["sui_executeTransactionBlock"]
+        self.execute()
+        assert FakeNode.executes[1][0]["showEvents"]
+
+    def test_use_account_per_thread(self):
+        self.project.active_account("TestAccount")
+        seen = {}
+
+        def executor(account_name):
+            self.project.use_account(account_name)
+            time.sleep(0.01)
+            seen[account_name] = self.project.account
+
+        threads = [threading.Thread(target=executor, args=(name,)) for name in ["TestAccount", "OtherAccount"]]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert seen == {name: self.project.accounts[name] for name in ["TestAccount", "OtherAccount"]}
+        assert self.project.account is self.project.accounts["TestAccount"]
+
+    def test_use_execution_per_thread(self):
+        def executor():
+            self.project.use_execution(index_mode=IndexMode.SKIP, response_profile=ResponseProfile.EFFECTS)
+            self.execute()
+
+        thread = threading.Thread(target=executor)
+        thread.start()
+        thread.join()
+        assert FakeNode.executes == [({"showEffects": True}, "WaitForLocalExecution")]
+        assert FakeNode.calls == ["sui_executeTransactionBlock"]
+        # Other threads keep the settings of the project
+        self.execute()
+        assert FakeNode.executes[1][0]["showEvents"]
+        assert FakeNode.calls[-1] == "sui_multiGetObjects"
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import json
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from sui_brownie.object_index import ObjectIndex
+
+COIN = "0x2::coin::Coin<0x2::sui::SUI>"
+OWNER = "0x61fbb5b4f342a40bdbf87fe4a946b9e38d18cf8ffc7b0000b975175c7b6a9576"
+
+
+class TestObjectIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name).joinpath("objects.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_debounced_flush(self):
+        index = ObjectIndex(self.path, flush_interval=0.1)
+        for i in range(10):
+            index.add(COIN, OWNER, f"0x{i}")
+        # Nothing written until the flush interval has passed
+        assert index.load() == []
+        time.sleep(0.3)
+        assert index.pending == []
+        assert [object_id for (_, _, object_id) in index.load()] == [f"0x{i}" for i in range(10)]
+
+    def test_duplicates_keep_first_position(self):
+        index = ObjectIndex(self.path)
+        for object_id in ["0x1", "0x2", "0x1"]:
+            index.add(COIN, OWNER, object_id)
+        index.flush()
+        assert [object_id for (_, _, object_id) in index.load()] == ["0x1", "0x2"]
+
+    def test_retention(self):
+        index = ObjectIndex(self.path, retention=3)
+        for i in range(5):
+            index.add(COIN, OWNER, f"0x{i}")
+        index.add("dola_protocol", "Shared", "0xd01a")
+        index.flush()
+        assert index.load() == [(COIN, OWNER, "0x2"), (COIN, OWNER, "0x3"), (COIN, OWNER, "0x4"),
+                                ("dola_protocol", "Shared", "0xd01a")]
+
+    def test_import_json(self):
+        legacy = Path(self.tmp.name).joinpath("sui-mainnet-objects.json")
+        legacy.write_text(json.dumps({COIN: {OWNER: ["0x1", "0x2"]}, "dola_protocol": {"Shared": ["0xd01a"]}}))
+        index = ObjectIndex(self.path)
+        assert index.is_empty()
+        index.import_json(legacy)
+        assert not index.is_empty()
+        assert index.load() == [(COIN, OWNER, "0x1"), (COIN, OWNER, "0x2"), ("dola_protocol", "Shared", "0xd01a")]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sui_brownie.rpc_metrics import RpcError, metrics, trace
+from sui_brownie.sui_client import SuiClient
+
+
+class FakeNode(BaseHTTPRequestHandler):
+    """Answers every call with its params, fails the first `failures` requests with 503"""
+
+    failures = 0
+    trace_ids = []
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.trace_ids.append(self.headers.get("X-Trace-Id"))
+        if FakeNode.failures:
+            FakeNode.failures -= 1
+            self.send_response(503)
+            self.end_headers()
+            return
+        if request["method"] == "sui_dryRunTransactionBlock":
+            response = {"jsonrpc": "2.0", "id": 1, "error": {"code": -32602, "message": "invalid tx"}}
+        else:
+            response = {"jsonrpc": "2.0", "id": 1, "result": request["params"]}
+        body = json.dumps(response).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestRpcMetrics(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeNode)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        metrics.reset()
+        FakeNode.failures = 0
+        FakeNode.trace_ids.clear()
+        self.client = SuiClient(self.url, timeout=5)
+        self.client.retry_wait = (0, 0)
+
+    def test_call(self):
+        assert self.client.sui_getObject("0x5", {"showContent": True}) == ["0x5", {"showContent": True}]
+        snapshot = metrics.snapshot()
+        method = snapshot["methods"]["sui_getObject"]
+        assert method["calls"] == 1
+        assert method["request_bytes"] > 0 and method["response_bytes"] > 0
+        assert snapshot["endpoints"][self.url]["calls"] == 1
+
+    def test_retries(self):
+        FakeNode.failures = 2
+        assert self.client.sui_getEvents("digest") == ["digest"]
+        snapshot = metrics.snapshot()
+        assert snapshot["methods"]["sui_getEvents"]["calls"] == 3
+        assert snapshot["methods"]["sui_getEvents"]["retries"] == 2
+        assert snapshot["errors"] == [{"method": "sui_getEvents", "endpoint": self.url, "error": "http_503", "count": 2}]
+
+    def test_rpc_error(self):
+        with self.assertRaises(RpcError) as cm:
+            self.client.sui_dryRunTransactionBlock("tx")
+        # Callers catch the former assert
+        assert isinstance(cm.exception, AssertionError)
+        assert metrics.snapshot()["errors"][0]["error"] == "rpc_-32602"
+        assert metrics.snapshot()["methods"]["sui_dryRunTransactionBlock"]["retries"] == 0
+
+    def test_trace(self):
+        with trace("relay-1"):
+            self.client.sui_devInspectTransactionBlock("0x1", "tx", 750, None)
+            self.client.sui_executeTransactionBlock("tx", [], {}, "WaitForLocalExecution")
+            self.client.suix_getReferenceGasPrice()
+        self.client.suix_getReferenceGasPrice()
+
+        steps = metrics.pop_trace("relay-1")
+        assert {step: value["calls"] for (step, value) in steps.items()} == {"inspect": 1, "execute": 1, "query": 1}
+        assert FakeNode.trace_ids == ["relay-1"] * 3 + [None]
+        assert metrics.pop_trace("relay-1") == {}
+
+    def test_prometheus(self):
+        self.client.suix_getReferenceGasPrice()
+        text = metrics.prometheus()
+        assert 'sui_rpc_request_duration_seconds_count{method="suix_getReferenceGasPrice"} 1' in text
+        assert 'sui_rpc_request_duration_seconds_bucket{method="suix_getReferenceGasPrice",le="+Inf"} 1' in text
+        assert f'sui_rpc_endpoint_duration_seconds_count{{endpoint="{self.url}"}} 1' in text
+
+
+if __name__ == "__main__":
+    unittest.main()
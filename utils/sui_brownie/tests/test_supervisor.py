@@ -0,0 +1,117 @@
+import asyncio
+import functools
+import multiprocessing
+import threading
+import time
+import unittest
+
+from sui_brownie.supervisor import Service, Supervisor, heartbeat, run_group, stopping
+
+
+def crash(runs):
+    runs.value += 1
+    raise ValueError("crash")
+
+
+def hang(runs):
+    runs.value += 1
+    heartbeat()
+    time.sleep(60)
+
+
+def serve(runs):
+    runs.value += 1
+    while not stopping():
+        heartbeat()
+        time.sleep(0.01)
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+class TestSupervisor(unittest.TestCase):
+    def supervise(self, *services, shutdown_grace=2):
+        supervisor = Supervisor(list(services), check_interval=0.01, shutdown_grace=shutdown_grace)
+        thread = threading.Thread(target=supervisor.run, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(supervisor.stop)
+        return supervisor, thread
+
+    def test_restart_with_backoff(self):
+        runs = multiprocessing.Value("i", 0)
+        supervisor, _ = self.supervise(Service("crash", lambda: crash(runs), backoff=0.1, max_backoff=0.4))
+        start = time.time()
+        wait_until(lambda: runs.value >= 4)
+        # 0.1 + 0.2 + 0.4 seconds between the four runs
+        assert time.time() - start >= 0.7
+        status = supervisor.status()["crash"]
+        assert status["restarts"] >= 3
+        assert status["last_exit"] == "exit code 1"
+
+    def test_no_restart(self):
+        runs = multiprocessing.Value("i", 0)
+        supervisor, _ = self.supervise(Service("crash", lambda: crash(runs), kind=Service.THREAD, restart=False))
+        wait_until(lambda: supervisor.status()["crash"]["last_exit"] is not None)
+        time.sleep(0.1)
+        assert runs.value == 1
+        assert supervisor.status()["crash"]["last_exit"] == "raised ValueError('crash')"
+
+    def test_hung_process_is_restarted(self):
+        runs = multiprocessing.Value("i", 0)
+        supervisor, _ = self.supervise(Service("hang", lambda: hang(runs), heartbeat_timeout=0.2, backoff=0))
+        wait_until(lambda: runs.value >= 2)
+        assert supervisor.status()["hang"]["last_exit"] == "exit code -15"
+
+    def test_async_service(self):
+        runs = multiprocessing.Value("i", 0)
+
+        async def tick():
+            runs.value += 1
+            while not stopping():
+                heartbeat()
+                await asyncio.sleep(0.01)
+
+        supervisor, _ = self.supervise(Service("tick", tick, kind=Service.ASYNC, heartbeat_timeout=1))
+        wait_until(lambda: supervisor.status()["tick"]["alive"])
+        time.sleep(0.1)
+        status = supervisor.status()["tick"]
+        assert status["healthy"] and status["last_heartbeat"] > time.time() - 1
+
+    def test_graceful_shutdown(self):
+        runs = multiprocessing.Value("i", 0)
+        supervisor, thread = self.supervise(
+            Service("process", lambda: serve(runs)),
+            Service("thread", lambda: serve(runs), kind=Service.THREAD),
+            Service("hang", lambda: hang(runs)),
+            shutdown_grace=0.5,
+        )
+        wait_until(lambda: runs.value == 3)
+        supervisor.stop()
+        thread.join(5)
+        status = supervisor.status()
+        assert not any(service["alive"] for service in status.values())
+        # Only the service ignoring `stopping` was terminated
+        assert supervisor.workers["process"].handle.exitcode == 0
+        assert supervisor.workers["hang"].handle.exitcode == -15
+
+    def test_group_restarted_when_a_thread_hangs(self):
+        runs = multiprocessing.Value("i", 0)
+        group = functools.partial(run_group, [
+            Service("serve", lambda: serve(runs), kind=Service.THREAD),
+            Service("hang", lambda: hang(runs), kind=Service.THREAD, heartbeat_timeout=0.2),
+        ], check_interval=0.01, shutdown_grace=0.2)
+        supervisor, _ = self.supervise(Service("group", group, heartbeat_timeout=0.4, backoff=0))
+        wait_until(lambda: runs.value == 2)
+        assert supervisor.status()["group"]["restarts"] == 0
+        # Both threads run again in a new process
+        wait_until(lambda: runs.value == 4)
+        assert supervisor.status()["group"]["restarts"] == 1
+
+
+if __name__ == "__main__":
+    unittest.main()